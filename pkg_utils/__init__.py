@@ -1,6 +1,21 @@
-from .core import (PackageMetadata, get_package_metadata, convert_readme_md_to_rst, get_long_description, get_version,
-                   expand_package_data_filename_patterns, get_dependencies, parse_requirements_file, parse_optional_requirements_file, 
-                   parse_requirement_lines, install_dependencies, get_console_scripts, add_console_scripts)
+from .core import (PackageMetadata, LazyPackageMetadata, get_package_metadata, convert_readme_md_to_rst,
+                   get_long_description, LongDescriptionStats, get_version, expand_package_data_filename_patterns, PackageDataStats,
+                   get_dependencies, merge_dependencies, RequirementError, RequirementParseError,
+                   parse_requirements_file, parse_optional_requirements_file,
+                   parse_requirement_lines, parse_optional_requirement_lines, install_dependencies, get_console_scripts, add_console_scripts,
+                   write_console_script_launchers, write_file_if_changed)
+from .conflicts import RequirementConflict, get_dependency_conflicts, find_requirement_conflicts
+from .validate import validate_requirements_files
+from .digest import get_dependencies_digest, digest_dependencies
+from .venv_pool import VenvPool
+from .revisions import get_revision_metadata, diff_revision_metadata
+from .archives import get_archive_metadata, get_archives_metadata
+from .index import WorkspaceIndex
+from .manifest import get_package_data_manifest, diff_package_data_manifests
+from .wheelhouse import (lock_dependencies, lock_requirements, read_lock_file, get_dependency_closure,
+                         DependencyClosure)
+from .installer import install_wheels, install_locked_requirements
+from .aio import aget_package_metadata, aconvert_readme_md_to_rst, ainstall_dependencies
 
 # read version
 from ._version import __version__
@@ -0,0 +1,316 @@
+""" Command line interface which reports package metadata as JSON
+
+Queries are answered by the daemon (see :obj:`pkg_utils.daemon`) if the path to its socket is provided
+with ``--socket`` or the ``PKG_UTILS_SOCKET`` environment variable and the daemon is running, and otherwise
+in-process.
+
+:License: MIT
+"""
+
+from . import daemon
+from . import digest
+from . import index
+from . import validate
+from . import watch
+import argparse
+import json
+import os
+import sys
+
+
+def get_parser():
+    """ Get the parser for the command line arguments
+
+    Returns:
+        :obj:`argparse.ArgumentParser`: parser
+    """
+    parser = argparse.ArgumentParser(prog='pkg-utils', description='Get metadata about packages as JSON')
+    parser.add_argument('--socket', default=os.getenv('PKG_UTILS_SOCKET'),
+                        help='path to the socket of the daemon (default: $PKG_UTILS_SOCKET)')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    subparser = subparsers.add_parser('metadata', help='get the metadata of a package')
+    subparser.add_argument('dirname', help='path to the package')
+    subparser.add_argument('package_name', help='package name')
+    _add_package_data_argument(subparser)
+
+    subparser = subparsers.add_parser('deps', help='get the dependencies of a package')
+    subparser.add_argument('dirname', help='path to the package')
+    subparser.add_argument('--include-uri', action='store_true', help='include URIs in the dependencies')
+    subparser.add_argument('--no-extras', dest='include_extras', action='store_false',
+                           help='exclude extras from the dependencies')
+    subparser.add_argument('--no-specs', dest='include_specs', action='store_false',
+                           help='exclude specifications from the dependencies')
+    subparser.add_argument('--no-markers', dest='include_markers', action='store_false',
+                           help='exclude markers from the dependencies')
+    subparser.add_argument('--evaluate-markers', action='store_true',
+                           help="discard dependencies whose markers don't apply to the current environment")
+
+    subparser = subparsers.add_parser('version', help='get the version of a package')
+    subparser.add_argument('dirname', help='path to the package')
+    subparser.add_argument('package_name', help='package name')
+
+    subparser = subparsers.add_parser('package-data', help='expand the package data filename patterns of a package')
+    subparser.add_argument('dirname', help='path to the package')
+    _add_package_data_argument(subparser)
+
+    subparser = subparsers.add_parser('readme', help='get the long description of a package')
+    subparser.add_argument('dirname', help='path to the package')
+    subparser.add_argument('--convert', action='store_true', help='convert README.md to README.rst')
+
+    subparser = subparsers.add_parser('watch', help='report changes to the metadata of a package as they occur')
+    subparser.add_argument('dirname', help='path to the package')
+    subparser.add_argument('package_name', help='package name')
+    _add_package_data_argument(subparser)
+    subparser.add_argument('--convert-readme', action='store_true', help='convert README.md to README.rst when it changes')
+    subparser.add_argument('--interval', type=float, default=1., help='interval between polls in seconds (default: 1)')
+    subparser.add_argument('--max-polls', type=int, default=None, help='stop after this number of polls')
+
+    subparser = subparsers.add_parser('validate', help='validate the syntax of requirements files')
+    subparser.add_argument('paths', nargs='*', default=['.'],
+                           help='paths to requirements files and repositories whose requirements files should be validated '
+                           '(default: the current directory)')
+    subparser.add_argument('--max-workers', type=int, default=None, help='number of threads')
+
+    subparser = subparsers.add_parser('digest', help='get a digest of the dependencies of a package')
+    subparser.add_argument('dirname', help='path to the package')
+    subparser.add_argument('--option', dest='options', action='append', default=None, metavar='OPTION',
+                           help='only digest the requirements and the optional requirements of this option '
+                           '(can be repeated)')
+    subparser.add_argument('--evaluate-markers', action='store_true',
+                           help="discard dependencies whose markers don't apply to the current environment")
+
+    subparser = subparsers.add_parser('index', help='index the metadata of the packages of a workspace and query the index')
+    index_subparsers = subparser.add_subparsers(dest='index_command')
+    index_subparsers.required = True
+    index_subparser = index_subparsers.add_parser('update', help='update the index with the packages of a workspace')
+    index_subparser.add_argument('database', help='path to the index')
+    index_subparser.add_argument('workspace_dirname', help='path to the workspace')
+    index_subparser.add_argument('--max-workers', type=int, default=None, help='number of threads')
+    index_subparser = index_subparsers.add_parser('dependents', help='get the packages which depend on a project')
+    index_subparser.add_argument('database', help='path to the index')
+    index_subparser.add_argument('name', help='name of the project')
+    index_subparser.add_argument('--option', default=None,
+                                 help='only get the requirements of this option (install_requires or an extra)')
+    index_subparser = index_subparsers.add_parser('pins', help='get the requirements which pin projects to versions')
+    index_subparser.add_argument('database', help='path to the index')
+    index_subparser.add_argument('name', nargs='?', default=None, help='only get the pins of this project')
+
+    subparser = subparsers.add_parser('daemon', help='run or stop the daemon')
+    subparser.add_argument('action', choices=['start', 'stop'], help='action')
+
+    return parser
+
+
+def _add_package_data_argument(parser):
+    """ Add an argument for package data filename patterns to a parser
+
+    Args:
+        parser (:obj:`argparse.ArgumentParser`): parser
+    """
+    parser.add_argument('--package-data', action='append', default=[], metavar='MODULE:PATTERN',
+                        help='glob pattern for the data files of a module (can be repeated)')
+
+
+def get_request(args):
+    """ Get the daemon command and its arguments for parsed command line arguments
+
+    Args:
+        args (:obj:`argparse.Namespace`): parsed command line arguments
+
+    Returns:
+        :obj:`str`: command
+        :obj:`dict`: arguments of the command
+
+    Raises:
+        :obj:`ValueError`: if a package data filename pattern is invalid
+    """
+    request_args = {'dirname': os.path.abspath(args.dirname)}
+    if args.command in ('metadata', 'version', 'watch'):
+        request_args['package_name'] = args.package_name
+    if args.command in ('metadata', 'package-data', 'watch'):
+        package_data_filename_patterns = {}
+        for module_pattern in args.package_data:
+            module, sep, pattern = module_pattern.partition(':')
+            if not sep or not module or not pattern:
+                raise ValueError('Package data must have the format MODULE:PATTERN: {}'.format(module_pattern))
+            package_data_filename_patterns.setdefault(module, []).append(pattern)
+        request_args['package_data_filename_patterns'] = package_data_filename_patterns
+    if args.command == 'deps':
+        request_args['options'] = {
+            'include_uri': args.include_uri,
+            'include_extras': args.include_extras,
+            'include_specs': args.include_specs,
+            'include_markers': args.include_markers,
+            'evaluate_markers': args.evaluate_markers,
+        }
+    if args.command == 'readme':
+        request_args['convert'] = args.convert
+    return (args.command, request_args)
+
+
+def main(argv=None):
+    """ Run the command line interface
+
+    Args:
+        argv (:obj:`list` of :obj:`str`, optional): command line arguments; default: :obj:`sys.argv`
+
+    Returns:
+        :obj:`int`: exit code
+    """
+    args = get_parser().parse_args(argv)
+
+    if args.command == 'daemon':
+        if not args.socket:
+            sys.stderr.write('The path to the socket of the daemon must be provided with --socket or $PKG_UTILS_SOCKET\n')
+            return 2
+        if args.action == 'start':
+            try:
+                daemon.serve(args.socket)
+            except ValueError as exception:
+                sys.stderr.write(str(exception) + '\n')
+                return 1
+        else:
+            try:
+                daemon.request(args.socket, 'shutdown')
+            except OSError:
+                pass
+        return 0
+
+    if args.command == 'watch':
+        return run_watch(args)
+
+    if args.command == 'validate':
+        return run_validate(args)
+
+    if args.command == 'digest':
+        return run_digest(args)
+
+    if args.command == 'index':
+        return run_index(args)
+
+    try:
+        command, request_args = get_request(args)
+        result = None
+        answered = False
+        if args.socket:
+            try:
+                result = daemon.request(args.socket, command, request_args)
+                answered = True
+            except OSError:
+                pass
+        if not answered:
+            result = daemon.MetadataCache().run(command, request_args)
+    except Exception as exception:
+        sys.stderr.write(json.dumps({'error': str(exception)}) + '\n')
+        return 1
+
+    sys.stdout.write(json.dumps(result, indent=2, sort_keys=True) + '\n')
+    return 0
+
+
+def run_validate(args):
+    """ Validate requirements files and report their errors as JSON
+
+    Args:
+        args (:obj:`argparse.Namespace`): parsed command line arguments
+
+    Returns:
+        :obj:`int`: exit code; 1 if any requirements file is invalid
+    """
+    errors = []
+    try:
+        for path in args.paths:
+            if os.path.isdir(path):
+                errors.extend(validate.validate_requirements_files(dirname=path, max_workers=args.max_workers))
+            else:
+                errors.extend(validate.validate_requirements_files(filenames=[path], max_workers=args.max_workers))
+    except Exception as exception:
+        sys.stderr.write(json.dumps({'error': str(exception)}) + '\n')
+        return 1
+
+    sys.stdout.write(json.dumps([error.__dict__ for error in errors], indent=2, sort_keys=True) + '\n')
+    return 1 if errors else 0
+
+
+def run_digest(args):
+    """ Report a digest of the dependencies of a package as JSON
+
+    Args:
+        args (:obj:`argparse.Namespace`): parsed command line arguments
+
+    Returns:
+        :obj:`int`: exit code
+    """
+    try:
+        result = digest.get_dependencies_digest(args.dirname, options=args.options,
+                                                evaluate_markers=args.evaluate_markers)
+    except Exception as exception:
+        sys.stderr.write(json.dumps({'error': str(exception)}) + '\n')
+        return 1
+
+    sys.stdout.write(json.dumps(result) + '\n')
+    return 0
+
+
+def run_index(args):
+    """ Update an index of the metadata of the packages of a workspace, or query the index, and report the result as JSON
+
+    Args:
+        args (:obj:`argparse.Namespace`): parsed command line arguments
+
+    Returns:
+        :obj:`int`: exit code
+    """
+    try:
+        with index.WorkspaceIndex(args.database) as workspace_index:
+            if args.index_command == 'update':
+                errors = {}
+                result = workspace_index.update(args.workspace_dirname, max_workers=args.max_workers, errors=errors)
+                result['errors'] = {dirname: str(exception) for dirname, exception in errors.items()}
+            elif args.index_command == 'dependents':
+                result = [req.__dict__ for req in workspace_index.get_dependents(args.name, option=args.option)]
+            else:
+                result = [req.__dict__ for req in workspace_index.get_pins(name=args.name)]
+    except Exception as exception:
+        sys.stderr.write(json.dumps({'error': str(exception)}) + '\n')
+        return 1
+
+    sys.stdout.write(json.dumps(result, indent=2, sort_keys=True) + '\n')
+    return 1 if isinstance(result, dict) and result['errors'] else 0
+
+
+def run_watch(args):
+    """ Report changes to the metadata of a package as JSON lines until interrupted
+
+    Args:
+        args (:obj:`argparse.Namespace`): parsed command line arguments
+
+    Returns:
+        :obj:`int`: exit code
+    """
+    def report(diff):
+        sys.stdout.write(json.dumps(diff, sort_keys=True) + '\n')
+        sys.stdout.flush()
+
+    def report_error(exception):
+        sys.stderr.write(json.dumps({'error': str(exception)}) + '\n')
+        sys.stderr.flush()
+
+    try:
+        _, request_args = get_request(args)
+        watcher = watch.Watcher(request_args['dirname'], request_args['package_name'],
+                                package_data_filename_patterns=request_args['package_data_filename_patterns'],
+                                convert_readme=args.convert_readme)
+        watcher.watch(report, interval=args.interval, max_polls=args.max_polls, error_callback=report_error)
+    except KeyboardInterrupt:  # pragma: no cover
+        pass
+    except Exception as exception:
+        sys.stderr.write(json.dumps({'error': str(exception)}) + '\n')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
@@ -0,0 +1,168 @@
+""" Asynchronous versions of the utilities for collecting package metadata and installing dependencies
+
+:License: MIT
+"""
+
+from .core import (PackageMetadata, get_long_description, get_version,
+                   expand_package_data_filename_patterns, get_dependencies, write_file_if_changed)
+import asyncio
+import functools
+import os
+import subprocess
+import sys
+import tempfile
+
+try:
+    import pypandoc
+except ImportError:  # pragma: no cover
+    pypandoc = None  # pragma: no cover
+
+
+async def aget_package_metadata(dirname, package_name, package_data_filename_patterns=None,
+                                max_concurrency=None, semaphore=None):
+    """ Get meta data about a package, reading its files concurrently
+
+    Args:
+        dirname (:obj:`str`): path to the package
+        package_name (:obj:`str`): package name
+        package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+        max_concurrency (:obj:`int`, optional): maximum number of files which can be read concurrently
+        semaphore (:obj:`asyncio.Semaphore`, optional): semaphore which limits the number of concurrent
+            file reads; takes precedence over :obj:`max_concurrency`
+
+    Returns:
+        :obj:`PackageMetadata`: meta data
+
+    Raises:
+        :obj:`ValueError:` if test or documentation dependencies are defined in `requirements.optional.txt`
+    """
+    if semaphore is None and max_concurrency:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+    md = PackageMetadata()
+    (md.long_description,
+     md.version,
+     md.package_data,
+     (md.install_requires, md.extras_require, md.tests_require, md.dependency_links)) = await asyncio.gather(
+        _run_in_executor(semaphore, get_long_description, dirname),
+        _run_in_executor(semaphore, get_version, dirname, package_name),
+        _run_in_executor(semaphore, expand_package_data_filename_patterns, dirname,
+                         package_data_filename_patterns=package_data_filename_patterns),
+        _run_in_executor(semaphore, get_dependencies, dirname),
+    )
+    return md
+
+
+async def aconvert_readme_md_to_rst(dirname, max_concurrency=None, semaphore=None):
+    """ Convert the README.md to README.rst with a pandoc subprocess which doesn't block the event loop
+
+    README.rst is replaced atomically, and only if its content changes (see :obj:`pkg_utils.write_file_if_changed`).
+
+    Args:
+        dirname (:obj:`str`): path to the package
+        max_concurrency (:obj:`int`, optional): maximum number of subprocesses which can run concurrently
+        semaphore (:obj:`asyncio.Semaphore`, optional): semaphore which limits the number of concurrent
+            subprocesses; takes precedence over :obj:`max_concurrency`
+
+    Raises:
+        :obj:`subprocess.CalledProcessError`: if pandoc fails
+    """
+    if semaphore is None and max_concurrency:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+    md_filename = os.path.join(dirname, 'README.md')
+    if pypandoc and os.path.isfile(md_filename):
+        fd, tmp_filename = tempfile.mkstemp(suffix='.rst')
+        os.close(fd)
+        try:
+            await _check_call(semaphore, pypandoc.get_pandoc_path(), md_filename,
+                              '--from=markdown', '--to=rst',
+                              '--output=' + tmp_filename)
+            with open(tmp_filename, 'r') as file:
+                content = file.read()
+        finally:
+            os.remove(tmp_filename)
+        await _run_in_executor(None, write_file_if_changed, os.path.join(dirname, 'README.rst'), content)
+
+
+async def ainstall_dependencies(dependencies, upgrade=False, lock_filename=None, find_links=None, max_concurrency=None,
+                               semaphore=None):
+    """ Install dependencies with a pip subprocess which doesn't block the event loop
+
+    Args:
+        dependencies (:obj:`list`): list of dependencies
+        upgrade (:obj:`bool`, optional): if :obj:`True`, upgrade package
+        lock_filename (:obj:`str`, optional): path to a lock file of pinned and hashed dependencies
+            (e.g. from :obj:`pkg_utils.wheelhouse.lock_dependencies`) to install without resolving their dependencies
+        find_links (:obj:`str`, optional): path to a local directory of distributions to install from instead of PyPI
+        max_concurrency (:obj:`int`, optional): maximum number of subprocesses which can run concurrently
+        semaphore (:obj:`asyncio.Semaphore`, optional): semaphore which limits the number of concurrent
+            subprocesses; takes precedence over :obj:`max_concurrency`
+
+    Raises:
+        :obj:`subprocess.CalledProcessError`: if pip fails
+    """
+    if semaphore is None and max_concurrency:
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+    args = [sys.executable, "-m", "pip", "install"]
+    if upgrade:
+        args.append("-U")
+    if find_links:
+        args += ["--no-index", "--find-links", find_links]
+    if lock_filename:
+        args += ["--no-deps", "--require-hashes", "-r", lock_filename]
+    args += list(dependencies)
+    await _check_call(semaphore, *args)
+
+
+async def _run_in_executor(semaphore, func, *args, **kwargs):
+    """ Run a blocking function in the default executor, optionally limited by a semaphore
+
+    Args:
+        semaphore (:obj:`asyncio.Semaphore`): semaphore or :obj:`None`
+        func (:obj:`callable`): function
+        *args: positional arguments to :obj:`func`
+        **kwargs: keyword arguments to :obj:`func`
+
+    Returns:
+        :obj:`object`: return value of :obj:`func`
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    if semaphore is None:
+        return await loop.run_in_executor(None, call)
+    async with semaphore:
+        return await loop.run_in_executor(None, call)
+
+
+async def _check_call(semaphore, *args):
+    """ Run a subprocess, optionally limited by a semaphore, and raise an error if it fails
+
+    Args:
+        semaphore (:obj:`asyncio.Semaphore`): semaphore or :obj:`None`
+        *args: program and its arguments
+
+    Raises:
+        :obj:`subprocess.CalledProcessError`: if the subprocess returns a non-zero exit code
+    """
+    if semaphore is None:
+        returncode = await _call(*args)
+    else:
+        async with semaphore:
+            returncode = await _call(*args)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, list(args))
+
+
+async def _call(*args):
+    """ Run a subprocess
+
+    Args:
+        *args: program and its arguments
+
+    Returns:
+        :obj:`int`: exit code
+    """
+    process = await asyncio.create_subprocess_exec(*args)
+    return await process.wait()
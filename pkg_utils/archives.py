@@ -0,0 +1,289 @@
+""" Read the metadata of packages directly from source distributions and other tar and zip archives
+
+Archives are read through a virtual file system (:obj:`ArchiveFileSystem`) which the metadata functions of
+:obj:`pkg_utils.core` accept through their ``filesystem`` arguments. The file system indexes the members of an archive
+from its headers (tar) or central directory (zip), and only reads the contents of the members which are opened.
+
+:License: MIT
+"""
+
+from .core import get_package_metadata
+import concurrent.futures
+import io
+import os
+import posixpath
+import tarfile
+import threading
+import zipfile
+
+ARCHIVE_EXTENSIONS = ('.tar.gz', '.tgz', '.tar.bz2', '.tar.xz', '.tar', '.zip')
+
+
+class ArchiveEntry(object):
+    """ Entry of a directory of an archive, with the interface of :obj:`os.DirEntry` used by the metadata functions
+
+    Attributes:
+        name (:obj:`str`): name of the entry
+        path (:obj:`str`): path of the entry in the archive
+        st_size (:obj:`int`): size of the file in bytes
+        _is_dir (:obj:`bool`): whether the entry is a directory
+    """
+
+    def __init__(self, name, path, is_dir, size=0):
+        self.name = name
+        self.path = path
+        self.st_size = size
+        self._is_dir = is_dir
+
+    def is_dir(self):
+        """ Determine whether the entry is a directory
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the entry is a directory
+        """
+        return self._is_dir
+
+    def is_file(self):
+        """ Determine whether the entry is a file
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the entry is a file
+        """
+        return not self._is_dir
+
+    def is_symlink(self):
+        """ Determine whether the entry is a symbolic link
+
+        Returns:
+            :obj:`bool`: :obj:`False`, because the links of archives aren't followed
+        """
+        return False
+
+    def stat(self):
+        """ Get the status of the entry
+
+        Returns:
+            :obj:`ArchiveEntry`: entry, whose ``st_size`` attribute is the size of the file
+        """
+        return self
+
+
+class ArchiveFileSystem(object):
+    """ Read-only file system over the members of a tar or zip archive
+
+    Paths are relative to the root of the archive, with ``/`` separators. If all of the members of an archive are
+    contained in a single top-level directory (e.g., ``package-1.0.0/`` in a source distribution), this directory is
+    the root of the file system.
+
+    Attributes:
+        filename (:obj:`str`): path to the archive
+        root (:obj:`str`): path of the root of the file system in the archive
+        _archive (:obj:`tarfile.TarFile` or :obj:`zipfile.ZipFile`): archive
+        _members (:obj:`dict`): dictionary which maps the path of each file to its member
+        _dirs (:obj:`dict`): dictionary which maps the path of each directory to a dictionary which maps the names of
+            its entries to the entries
+        _lock (:obj:`threading.Lock`): lock which serializes reads from the archive
+    """
+
+    def __init__(self, filename, root=None):
+        """
+        Args:
+            filename (:obj:`str`): path to the archive
+            root (:obj:`str`, optional): path of the root of the file system in the archive; default: the single
+                top-level directory of the archive, if any
+
+        Raises:
+            :obj:`ValueError`: if the archive is not a tar or zip archive
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+        if zipfile.is_zipfile(filename):
+            self._archive = zipfile.ZipFile(filename)
+            members = [(info.filename, info.is_dir(), info.file_size, info) for info in self._archive.infolist()]
+        elif tarfile.is_tarfile(filename):
+            self._archive = tarfile.open(filename, 'r:*')
+            members = [(member.name, member.isdir(), member.size, member)
+                       for member in self._archive if member.isdir() or member.isfile()]
+        else:
+            raise ValueError('{} is not a tar or zip archive'.format(filename))
+
+        members = [(_normalize_path(name), is_dir, size, member) for name, is_dir, size, member in members]
+        if root is None:
+            top_levels = set(name.partition('/')[0] for name, _, _, _ in members if name)
+            if len(top_levels) == 1 and any('/' in name or is_dir for name, is_dir, _, _ in members):
+                root = top_levels.pop()
+            else:
+                root = ''
+        self.root = _normalize_path(root)
+
+        self._members = {}
+        self._dirs = {'': {}}
+        prefix = self.root + '/' if self.root else ''
+        for name, is_dir, size, member in members:
+            if not name.startswith(prefix) or name == self.root:
+                continue
+            path = name[len(prefix):]
+            parent = ''
+            parts = path.split('/')
+            for i_part, part in enumerate(parts):
+                part_path = posixpath.join(parent, part)
+                entries = self._dirs.setdefault(parent, {})
+                if i_part < len(parts) - 1 or is_dir:
+                    entries.setdefault(part, ArchiveEntry(part, part_path, True))
+                    self._dirs.setdefault(part_path, {})
+                else:
+                    entries[part] = ArchiveEntry(part, part_path, False, size)
+                    self._members[part_path] = member
+                parent = part_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ Close the archive """
+        self._archive.close()
+
+    def isfile(self, path):
+        """ Determine whether a path is a file
+
+        Args:
+            path (:obj:`str`): path
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the path is a file
+        """
+        return _normalize_path(path) in self._members
+
+    def isdir(self, path):
+        """ Determine whether a path is a directory
+
+        Args:
+            path (:obj:`str`): path
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the path is a directory
+        """
+        return _normalize_path(path) in self._dirs
+
+    def scandir(self, path):
+        """ Get the entries of a directory
+
+        Args:
+            path (:obj:`str`): path to the directory
+
+        Returns:
+            :obj:`list` of :obj:`ArchiveEntry`: entries
+
+        Raises:
+            :obj:`FileNotFoundError`: if the directory doesn't exist
+        """
+        entries = self._dirs.get(_normalize_path(path))
+        if entries is None:
+            raise FileNotFoundError('No such directory in {}: {}'.format(self.filename, path))
+        return list(entries.values())
+
+    def open(self, path, mode='r'):
+        """ Open a file
+
+        Args:
+            path (:obj:`str`): path to the file
+            mode (:obj:`str`, optional): mode (``r`` or ``rb``)
+
+        Returns:
+            :obj:`io.IOBase`: file
+
+        Raises:
+            :obj:`FileNotFoundError`: if the file doesn't exist
+            :obj:`ValueError`: if the mode is not supported
+        """
+        if mode not in ('r', 'rb'):
+            raise ValueError('Mode {} is not supported'.format(mode))
+        member = self._members.get(_normalize_path(path))
+        if member is None:
+            raise FileNotFoundError('No such file in {}: {}'.format(self.filename, path))
+
+        if isinstance(self._archive, zipfile.ZipFile):
+            file = self._archive.open(member)
+        else:
+            with self._lock:
+                file = io.BytesIO(self._archive.extractfile(member).read())
+        if mode == 'r':
+            return io.TextIOWrapper(file, encoding='utf-8')
+        return file
+
+
+def _normalize_path(path):
+    """ Normalize a path in an archive
+
+    Args:
+        path (:obj:`str`): path
+
+    Returns:
+        :obj:`str`: path without leading ``./`` or ``/``, trailing ``/`` and ``.`` components, with ``/`` separators
+    """
+    path = posixpath.normpath(path.replace(os.sep, '/')).lstrip('/')
+    return '' if path == '.' else path
+
+
+def get_archive_metadata(filename, package_name=None, package_data_filename_patterns=None, root=None):
+    """ Get metadata about a package from an archive (e.g., a source distribution) without extracting it
+
+    Args:
+        filename (:obj:`str`): path to the archive
+        package_name (:obj:`str`, optional): package name; default: the name of the top-level directory of
+            the package which contains ``_version.py``
+        package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+        root (:obj:`str`, optional): path of the package in the archive; default: the single top-level directory
+            of the archive, if any
+
+    Returns:
+        :obj:`PackageMetadata`: meta data
+
+    Raises:
+        :obj:`ValueError`: if the archive is not a tar or zip archive, or test or documentation dependencies are
+            defined in `requirements.optional.txt`
+    """
+    with ArchiveFileSystem(filename, root=root) as filesystem:
+        if package_name is None:
+            package_name = next((entry.name for entry in sorted(filesystem.scandir(''), key=lambda entry: entry.name)
+                                 if entry.is_dir() and filesystem.isfile(entry.name + '/_version.py')), '')
+        return get_package_metadata('', package_name, package_data_filename_patterns=package_data_filename_patterns,
+                                    filesystem=filesystem)
+
+
+def get_archives_metadata(dirname, package_data_filename_patterns=None, max_workers=None, errors=None):
+    """ Get metadata about the packages of the archives in a directory in parallel
+
+    Args:
+        dirname (:obj:`str`): path to a directory of archives (``.tar.gz``, ``.tgz``, ``.tar.bz2``, ``.tar.xz``,
+            ``.tar`` and ``.zip`` files)
+        package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+        max_workers (:obj:`int`, optional): number of threads
+        errors (:obj:`dict`, optional): if provided, rather than raising the first error, add the error of each archive
+            whose metadata couldn't be read to this dictionary, keyed by the path of the archive
+
+    Returns:
+        :obj:`dict` of :obj:`PackageMetadata`: dictionary which maps the path of each archive to its metadata
+    """
+    filenames = sorted(os.path.join(dirname, basename) for basename in os.listdir(dirname)
+                       if basename.endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(os.path.join(dirname, basename)))
+
+    def get_metadata(filename):
+        try:
+            return (get_archive_metadata(filename, package_data_filename_patterns=package_data_filename_patterns), None)
+        except Exception as exception:
+            if errors is None:
+                raise
+            return (None, exception)
+
+    metadata = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for filename, (md, exception) in zip(filenames, executor.map(get_metadata, filenames)):
+            if exception is None:
+                metadata[filename] = md
+            else:
+                errors[filename] = exception
+    return metadata
@@ -0,0 +1,196 @@
+""" Utilities for detecting conflicting requirements without invoking pip
+
+:License: MIT
+"""
+
+from .core import get_dependencies
+import packaging.requirements
+import packaging.specifiers
+import packaging.utils
+import packaging.version
+
+
+class RequirementConflict(object):
+    """ Conflicting requirements for a project
+
+    Attributes:
+        name (:obj:`str`): normalized name of the project
+        option (:obj:`str`): option whose requirements conflict (``install_requires`` or the name of an
+            option of ``extras_require``)
+        requirements (:obj:`list` of :obj:`str`): conflicting requirements for the project
+    """
+
+    def __init__(self, name, option, requirements):
+        self.name = name
+        self.option = option
+        self.requirements = requirements
+
+    def __eq__(self, other):
+        return isinstance(other, RequirementConflict) and self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return 'RequirementConflict({!r}, {!r}, {!r})'.format(self.name, self.option, self.requirements)
+
+    def __str__(self):
+        return '{} ({}): {}'.format(self.name, self.option, ' vs '.join(self.requirements))
+
+
+def get_dependency_conflicts(dirname, environment=None):
+    """ Get the conflicting requirements of a package
+
+    Args:
+        dirname (:obj:`str`): path to the package
+        environment (:obj:`dict`, optional): environment to evaluate markers against (e.g. ``python_version``,
+            ``sys_platform``); default: the current environment
+
+    Returns:
+        :obj:`list` of :obj:`RequirementConflict`: conflicts
+    """
+    install_requires, extras_require, _, _ = get_dependencies(dirname)
+    return find_requirement_conflicts(install_requires, extras_require, environment=environment)
+
+
+def find_requirement_conflicts(install_requires, extras_require=None, environment=None):
+    """ Find conflicting requirements for the same project within the required dependencies
+    and within each option of the optional dependencies together with the required dependencies
+
+    Args:
+        install_requires (:obj:`list` of :obj:`str`): requirements
+        extras_require (:obj:`dict` of :obj:`list` of :obj:`str`, optional): optional requirements
+        environment (:obj:`dict`, optional): environment to evaluate markers against; default: the current environment
+
+    Returns:
+        :obj:`list` of :obj:`RequirementConflict`: conflicts, sorted by option and project name
+
+    Raises:
+        :obj:`ValueError`: if a requirement cannot be parsed
+    """
+    install_requires = parse_requirements(install_requires, environment=environment)
+
+    conflicts = find_conflicts(install_requires, 'install_requires')
+    for option, option_requires in sorted((extras_require or {}).items()):
+        option_requires = parse_requirements(option_requires, environment=environment)
+        conflicts += find_conflicts(install_requires + option_requires, option)
+    return conflicts
+
+
+def parse_requirements(requires, environment=None):
+    """ Parse requirements and discard the requirements whose markers don't apply to an environment
+
+    Args:
+        requires (:obj:`list` of :obj:`str`): requirements
+        environment (:obj:`dict`, optional): environment to evaluate markers against; default: the current environment
+
+    Returns:
+        :obj:`list` of :obj:`packaging.requirements.Requirement`: applicable requirements
+
+    Raises:
+        :obj:`ValueError`: if a requirement cannot be parsed
+    """
+    parsed_requires = []
+    for require in requires:
+        try:
+            parsed_require = packaging.requirements.Requirement(require)
+        except packaging.requirements.InvalidRequirement as exception:
+            raise ValueError('Dependency could not be parsed: {}: {}'.format(require, str(exception)))
+        if parsed_require.marker is None or parsed_require.marker.evaluate(environment):
+            parsed_requires.append(parsed_require)
+    return parsed_requires
+
+
+def find_conflicts(requires, option):
+    """ Find conflicting requirements for the same project
+
+    Args:
+        requires (:obj:`list` of :obj:`packaging.requirements.Requirement`): requirements
+        option (:obj:`str`): name of the option that the requirements belong to
+
+    Returns:
+        :obj:`list` of :obj:`RequirementConflict`: conflicts, sorted by project name
+    """
+    requires_by_name = {}
+    for require in requires:
+        requires_by_name.setdefault(packaging.utils.canonicalize_name(require.name), []).append(require)
+
+    conflicts = []
+    for name, name_requires in sorted(requires_by_name.items()):
+        if len(name_requires) < 2:
+            continue
+        specifier = packaging.specifiers.SpecifierSet()
+        for require in name_requires:
+            specifier &= require.specifier
+        if not is_satisfiable(specifier):
+            conflicts.append(RequirementConflict(name, option, sorted(set(str(require) for require in name_requires))))
+    return conflicts
+
+
+def is_satisfiable(specifier):
+    """ Determine whether any version satisfies a set of version specifiers
+
+    The specifiers partition the version line into intervals bounded by the versions that they mention.
+    Because the satisfiability of each specifier is constant within each interval, it is sufficient to
+    test each bounding version and versions just below and just above each bounding version.
+
+    Args:
+        specifier (:obj:`packaging.specifiers.SpecifierSet`): specifiers
+
+    Returns:
+        :obj:`bool`: :obj:`True` if at least one version (including pre-releases) satisfies the specifiers
+    """
+    candidates = set(['0.dev0', '0'])
+    for spec in specifier:
+        if spec.operator == '===':
+            candidates.add(spec.version)
+            continue
+
+        version = spec.version
+        if version.endswith('.*'):
+            version = version[:-2]
+        try:
+            version = packaging.version.Version(version)
+        except packaging.version.InvalidVersion:
+            continue
+
+        bounds = [version]
+        if spec.operator == '~=' or spec.version.endswith('.*'):
+            release = version.release[:-1] if spec.operator == '~=' else version.release
+            bounds.append(packaging.version.Version(_format_release(
+                version.epoch, release[:-1] + (release[-1] + 1,))))
+
+        for bound in bounds:
+            candidates.add(str(bound))
+            candidates.add(_format_release(bound.epoch, bound.release + (0, 0, 0, 1)))
+            if bound.local is not None:
+                continue
+            if bound.dev is None:
+                candidates.add(str(bound) + '.dev0')
+            if bound.pre is not None:
+                candidates.add(str(bound) + '.post1')
+
+    for candidate in candidates:
+        try:
+            packaging.version.Version(candidate)
+        except packaging.version.InvalidVersion:
+            # arbitrary equality is the only specifier which can match a string which isn't a valid version
+            if all(spec.operator == '===' and spec.version.lower() == candidate.lower() for spec in specifier):
+                return True
+            continue
+        if specifier.contains(candidate, prereleases=True):
+            return True
+    return False
+
+
+def _format_release(epoch, release):
+    """ Format a release number
+
+    Args:
+        epoch (:obj:`int`): epoch
+        release (:obj:`tuple` of :obj:`int`): release segments
+
+    Returns:
+        :obj:`str`: version
+    """
+    version = '.'.join(str(segment) for segment in release)
+    if epoch:
+        version = '{}!{}'.format(epoch, version)
+    return version
@@ -8,13 +8,20 @@ entry points during for editable installations.
 :License: MIT
 """
 
+from . import pep508
+import concurrent.futures
 import configparser
+import contextlib
 import glob2
+import io
+import mmap
 import os
+import packaging.markers
 import re
-import requirements.parser
+import stat
 import subprocess
 import sys
+import uuid
 
 
 try:
@@ -22,6 +29,21 @@ try:
 except ImportError:  # pragma: no cover
     pypandoc = None  # pragma: no cover
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # pragma: no cover
+
+# regular expressions used by the functions of this module, compiled once at import
+PATTERNS = {
+    'version': re.compile(r"^__version__ = ['\"]([^'\"]*)['\"]", re.M),
+    'data_uri': re.compile(rb'data:[^,\s]*;base64,[A-Za-z0-9+/=]+'),
+    'optional_requirements_section': re.compile(r'^\[([a-zA-Z0-9-_]+)\]$'),
+    'requirement_name': re.compile(r'^[a-zA-Z0-9_\.]+$'),
+    'comment': re.compile(r'(^|\s)#.*$'),
+    'console_script_function': re.compile(r'^\s*([a-zA-Z0-9_\.]+)\s*:\s*([a-zA-Z0-9_\.]+)\s*(\[.*\])?\s*$'),
+}
+
 
 class PackageMetadata(object):
     """ Metadata about a package
@@ -49,13 +71,173 @@ class PackageMetadata(object):
         self.dependency_links = []
 
 
-def get_package_metadata(dirname, package_name, package_data_filename_patterns=None):
+class LazyPackageMetadata(PackageMetadata):
+    """ Metadata about a package whose attributes are read from the files of the package when they are first accessed
+
+    Each attribute is read once, and only when it is accessed (e.g., accessing ``version`` only reads
+    ``package/_version.py``, without expanding the package data or parsing the requirements files). The dependency
+    attributes (``install_requires``, ``extras_require``, ``tests_require`` and ``dependency_links``) are read together.
+    Attributes which haven't been read yet aren't included in ``__dict__``; :obj:`load` reads all of the attributes.
+
+    Attributes:
+        _dirname (:obj:`str`): path to the package
+        _package_name (:obj:`str`): package name
+        _package_data_filename_patterns (:obj:`dict`): package name, optionally with glob patterns in the filenames
+        _max_workers (:obj:`int`): number of threads to expand the package data filename patterns with
+        _max_long_description_size (:obj:`int`): maximum size of the long description in bytes
+        _filesystem (:obj:`LocalFileSystem`): file system to read the package from
+    """
+
+    __slots__ = ('_dirname', '_package_name', '_package_data_filename_patterns', '_max_workers',
+                 '_max_long_description_size', '_filesystem')
+
+    LAZY_ATTRIBUTES = ('long_description', 'version', 'package_data',
+                       'install_requires', 'extras_require', 'tests_require', 'dependency_links')
+
+    def __init__(self, dirname, package_name, package_data_filename_patterns=None, max_workers=None,
+                 max_long_description_size=None, filesystem=None):
+        """
+        Args:
+            dirname (:obj:`str`): path to the package
+            package_name (:obj:`str`): package name
+            package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+            max_workers (:obj:`int`, optional): if provided, expand the package data filename patterns with a pool of
+                this number of threads (see :obj:`expand_package_data_filename_patterns`)
+            max_long_description_size (:obj:`int`, optional): if provided, memory-map ``README.rst``, strip its embedded
+                data URIs and truncate it to this number of bytes (see :obj:`get_long_description`)
+            filesystem (:obj:`LocalFileSystem`, optional): file system to read the package from; default: the file
+                system of the operating system
+        """
+        self.name = ''
+        self.description = ''
+        self._dirname = dirname
+        self._package_name = package_name
+        self._package_data_filename_patterns = package_data_filename_patterns
+        self._max_workers = max_workers
+        self._max_long_description_size = max_long_description_size
+        self._filesystem = filesystem
+
+    def __getattr__(self, name):
+        """ Read an attribute which hasn't been read yet
+
+        Args:
+            name (:obj:`str`): name of the attribute
+
+        Returns:
+            :obj:`object`: value of the attribute
+
+        Raises:
+            :obj:`AttributeError`: if the attribute isn't an attribute of the metadata
+            :obj:`ValueError:` if test or documentation dependencies are defined in `requirements.optional.txt`
+        """
+        if name not in self.LAZY_ATTRIBUTES:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+        if name == 'long_description':
+            if self._max_long_description_size is None:
+                self.long_description = get_long_description(self._dirname, filesystem=self._filesystem)
+            else:
+                self.long_description = get_long_description(self._dirname, max_size=self._max_long_description_size,
+                                                             strip_data_uris=True, use_mmap=True,
+                                                             filesystem=self._filesystem)
+        elif name == 'version':
+            self.version = get_version(self._dirname, self._package_name, filesystem=self._filesystem)
+        elif name == 'package_data':
+            self.package_data = expand_package_data_filename_patterns(
+                self._dirname, package_data_filename_patterns=self._package_data_filename_patterns,
+                max_workers=self._max_workers, filesystem=self._filesystem)
+        else:
+            install_requires, extras_require, tests_require, dependency_links = get_dependencies(
+                self._dirname, filesystem=self._filesystem)
+            for attr_name, value in [('install_requires', install_requires), ('extras_require', extras_require),
+                                     ('tests_require', tests_require), ('dependency_links', dependency_links)]:
+                # don't overwrite attributes which were set by the caller
+                self.__dict__.setdefault(attr_name, value)
+        return self.__dict__[name]
+
+    def load(self):
+        """ Read all of the attributes which haven't been read yet
+
+        Returns:
+            :obj:`LazyPackageMetadata`: metadata
+        """
+        for name in self.LAZY_ATTRIBUTES:
+            getattr(self, name)
+        return self
+
+
+class LocalFileSystem(object):
+    """ File system of the operating system
+
+    The metadata functions read packages through file systems with the methods of this class, so that packages can
+    also be read from other sources (e.g., archives, see :obj:`pkg_utils.archives.ArchiveFileSystem`).
+    """
+
+    def isfile(self, path):
+        """ Determine whether a path is a file
+
+        Args:
+            path (:obj:`str`): path
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the path is a file
+        """
+        return os.path.isfile(path)
+
+    def isdir(self, path):
+        """ Determine whether a path is a directory
+
+        Args:
+            path (:obj:`str`): path
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the path is a directory
+        """
+        return os.path.isdir(path)
+
+    def scandir(self, path):
+        """ Get the entries of a directory
+
+        Args:
+            path (:obj:`str`): path to the directory
+
+        Returns:
+            :obj:`iterator` of :obj:`os.DirEntry`: entries
+        """
+        return os.scandir(path)
+
+    def open(self, path, mode='r'):
+        """ Open a file
+
+        Args:
+            path (:obj:`str`): path to the file
+            mode (:obj:`str`, optional): mode (``r`` or ``rb``)
+
+        Returns:
+            :obj:`io.IOBase`: file
+        """
+        return open(path, mode)
+
+
+LOCAL_FILE_SYSTEM = LocalFileSystem()
+
+
+def get_package_metadata(dirname, package_name, package_data_filename_patterns=None, max_workers=None,
+                         max_long_description_size=None, filesystem=None, lazy=False):
     """ Get meta data about a package
 
     Args:
         dirname (:obj:`str`): path to the package
         package_name (:obj:`str`): package name
         package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+        max_workers (:obj:`int`, optional): if provided, expand the package data filename patterns with a pool of
+            this number of threads (see :obj:`expand_package_data_filename_patterns`)
+        max_long_description_size (:obj:`int`, optional): if provided, memory-map ``README.rst``, strip its embedded
+            data URIs and truncate it to this number of bytes (see :obj:`get_long_description`)
+        filesystem (:obj:`LocalFileSystem`, optional): file system to read the package from; default: the file
+            system of the operating system
+        lazy (:obj:`bool`, optional): if :obj:`True`, return a :obj:`LazyPackageMetadata` whose attributes are read
+            when they are first accessed
 
     Returns:
         :obj:`PackageMetadata`: meta data
@@ -63,21 +245,31 @@ def get_package_metadata(dirname, package_name, package_data_filename_patterns=N
     Raises:
         :obj:`ValueError:` if test or documentation dependencies are defined in `requirements.optional.txt`
     """
+    if lazy:
+        return LazyPackageMetadata(dirname, package_name, package_data_filename_patterns=package_data_filename_patterns,
+                                   max_workers=max_workers, max_long_description_size=max_long_description_size,
+                                   filesystem=filesystem)
+
     md = PackageMetadata()
 
     # get long description
-    md.long_description = get_long_description(dirname)
+    if max_long_description_size is None:
+        md.long_description = get_long_description(dirname, filesystem=filesystem)
+    else:
+        md.long_description = get_long_description(dirname, max_size=max_long_description_size,
+                                                   strip_data_uris=True, use_mmap=True, filesystem=filesystem)
 
     # get version
-    md.version = get_version(dirname, package_name)
+    md.version = get_version(dirname, package_name, filesystem=filesystem)
 
     # get data files
     md.package_data = expand_package_data_filename_patterns(
-        dirname, package_data_filename_patterns=package_data_filename_patterns)
+        dirname, package_data_filename_patterns=package_data_filename_patterns, max_workers=max_workers,
+        filesystem=filesystem)
 
     # get dependencies
     md.install_requires, md.extras_require, md.tests_require, md.dependency_links = get_dependencies(
-        dirname)
+        dirname, filesystem=filesystem)
 
     return md
 
@@ -85,60 +277,383 @@ def get_package_metadata(dirname, package_name, package_data_filename_patterns=N
 def convert_readme_md_to_rst(dirname):
     """ Convert the README.md to README.rst
 
+    README.rst is replaced atomically, and only if its content changes (see :obj:`write_file_if_changed`), so that
+    concurrent builds of a package never read a partially written file.
+
     Args:
         dirname (:obj:`str`): path to the package
     """
     if pypandoc and os.path.isfile(os.path.join(dirname, 'README.md')):
-        pypandoc.convert_file(os.path.join(dirname, 'README.md'), 'rst',
-                              format='md', outputfile=os.path.join(dirname, 'README.rst'))
+        content = pypandoc.convert_file(os.path.join(dirname, 'README.md'), 'rst', format='md')
+        write_file_if_changed(os.path.join(dirname, 'README.rst'), content)
+
+
+def write_file_if_changed(filename, content, executable=False):
+    """ Atomically write text to a file, unless the file already has this content
+
+    The content is written to a temporary file in the directory of the file, which then replaces the file, so that
+    readers see either the old or the new content, but never a partially written file. Concurrent writers are
+    serialized with an advisory lock on the directory (on platforms which support ``fcntl``). Files which already
+    have the content are not rewritten, so that their modification times only change when their content changes.
+
+    Args:
+        filename (:obj:`str`): path to the file
+        content (:obj:`str`): content
+        executable (:obj:`bool`, optional): if :obj:`True`, make the file executable
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the file was written
+    """
+    with _lock_directory(os.path.dirname(os.path.abspath(filename))):
+        return _write_file_if_changed(filename, content, executable=executable)
+
+
+@contextlib.contextmanager
+def _lock_directory(dirname):
+    """ Hold an exclusive advisory lock on a directory
+
+    Args:
+        dirname (:obj:`str`): path to the directory
+    """
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+
+    fd = os.open(dirname, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # closing the directory releases the lock
+        os.close(fd)
+
+
+def _write_file_if_changed(filename, content, executable=False):
+    """ Atomically write text to a file, unless the file already has this content, without locking its directory
+
+    Args:
+        filename (:obj:`str`): path to the file
+        content (:obj:`str`): content
+        executable (:obj:`bool`, optional): if :obj:`True`, make the file executable
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the file was written
+    """
+    executable_mode = stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+    try:
+        file_stat = os.stat(filename)
+    except FileNotFoundError:
+        file_stat = None
+
+    if file_stat is not None and (not executable or file_stat.st_mode & executable_mode == executable_mode):
+        try:
+            with open(filename, 'r') as file:
+                if file.read() == content:
+                    return False
+        except ValueError:
+            pass
+
+    tmp_filename = os.path.join(os.path.dirname(filename),
+                                '.{}.{}.tmp'.format(os.path.basename(filename), uuid.uuid4().hex))
+    try:
+        with open(os.open(tmp_filename, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666), 'w') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+
+        if file_stat is not None:
+            mode = stat.S_IMODE(file_stat.st_mode)
+        else:
+            mode = stat.S_IMODE(os.stat(tmp_filename).st_mode)
+        if executable:
+            mode |= executable_mode
+        os.chmod(tmp_filename, mode)
+
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        if os.path.isfile(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    return True
+
+
+class LongDescriptionStats(object):
+    """ Sizes of the long description of a package
+
+    Attributes:
+        size (:obj:`int`): size of ``README.rst`` in bytes
+        long_description_size (:obj:`int`): size of the long description in bytes after stripping and truncation
+        n_stripped (:obj:`int`): number of embedded data URIs which were stripped
+        truncated (:obj:`bool`): whether the long description was truncated
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.long_description_size = 0
+        self.n_stripped = 0
+        self.truncated = False
 
 
-def get_long_description(dirname):
+def get_long_description(dirname, max_size=None, strip_data_uris=False, use_mmap=False, stats=None, filesystem=None):
     """ Get the long description of a package from its README.rst file
 
     Args:
         dirname (:obj:`str`): path to the package
+        max_size (:obj:`int`, optional): maximum size of the long description in bytes. Longer descriptions
+            are truncated after their last complete line within this size.
+        strip_data_uris (:obj:`bool`, optional): if :obj:`True`, replace embedded base64-encoded data URIs
+            (e.g., images) with empty data URIs (``data:,``)
+        use_mmap (:obj:`bool`, optional): if :obj:`True`, memory-map ``README.rst`` rather than reading it, so that
+            only the part of the file which is kept is copied and decoded. Files of other file systems than
+            the file system of the operating system are read.
+        stats (:obj:`LongDescriptionStats`, optional): if provided, record the sizes of ``README.rst`` and the
+            long description in this object
+        filesystem (:obj:`LocalFileSystem`, optional): file system to read the package from; default: the file
+            system of the operating system
 
     Returns:
         :obj:`str`: long description
     """
-    if os.path.isfile(os.path.join(dirname, 'README.rst')):
-        with open(os.path.join(dirname, 'README.rst'), 'r') as file:
+    filesystem = filesystem or LOCAL_FILE_SYSTEM
+    filename = os.path.join(dirname, 'README.rst')
+    if not filesystem.isfile(filename):
+        return ''
+
+    if max_size is None and not strip_data_uris and not use_mmap and stats is None:
+        with filesystem.open(filename, 'r') as file:
             return file.read()
+
+    if not isinstance(filesystem, LocalFileSystem):
+        with filesystem.open(filename, 'rb') as file:
+            content = file.read()
+        size = len(content)
+        long_description, n_stripped, truncated = _shrink_long_description(content, max_size, strip_data_uris)
     else:
-        return ''
+        long_description, n_stripped, truncated, size = _read_long_description(filename, max_size, strip_data_uris,
+                                                                                use_mmap)
 
+    if stats is not None:
+        stats.size = size
+        stats.long_description_size = len(long_description)
+        stats.n_stripped = n_stripped
+        stats.truncated = truncated
 
-def get_version(dirname, package_name):
+    return long_description.decode('utf-8', errors='ignore')
+
+
+def _read_long_description(filename, max_size=None, strip_data_uris=False, use_mmap=False):
+    """ Read a long description from a file of the file system of the operating system, strip its embedded data URIs
+    and truncate it
+
+    Args:
+        filename (:obj:`str`): path to the file
+        max_size (:obj:`int`, optional): maximum size of the long description in bytes
+        strip_data_uris (:obj:`bool`, optional): if :obj:`True`, replace embedded data URIs with empty data URIs
+        use_mmap (:obj:`bool`, optional): if :obj:`True`, memory-map the file rather than reading it
+
+    Returns:
+        :obj:`bytes`: long description
+        :obj:`int`: number of stripped data URIs
+        :obj:`bool`: whether the long description was truncated
+        :obj:`int`: size of the file in bytes
+    """
+    with open(filename, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if use_mmap and size:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                long_description, n_stripped, truncated = _shrink_long_description(content, max_size, strip_data_uris)
+        else:
+            long_description, n_stripped, truncated = _shrink_long_description(file.read(), max_size, strip_data_uris)
+    return (long_description, n_stripped, truncated, size)
+
+
+def _shrink_long_description(content, max_size=None, strip_data_uris=False):
+    """ Strip embedded data URIs from a long description and truncate it
+
+    Args:
+        content (:obj:`bytes` or :obj:`mmap.mmap`): long description
+        max_size (:obj:`int`, optional): maximum size of the long description in bytes
+        strip_data_uris (:obj:`bool`, optional): if :obj:`True`, replace embedded data URIs with empty data URIs
+
+    Returns:
+        :obj:`bytes`: long description
+        :obj:`int`: number of stripped data URIs
+        :obj:`bool`: whether the long description was truncated
+    """
+    n_stripped = 0
+    if strip_data_uris:
+        # copy only the slices between the data URIs which fit within the maximum size, rather than the whole file
+        limit = len(content) if max_size is None else max_size + 1
+        pieces = []
+        size = 0
+        start = 0
+        for match in PATTERNS['data_uri'].finditer(content):
+            n_stripped += 1
+            if size < limit:
+                piece = content[start:min(match.start(), start + limit - size)]
+                pieces.extend([piece, b'data:,'])
+                size += len(piece) + len(b'data:,')
+            start = match.end()
+        if size < limit:
+            pieces.append(content[start:start + limit - size])
+        content = b''.join(pieces)
+
+    truncated = max_size is not None and len(content) > max_size
+    if truncated:
+        content = content[0:max_size]
+        i_newline = content.rfind(b'\n')
+        if i_newline >= 0:
+            content = content[0:i_newline + 1]
+    else:
+        content = content[:]
+
+    return (content, n_stripped, truncated)
+
+
+def get_version(dirname, package_name, filesystem=None):
     """ Get the version a package from its version file (``package/_version.py``)
 
     Args:
         dirname (:obj:`str`): path to the package
         package_name (:obj:`str`): package name
+        filesystem (:obj:`LocalFileSystem`, optional): file system to read the package from; default: the file
+            system of the operating system
 
     Returns:
         :obj:`str`: version
     """
+    filesystem = filesystem or LOCAL_FILE_SYSTEM
+
     # get version from _version.py file
     filename = os.path.join(dirname, package_name, "_version.py")
-    if os.path.isfile(filename):
-        verstrline = open(filename, "rt").read()
-        VSRE = r"^__version__ = ['\"]([^'\"]*)['\"]"
-        mo = re.search(VSRE, verstrline, re.M)
+    if filesystem.isfile(filename):
+        with filesystem.open(filename, "r") as file:
+            verstrline = file.read()
+        mo = PATTERNS['version'].search(verstrline)
         if mo:
             version = mo.group(1)
             return version
 
 
-def expand_package_data_filename_patterns(dirname, package_data_filename_patterns=None):
+EXCLUDED_DIRECTORY_PATTERNS = (
+    '**/.git',
+    '**/.hg',
+    '**/.svn',
+    '**/.tox',
+    '**/.nox',
+    '**/.eggs',
+    '**/__pycache__',
+    '**/node_modules',
+)
+
+
+class PackageDataStats(object):
+    """ Sizes of the data files of a package
+
+    Attributes:
+        sizes (:obj:`dict` of :obj:`int`): dictionary which maps each module to the total size of its data files in bytes
+        counts (:obj:`dict` of :obj:`int`): dictionary which maps each module to the number of its data files
+        largest_files (:obj:`list` of :obj:`tuple`): sizes, modules and paths of the largest data files, from
+            the largest to the smallest
+        n_largest_files (:obj:`int`): number of largest files to report
+    """
+
+    def __init__(self, n_largest_files=10):
+        self.sizes = {}
+        self.counts = {}
+        self.largest_files = []
+        self.n_largest_files = n_largest_files
+
+    @property
+    def total_size(self):
+        """ Get the total size of the data files of all of the modules
+
+        Returns:
+            :obj:`int`: size in bytes
+        """
+        return sum(self.sizes.values())
+
+    @property
+    def total_count(self):
+        """ Get the total number of data files of all of the modules
+
+        Returns:
+            :obj:`int`: number of files
+        """
+        return sum(self.counts.values())
+
+    def add(self, module, filename, size):
+        """ Add a data file
+
+        Args:
+            module (:obj:`str`): module
+            filename (:obj:`str`): path of the file relative to the module
+            size (:obj:`int`): size of the file in bytes
+        """
+        self.sizes[module] = self.sizes.get(module, 0) + size
+        self.counts[module] = self.counts.get(module, 0) + 1
+        if self.n_largest_files:
+            self.largest_files.append((size, module, filename))
+            self.largest_files.sort(key=lambda file: (-file[0], file[1], file[2]))
+            del self.largest_files[self.n_largest_files:]
+
+
+def expand_package_data_filename_patterns(dirname, package_data_filename_patterns=None, max_workers=None,
+                                          exclude_filename_patterns=None, ignore_filename=None,
+                                          max_size=None, max_files=None, stats=None, filesystem=None):
     """ Expand the package data filenames
 
     Args:
+        dirname (:obj:`str`): path to the package
+        package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+        max_workers (:obj:`int`, optional): if provided, walk the directories of the modules with a pool of this
+            number of threads rather than with :obj:`glob2.iglob`. This is faster for large trees on file
+            systems with high latency, such as network file systems.
+        exclude_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns of files and
+            directories to exclude. Excluded directories are not descended into. :obj:`EXCLUDED_DIRECTORY_PATTERNS`
+            can be used to exclude version control, cache and build directories.
+        ignore_filename (:obj:`str`, optional): name of ``.gitignore``-style files (e.g., ``.gitignore``) whose
+            patterns exclude files and directories in the directories which contain them and their subdirectories
+        max_size (:obj:`int`, optional): maximum total size of the data files of all of the modules in bytes
+        max_files (:obj:`int`, optional): maximum total number of data files of all of the modules
+        stats (:obj:`PackageDataStats`, optional): if provided, record the sizes of the data files in this object
+        filesystem (:obj:`LocalFileSystem`, optional): file system to read the package from; default: the file
+            system of the operating system. The directories of other file systems are walked rather than globbed.
+
+    Returns:
         :obj:`dict`: package data
+
+    Raises:
+        :obj:`ValueError`: if the data files exceed :obj:`max_size` or :obj:`max_files`. The expansion stops as soon
+            as a budget is exceeded.
     """
     package_data_filename_patterns = package_data_filename_patterns or {}
+    exclude_filename_patterns = exclude_filename_patterns or {}
+    walk = (max_workers or exclude_filename_patterns or ignore_filename or max_size is not None or max_files is not None
+            or stats is not None or filesystem is not None)
+
+    if stats is None and (max_size is not None or max_files is not None):
+        stats = PackageDataStats(n_largest_files=0)
+
     package_data = {}
     for module, filename_patterns in package_data_filename_patterns.items():
+        if walk:
+            def add_files(files, module=module):
+                for filename, size in files:
+                    stats.add(module, filename, size)
+                if max_size is not None and stats.total_size > max_size:
+                    raise ValueError('Package data exceeds the maximum size of {} bytes'.format(max_size))
+                if max_files is not None and stats.total_count > max_files:
+                    raise ValueError('Package data exceeds the maximum number of {} files'.format(max_files))
+
+            package_data[module] = walk_package_data(os.path.join(dirname, module), filename_patterns,
+                                                     max_workers=max_workers or 1,
+                                                     exclude_patterns=exclude_filename_patterns.get(module),
+                                                     ignore_filename=ignore_filename,
+                                                     callback=add_files if stats is not None else None,
+                                                     filesystem=filesystem)
+            continue
+
         module_filenames = []
 
         for filename_pattern in filename_patterns:
@@ -151,7 +666,376 @@ def expand_package_data_filename_patterns(dirname, package_data_filename_pattern
     return package_data
 
 
-def get_dependencies(dirname, include_uri=False, include_extras=True, include_specs=True, include_markers=True):
+def walk_package_data(dirname, filename_patterns, max_workers=1, exclude_patterns=None, ignore_filename=None, callback=None,
+                      filesystem=None):
+    """ Find the files in a directory which match glob patterns by walking the directory with a pool of threads
+
+    Subdirectories are scanned concurrently, and subdirectories which are excluded or which cannot contain
+    matches for any pattern are not descended into. The patterns have the same semantics as :obj:`glob2.iglob`
+    with hidden files and recursion (``**``) enabled.
+
+    Args:
+        dirname (:obj:`str`): path to the directory
+        filename_patterns (:obj:`list` of :obj:`str`): glob patterns relative to :obj:`dirname`
+        max_workers (:obj:`int`, optional): number of threads
+        exclude_patterns (:obj:`list` of :obj:`str`, optional): glob patterns of files and directories to exclude
+        ignore_filename (:obj:`str`, optional): name of ``.gitignore``-style files whose patterns exclude files and
+            directories in the directories which contain them and their subdirectories
+        callback (:obj:`callable`, optional): function which is called with a list of the relative paths and sizes of the
+            matching files of each directory as soon as the directory has been scanned. The walk stops if the function
+            raises an exception.
+        filesystem (:obj:`LocalFileSystem`, optional): file system to walk; default: the file system of the
+            operating system
+
+    Returns:
+        :obj:`list` of :obj:`str`: sorted paths of the matching files relative to :obj:`dirname`
+    """
+    filesystem = filesystem or LOCAL_FILE_SYSTEM
+    patterns = [_compile_filename_pattern(filename_pattern) for filename_pattern in filename_patterns]
+    excludes = [_compile_exclude_pattern(exclude_pattern) for exclude_pattern in (exclude_patterns or [])]
+    if not patterns or not filesystem.isdir(dirname):
+        return []
+
+    def scan(rel_dir_parts, ignore_rules):
+        abs_dirname = os.path.join(dirname, *rel_dir_parts)
+        if ignore_filename and filesystem.isfile(os.path.join(abs_dirname, ignore_filename)):
+            ignore_rules = ignore_rules + read_ignore_file(os.path.join(abs_dirname, ignore_filename), len(rel_dir_parts),
+                                                           filesystem=filesystem)
+
+        files = []
+        subdirs = []
+        for entry in filesystem.scandir(abs_dirname):
+            rel_parts = rel_dir_parts + (entry.name,)
+            rel_path = '/'.join(rel_parts)
+            if entry.is_dir():
+                if (any(_could_match_dir(rel_parts, component_regexes) for _, component_regexes in patterns)
+                        and not any(dir_regex.match(rel_path) for _, dir_regex in excludes)
+                        and not _is_ignored(rel_parts, True, ignore_rules)
+                        and not (entry.is_symlink() and _is_link_to_ancestor(entry, dirname, rel_dir_parts))):
+                    subdirs.append((rel_parts, ignore_rules))
+            elif entry.is_file():
+                if (any(path_regex.match(rel_path) for path_regex, _ in patterns)
+                        and not any(path_regex.match(rel_path) for path_regex, _ in excludes)
+                        and not _is_ignored(rel_parts, False, ignore_rules)):
+                    files.append((os.path.join(*rel_parts), entry.stat().st_size if callback else None))
+        return (files, subdirs)
+
+    filenames = []
+
+    def add_files(files):
+        filenames.extend(filename for filename, _ in files)
+        if callback and files:
+            callback(files)
+
+    if max_workers <= 1:
+        queue = [((), [])]
+        while queue:
+            files, subdirs = scan(*queue.pop())
+            add_files(files)
+            queue += subdirs
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = set([executor.submit(scan, (), [])])
+            try:
+                while pending:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        files, subdirs = future.result()
+                        add_files(files)
+                        for subdir in subdirs:
+                            pending.add(executor.submit(scan, *subdir))
+            except Exception:
+                for future in pending:
+                    future.cancel()
+                raise
+
+    return sorted(set(filenames))
+
+
+def _is_link_to_ancestor(entry, dirname, rel_dir_parts):
+    """ Determine whether a symbolic link to a directory points to the directory which contains it or one of its
+    ancestors within a walk, which would make the walk cyclic
+
+    Args:
+        entry (:obj:`os.DirEntry`): symbolic link
+        dirname (:obj:`str`): path to the root of the walk
+        rel_dir_parts (:obj:`tuple` of :obj:`str`): components of the path of the directory which contains the link,
+            relative to the root of the walk
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the link points to the directory which contains it or one of its ancestors
+    """
+    try:
+        target = entry.stat()
+    except OSError:
+        return True
+    for i_part in range(len(rel_dir_parts) + 1):
+        ancestor = os.stat(os.path.join(dirname, *rel_dir_parts[:i_part]))
+        if (ancestor.st_dev, ancestor.st_ino) == (target.st_dev, target.st_ino):
+            return True
+    return False
+
+
+def read_ignore_file(filename, depth=0, filesystem=None):
+    """ Read the rules of a ``.gitignore``-style file
+
+    Blank lines, comments (``#``), negation (``!``), patterns anchored to the directory of the file (patterns
+    which contain ``/``), patterns which only match directories (trailing ``/``) and recursive patterns
+    (``**``) are supported.
+
+    Args:
+        filename (:obj:`str`): path to the file
+        depth (:obj:`int`, optional): depth of the directory of the file relative to the root of the walk
+        filesystem (:obj:`LocalFileSystem`, optional): file system to read the file from; default: the file system
+            of the operating system
+
+    Returns:
+        :obj:`list` of :obj:`tuple`: depth of the directory of the file, regular expression for paths relative
+            to the directory, whether the rule is negated, and whether the rule only matches directories
+    """
+    rules = []
+    with (filesystem or LOCAL_FILE_SYSTEM).open(filename, 'r') as file:
+        for line in file:
+            line = line.rstrip('\n').rstrip()
+            if not line or line.startswith('#'):
+                continue
+
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            elif line.startswith('\\'):
+                line = line[1:]
+
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+
+            if '/' in line:
+                line = line.lstrip('/')
+            else:
+                line = '**/' + line
+
+            path_regex, _ = _compile_filename_pattern(line)
+            rules.append((depth, path_regex, negate, dir_only))
+    return rules
+
+
+def _is_ignored(rel_parts, is_dir, ignore_rules):
+    """ Determine whether a file or directory is ignored by the rules of ``.gitignore``-style files
+
+    Args:
+        rel_parts (:obj:`tuple` of :obj:`str`): components of the path relative to the root of the walk
+        is_dir (:obj:`bool`): whether the path is a directory
+        ignore_rules (:obj:`list` of :obj:`tuple`): rules (see :obj:`read_ignore_file`), from the least to the most
+            specific. The last matching rule wins.
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the path is ignored
+    """
+    ignored = False
+    for depth, path_regex, negate, dir_only in ignore_rules:
+        if dir_only and not is_dir:
+            continue
+        if path_regex.match('/'.join(rel_parts[depth:])):
+            ignored = not negate
+    return ignored
+
+
+def _compile_exclude_pattern(exclude_pattern):
+    """ Compile a glob pattern of files and directories to exclude
+
+    Args:
+        exclude_pattern (:obj:`str`): glob pattern
+
+    Returns:
+        :obj:`re.Pattern`: regular expression for the paths of excluded files
+        :obj:`re.Pattern`: regular expression for the paths of excluded directories, including directories
+            whose contents are excluded by patterns which end with ``/**``
+    """
+    path_regex, _ = _compile_filename_pattern(exclude_pattern)
+    parts = [part for part in exclude_pattern.replace(os.sep, '/').split('/') if part]
+    if len(parts) > 1 and parts[-1] == '**':
+        dir_regex, _ = _compile_filename_pattern('/'.join(parts[:-1]))
+        dir_regex = re.compile('(?:{})|(?:{})'.format(path_regex.pattern, dir_regex.pattern), path_regex.flags)
+    else:
+        dir_regex = path_regex
+    return (path_regex, dir_regex)
+
+
+def _compile_filename_pattern(filename_pattern):
+    """ Compile a glob pattern into a regular expression for relative paths with ``/`` separators
+    and a list of regular expressions for each of its components
+
+    Args:
+        filename_pattern (:obj:`str`): glob pattern
+
+    Returns:
+        :obj:`re.Pattern`: regular expression for paths
+        :obj:`list` of :obj:`re.Pattern`: regular expressions for each component, or :obj:`None` for ``**``
+    """
+    # normalize the ``.`` and ``..`` components, as the paths matched by :obj:`glob2.iglob` are normalized
+    parts = []
+    for part in filename_pattern.replace(os.sep, '/').split('/'):
+        if part == '..' and parts and parts[-1] != '..':
+            parts.pop()
+        elif part and part != '.':
+            parts.append(part)
+    flags = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+
+    path_regex = ''
+    component_regexes = []
+    for i_part, part in enumerate(parts):
+        is_last = i_part == len(parts) - 1
+        if part == '**':
+            path_regex += '(?:[^/]+/)*' + ('[^/]+' if is_last else '')
+            component_regexes.append(None)
+        else:
+            component_regex = _translate_filename_pattern_component(part)
+            path_regex += component_regex + ('' if is_last else '/')
+            component_regexes.append(re.compile('^' + component_regex + '$', flags))
+
+    return (re.compile('^' + path_regex + '$', flags), component_regexes)
+
+
+def _translate_filename_pattern_component(part):
+    """ Translate a component of a glob pattern into a regular expression which doesn't match ``/``
+
+    Args:
+        part (:obj:`str`): component of a glob pattern
+
+    Returns:
+        :obj:`str`: regular expression
+    """
+    regex = ''
+    i_char = 0
+    while i_char < len(part):
+        char = part[i_char]
+        i_char += 1
+        if char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '[':
+            i_end = i_char
+            if i_end < len(part) and part[i_end] == '!':
+                i_end += 1
+            if i_end < len(part) and part[i_end] == ']':
+                i_end += 1
+            i_end = part.find(']', i_end)
+            if i_end == -1:
+                regex += re.escape(char)
+            else:
+                chars = part[i_char:i_end].replace('\\', '\\\\').replace('[', '\\[')
+                if chars.startswith('!'):
+                    chars = '^' + chars[1:]
+                elif chars.startswith('^'):
+                    chars = '\\' + chars
+                regex += '[' + chars + ']'
+                i_char = i_end + 1
+        else:
+            regex += re.escape(char)
+    return regex
+
+
+def _could_match_dir(rel_dir_parts, component_regexes):
+    """ Determine whether a directory could contain files which match a glob pattern
+
+    Args:
+        rel_dir_parts (:obj:`tuple` of :obj:`str`): components of the path of the directory
+        component_regexes (:obj:`list` of :obj:`re.Pattern`): regular expressions for each component of the
+            pattern, or :obj:`None` for ``**``
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the directory could contain matching files
+    """
+    for i_part, part in enumerate(rel_dir_parts):
+        if i_part >= len(component_regexes):
+            return False
+        component_regex = component_regexes[i_part]
+        if component_regex is None:
+            return True
+        if i_part == len(component_regexes) - 1 or not component_regex.match(part):
+            return False
+    return True
+
+
+RESERVED_OPTIONS = {
+    'tests': 'Test dependencies should be defined in `tests/requirements`',
+    'docs': 'Documentation dependencies should be defined in `docs/requirements`',
+}
+
+
+class RequirementError(object):
+    """ Invalid line of a requirements file
+
+    Attributes:
+        filename (:obj:`str`): path to the requirements file
+        line_number (:obj:`int`): line number, starting from 1
+        line (:obj:`str`): line
+        message (:obj:`str`): description of the error
+        column (:obj:`int`): column of the error, starting from 1
+        code (:obj:`str`): type of the error (e.g., ``invalid-syntax``, ``invalid-name``, ``editable``, ``local-file``,
+            ``missing-version-hint``, ``invalid-section``, ``requirement-outside-section``, ``reserved-option``)
+    """
+
+    def __init__(self, filename, line_number, line, message, column=None, code=None):
+        """
+        Args:
+            filename (:obj:`str`): path to the requirements file
+            line_number (:obj:`int`): line number, starting from 1
+            line (:obj:`str`): line
+            message (:obj:`str`): description of the error
+            column (:obj:`int`, optional): column of the error, starting from 1
+            code (:obj:`str`, optional): type of the error
+        """
+        self.filename = filename
+        self.line_number = line_number
+        self.line = line
+        self.message = message
+        self.column = column
+        self.code = code
+
+    def __eq__(self, other):
+        return isinstance(other, RequirementError) and self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return 'RequirementError({!r}, {!r}, {!r}, {!r}, column={!r}, code={!r})'.format(
+            self.filename, self.line_number, self.line, self.message, self.column, self.code)
+
+    def __str__(self):
+        location = [str(self.filename)]
+        if self.line_number is not None:
+            location.append(str(self.line_number))
+            if self.column is not None:
+                location.append(str(self.column))
+        if self.code:
+            return '{}: {}: {}'.format(':'.join(location), self.code, self.message)
+        return '{}: {}'.format(':'.join(location), self.message)
+
+
+class RequirementParseError(ValueError):
+    """ Error parsing a line of a requirements file
+
+    Attributes:
+        code (:obj:`str`): type of the error (see :obj:`RequirementError`)
+        column (:obj:`int`): column of the error in the stripped line, starting from 1
+    """
+
+    def __init__(self, message, code, column=None):
+        """
+        Args:
+            message (:obj:`str`): description of the error
+            code (:obj:`str`): type of the error
+            column (:obj:`int`, optional): column of the error in the stripped line, starting from 1
+        """
+        super(RequirementParseError, self).__init__(message)
+        self.code = code
+        self.column = column
+
+
+def get_dependencies(dirname, include_uri=False, include_extras=True, include_specs=True, include_markers=True,
+        evaluate_markers=False, environment=None, diagnostics=None, filesystem=None):
     """ Parse required and optional dependencies from requirements.txt files
 
     Args:
@@ -160,6 +1044,14 @@ def get_dependencies(dirname, include_uri=False, include_extras=True, include_sp
         include_extras (:obj:`bool`, optional): if :obj:`True`, include extras in the dependencies list
         include_specs (:obj:`bool`, optional): if :obj:`True`, include specifications in the dependencies list
         include_markers (:obj:`bool`, optional): if :obj:`True`, include markers in the dependencies list
+        evaluate_markers (:obj:`bool`, optional): if :obj:`True`, discard dependencies whose markers don't apply to :obj:`environment`
+        environment (:obj:`dict`, optional): environment to evaluate markers against (e.g. ``python_version``,
+            ``sys_platform``); default: the current environment
+        diagnostics (:obj:`list`, optional): if provided, rather than raising an error for the first invalid line,
+            append a :obj:`RequirementError` to this list for each invalid line, and return the dependencies of
+            the valid lines
+        filesystem (:obj:`LocalFileSystem`, optional): file system to read the package from; default: the file
+            system of the operating system
 
     Returns:
         :obj:`list` of :obj:`str`: requirements
@@ -172,33 +1064,66 @@ def get_dependencies(dirname, include_uri=False, include_extras=True, include_sp
     install_requires, tmp = parse_requirements_file(
         os.path.join(dirname, 'requirements.txt'),
         include_uri=include_uri, include_extras=include_extras,
-        include_specs=include_specs, include_markers=include_markers)
+        include_specs=include_specs, include_markers=include_markers,
+        evaluate_markers=evaluate_markers, environment=environment, diagnostics=diagnostics, filesystem=filesystem)
     dependency_links += tmp
 
     extras_require, tmp = parse_optional_requirements_file(
         os.path.join(dirname, 'requirements.optional.txt'),
         include_uri=include_uri, include_extras=include_extras,
-        include_specs=include_specs, include_markers=include_markers)
+        include_specs=include_specs, include_markers=include_markers,
+        evaluate_markers=evaluate_markers, environment=environment, diagnostics=diagnostics, filesystem=filesystem)
     dependency_links += tmp
 
     tests_require, tmp = parse_requirements_file(
         os.path.join(dirname, 'tests/requirements.txt'),
         include_uri=include_uri, include_extras=include_extras,
-        include_specs=include_specs, include_markers=include_markers)
+        include_specs=include_specs, include_markers=include_markers,
+        evaluate_markers=evaluate_markers, environment=environment, diagnostics=diagnostics, filesystem=filesystem)
     dependency_links += tmp
 
     docs_require, tmp = parse_requirements_file(
         os.path.join(dirname, 'docs/requirements.txt'),
         include_uri=include_uri, include_extras=include_extras,
-        include_specs=include_specs, include_markers=include_markers)
+        include_specs=include_specs, include_markers=include_markers,
+        evaluate_markers=evaluate_markers, environment=environment, diagnostics=diagnostics, filesystem=filesystem)
     dependency_links += tmp
 
-    if 'tests' in extras_require and extras_require['tests']:
-        raise ValueError(
-            'Test dependencies should be defined in `tests/requirements`')
-    if 'docs' in extras_require and extras_require['docs']:
-        raise ValueError(
-            'Documentation dependencies should be defined in `docs/requirements`')
+    if diagnostics is not None:
+        for option, message in RESERVED_OPTIONS.items():
+            if extras_require.get(option):
+                diagnostics.append(RequirementError(os.path.join(dirname, 'requirements.optional.txt'), None, None, message,
+                                                    code='reserved-option'))
+                extras_require.pop(option)
+
+    return merge_dependencies(install_requires, extras_require, tests_require, docs_require, dependency_links)
+
+
+def merge_dependencies(install_requires, extras_require, tests_require, docs_require, dependency_links):
+    """ Merge the dependencies parsed from requirements.txt files into the ``tests``, ``docs``, and ``all``
+    options, remove the required dependencies from the options, and sort and deduplicate the dependencies
+
+    Args:
+        install_requires (:obj:`list` of :obj:`str`): requirements, e.g. from ``requirements.txt``
+        extras_require (:obj:`dict` of :obj:`list` of :obj:`str`): optional requirements, e.g. from ``requirements.optional.txt``
+        tests_require (:obj:`list` of :obj:`str`): test requirements, e.g. from ``tests/requirements.txt``
+        docs_require (:obj:`list` of :obj:`str`): documentation requirements, e.g. from ``docs/requirements.txt``
+        dependency_links (:obj:`list` of :obj:`str`): dependency links
+
+    Returns:
+        :obj:`list` of :obj:`str`: requirements
+        :obj:`list` of :obj:`str`: extra/optional requirements
+        :obj:`list` of :obj:`str`: test requirements
+        :obj:`list` of :obj:`str`: dependency links
+
+    Raises:
+        :obj:`ValueError:` if test or documentation dependencies are defined in the optional requirements
+    """
+    extras_require = dict(extras_require)
+
+    for option in ['tests', 'docs']:
+        if option in extras_require and extras_require[option]:
+            raise ValueError(RESERVED_OPTIONS[option])
 
     extras_require['tests'] = tests_require
     extras_require['docs'] = docs_require
@@ -231,7 +1156,8 @@ def get_dependencies(dirname, include_uri=False, include_extras=True, include_sp
     return (install_requires, extras_require, tests_require, dependency_links)
 
 
-def parse_requirements_file(filename, include_uri=False, include_extras=True, include_specs=True, include_markers=True):
+def parse_requirements_file(filename, include_uri=False, include_extras=True, include_specs=True, include_markers=True,
+        evaluate_markers=False, environment=None, diagnostics=None, filesystem=None):
     """ Parse a requirements.txt file into list of requirements and dependency links
 
     Args:
@@ -240,22 +1166,34 @@ def parse_requirements_file(filename, include_uri=False, include_extras=True, in
         include_extras (:obj:`bool`, optional): if :obj:`True`, include extras in the dependencies list
         include_specs (:obj:`bool`, optional): if :obj:`True`, include specifications in the dependencies list
         include_markers (:obj:`bool`, optional): if :obj:`True`, include markers in the dependencies list
+        evaluate_markers (:obj:`bool`, optional): if :obj:`True`, discard dependencies whose markers don't apply to :obj:`environment`
+        environment (:obj:`dict`, optional): environment to evaluate markers against (e.g. ``python_version``,
+            ``sys_platform``); default: the current environment
+        diagnostics (:obj:`list`, optional): if provided, rather than raising an error for the first invalid line,
+            append a :obj:`RequirementError` to this list for each invalid line, and return the dependencies of
+            the valid lines
+        filesystem (:obj:`LocalFileSystem`, optional): file system to read the file from; default: the file system
+            of the operating system
 
     Returns:
         :obj:`list` of :obj:`str`: requirements
         :obj:`list` of :obj:`str`: dependency links
     """
-    if os.path.isfile(filename):
-        with open(filename, 'r') as file:
+    filesystem = filesystem or LOCAL_FILE_SYSTEM
+    if filesystem.isfile(filename):
+        with filesystem.open(filename, 'r') as file:
             lines = file.readlines()
     else:
         lines = []
     return parse_requirement_lines(lines,
                                    include_uri=include_uri, include_extras=include_extras,
-                                   include_specs=include_specs, include_markers=include_markers)
+                                   include_specs=include_specs, include_markers=include_markers,
+                                   evaluate_markers=evaluate_markers, environment=environment,
+                                   diagnostics=diagnostics, filename=filename)
 
 
-def parse_optional_requirements_file(filename, include_uri=False, include_extras=True, include_specs=True, include_markers=True):
+def parse_optional_requirements_file(filename, include_uri=False, include_extras=True, include_specs=True, include_markers=True,
+        evaluate_markers=False, environment=None, diagnostics=None, filesystem=None):
     """ Parse a requirements.optional.txt file into list of requirements and dependency links
 
     Args:
@@ -264,6 +1202,52 @@ def parse_optional_requirements_file(filename, include_uri=False, include_extras
         include_extras (:obj:`bool`, optional): if :obj:`True`, include extras in the dependencies list
         include_specs (:obj:`bool`, optional): if :obj:`True`, include specifications in the dependencies list
         include_markers (:obj:`bool`, optional): if :obj:`True`, include markers in the dependencies list
+        evaluate_markers (:obj:`bool`, optional): if :obj:`True`, discard dependencies whose markers don't apply to :obj:`environment`
+        environment (:obj:`dict`, optional): environment to evaluate markers against (e.g. ``python_version``,
+            ``sys_platform``); default: the current environment
+        diagnostics (:obj:`list`, optional): if provided, rather than raising an error for the first invalid line,
+            append a :obj:`RequirementError` to this list for each invalid line, and return the dependencies of
+            the valid lines
+        filesystem (:obj:`LocalFileSystem`, optional): file system to read the file from; default: the file system
+            of the operating system
+
+    Returns:
+        :obj:`dict` of :obj:`list` of :obj:`str`: requirements
+        :obj:`list` of :obj:`str`: dependency links
+
+    Raises:
+        :obj:`ValueError`: if a line cannot be parsed
+    """
+    filesystem = filesystem or LOCAL_FILE_SYSTEM
+    if filesystem.isfile(filename):
+        with filesystem.open(filename, 'r') as file:
+            lines = file.readlines()
+    else:
+        lines = []
+    return parse_optional_requirement_lines(lines,
+                                            include_uri=include_uri, include_extras=include_extras,
+                                            include_specs=include_specs, include_markers=include_markers,
+                                            evaluate_markers=evaluate_markers, environment=environment,
+                                            diagnostics=diagnostics, filename=filename)
+
+
+def parse_optional_requirement_lines(lines, include_uri=False, include_extras=True, include_specs=True,
+        include_markers=True, evaluate_markers=False, environment=None, diagnostics=None, filename=None):
+    """ Parse lines from a requirements.optional.txt file into list of requirements and dependency links
+
+    Args:
+        lines (:obj:`list` of :obj:`str`): lines from a requirements.optional.txt file
+        include_uri (:obj:`bool`, optional): if :obj:`True`, include URI in the dependencies list
+        include_extras (:obj:`bool`, optional): if :obj:`True`, include extras in the dependencies list
+        include_specs (:obj:`bool`, optional): if :obj:`True`, include specifications in the dependencies list
+        include_markers (:obj:`bool`, optional): if :obj:`True`, include markers in the dependencies list
+        evaluate_markers (:obj:`bool`, optional): if :obj:`True`, discard dependencies whose markers don't apply to :obj:`environment`
+        environment (:obj:`dict`, optional): environment to evaluate markers against (e.g. ``python_version``,
+            ``sys_platform``); default: the current environment
+        diagnostics (:obj:`list`, optional): if provided, rather than raising an error for the first invalid line,
+            append a :obj:`RequirementError` to this list for each invalid line, and return the dependencies of
+            the valid lines
+        filename (:obj:`str`, optional): path to the file of the lines, for the diagnostics
 
     Returns:
         :obj:`dict` of :obj:`list` of :obj:`str`: requirements
@@ -273,37 +1257,56 @@ def parse_optional_requirements_file(filename, include_uri=False, include_extras
         :obj:`ValueError`: if a line cannot be parsed
     """
     option = None
+    invalid_section = False
     extras_require = {}
     dependency_links = []
 
-    if os.path.isfile(filename):
-        with open(filename, 'r') as file:
-            for line in file:
-                line = line.strip()
-                if not line or line[0] == '#':
-                    continue
-                if line[0] == '[':
-                    match = re.match(r'^\[([a-zA-Z0-9-_]+)\]$', line)
-                    if not match:
-                        raise ValueError(
-                            'Could not parse optional dependency: {}'.format(line))
-                    option = match.group(1)
-                else:
-                    if option is None:
-                        raise ValueError(
-                            "Required dependencies should not be placed in an optional dependencies file: {}".format(line))
-                    tmp1, tmp2 = parse_requirement_lines([line],
-                                                         include_uri=include_uri, include_extras=include_extras,
-                                                         include_specs=include_specs, include_markers=include_markers)
-                    if option not in extras_require:
-                        extras_require[option] = []
-                    extras_require[option] += tmp1
-                    dependency_links += tmp2
+    for line_number, raw_line in enumerate(lines, 1):
+        line = raw_line.strip()
+        if not line or line[0] == '#':
+            continue
+        if line[0] == '[':
+            match = PATTERNS['optional_requirements_section'].match(line)
+            if not match:
+                error = RequirementParseError(
+                    'Could not parse optional dependency: {}'.format(line), 'invalid-section')
+                if diagnostics is None:
+                    raise error
+                diagnostics.append(_get_requirement_error(error, filename, line_number, raw_line))
+
+                # check the lines of the invalid section, but don't add them to the previous section
+                option = None
+                invalid_section = True
+                continue
+            option = match.group(1)
+            invalid_section = False
+        else:
+            if option is None and not invalid_section:
+                error = RequirementParseError(
+                    "Required dependencies should not be placed in an optional dependencies file: {}".format(line),
+                    'requirement-outside-section')
+                if diagnostics is None:
+                    raise error
+                diagnostics.append(_get_requirement_error(error, filename, line_number, raw_line))
+                continue
+            tmp1, tmp2 = parse_requirement_lines([raw_line],
+                                                 include_uri=include_uri, include_extras=include_extras,
+                                                 include_specs=include_specs, include_markers=include_markers,
+                                                 evaluate_markers=evaluate_markers, environment=environment,
+                                                 diagnostics=diagnostics, filename=filename,
+                                                 first_line_number=line_number)
+            if invalid_section:
+                continue
+            if option not in extras_require:
+                extras_require[option] = []
+            extras_require[option] += tmp1
+            dependency_links += tmp2
 
     return (extras_require, dependency_links)
 
 
-def parse_requirement_lines(lines, include_uri=False, include_extras=True, include_specs=True, include_markers=True):
+def parse_requirement_lines(lines, include_uri=False, include_extras=True, include_specs=True, include_markers=True,
+        evaluate_markers=False, environment=None, diagnostics=None, filename=None, first_line_number=1):
     """ Parse lines from a requirements.txt file into list of requirements and dependency links
 
     Args:
@@ -312,6 +1315,14 @@ def parse_requirement_lines(lines, include_uri=False, include_extras=True, inclu
         include_extras (:obj:`bool`, optional): if :obj:`True`, include extras in the dependencies list
         include_specs (:obj:`bool`, optional): if :obj:`True`, include specifications in the dependencies list
         include_markers (:obj:`bool`, optional): if :obj:`True`, include markers in the dependencies list
+        evaluate_markers (:obj:`bool`, optional): if :obj:`True`, discard dependencies whose markers don't apply to :obj:`environment`
+        environment (:obj:`dict`, optional): environment to evaluate markers against (e.g. ``python_version``,
+            ``sys_platform``); default: the current environment
+        diagnostics (:obj:`list`, optional): if provided, rather than raising an error for the first invalid line,
+            append a :obj:`RequirementError` to this list for each invalid line, and return the dependencies of
+            the valid lines
+        filename (:obj:`str`, optional): path to the file of the lines, for the diagnostics
+        first_line_number (:obj:`int`, optional): line number of the first line, for the diagnostics
 
     Returns:
         :obj:`list` of :obj:`str`: requirements
@@ -320,10 +1331,17 @@ def parse_requirement_lines(lines, include_uri=False, include_extras=True, inclu
     requires = []
     dependency_links = []
 
-    for line in lines:
-        requirement, dependency_link = parse_requirement_line(
-            line, include_uri=include_uri, include_extras=include_extras,
-            include_specs=include_specs, include_markers=include_markers)
+    for line_number, line in enumerate(lines, first_line_number):
+        try:
+            requirement, dependency_link = parse_requirement_line(
+                line, include_uri=include_uri, include_extras=include_extras,
+                include_specs=include_specs, include_markers=include_markers,
+                evaluate_markers=evaluate_markers, environment=environment)
+        except ValueError as exception:
+            if diagnostics is None:
+                raise
+            diagnostics.append(_get_requirement_error(exception, filename, line_number, line))
+            continue
         if requirement:
             requires.append(requirement)
         if dependency_link:
@@ -332,7 +1350,29 @@ def parse_requirement_lines(lines, include_uri=False, include_extras=True, inclu
     return (requires, dependency_links)
 
 
-def parse_requirement_line(line, include_uri=False, include_extras=True, include_specs=True, include_markers=True):
+def _get_requirement_error(exception, filename, line_number, line):
+    """ Get a diagnostic for an error parsing a line of a requirements file
+
+    Args:
+        exception (:obj:`ValueError`): error
+        filename (:obj:`str`): path to the requirements file
+        line_number (:obj:`int`): line number, starting from 1
+        line (:obj:`str`): line
+
+    Returns:
+        :obj:`RequirementError`: diagnostic
+    """
+    line = line.rstrip('\r\n')
+    indent = len(line) - len(line.lstrip())
+    message, _, _ = str(exception).partition('\n')
+    code = getattr(exception, 'code', 'invalid-syntax')
+    column = getattr(exception, 'column', None)
+    return RequirementError(filename, line_number, line, message,
+                            column=indent + (column or 1), code=code)
+
+
+def parse_requirement_line(line, include_uri=False, include_extras=True, include_specs=True, include_markers=True,
+        evaluate_markers=False, environment=None):
     """ Parse lines from a requirements.txt file into list of requirements and dependency links
 
     Args:
@@ -341,6 +1381,9 @@ def parse_requirement_line(line, include_uri=False, include_extras=True, include
         include_extras (:obj:`bool`, optional): if :obj:`True`, include extras in the dependencies list
         include_specs (:obj:`bool`, optional): if :obj:`True`, include specifications in the dependencies list
         include_markers (:obj:`bool`, optional): if :obj:`True`, include markers in the dependencies list
+        evaluate_markers (:obj:`bool`, optional): if :obj:`True`, discard dependencies whose markers don't apply to :obj:`environment`
+        environment (:obj:`dict`, optional): environment to evaluate markers against (e.g. ``python_version``,
+            ``sys_platform``); default: the current environment
 
     Returns:
         :obj:`str`: requirement
@@ -354,29 +1397,26 @@ def parse_requirement_line(line, include_uri=False, include_extras=True, include
     if not line or line.startswith('#'):
         return (None, None)
 
-    # get version hints from `egg` metadata. This must be done because (a) pip
-    # requires a version hint and (b) the `requirements` package doesn't support version hints.
-    match = re.search(r'egg=([a-z0-9_]+)\-([a-z0-9\.]+)', line, re.IGNORECASE)
-    if match:
-        version_hint = match.group(2)
-        line = re.sub(r'egg=([a-z0-9_]+)\-([a-z0-9\.]+)',
-                      r'egg=\1', line, re.IGNORECASE)
-    else:
-        version_hint = None
-
-    # parse line
-    req = requirements.parser.Requirement.parse_line(line)
+    # parse line, including the version hint of its `egg` metadata, which pip requires for packages from non-PyPI sources
+    try:
+        req = pep508.parse_line(line)
+    except ValueError as exception:
+        message, _, caret = str(exception).rpartition('\n')
+        if caret.strip().lstrip('~') == '^':
+            raise RequirementParseError(str(exception), 'invalid-syntax', column=len(caret) - len(caret.lstrip()) - 3)
+        raise RequirementParseError(str(exception), 'invalid-syntax')
     line = req.line
+    version_hint = req.version_hint
 
     # check that name is valid and we support all of the features needed to install the dependency
-    if not req.name or not re.match(r'^[a-zA-Z0-9_\.]+$', req.name):
-        raise ValueError('Dependency could not be parsed: {}'.format(line))
+    if not req.name or not PATTERNS['requirement_name'].match(req.name):
+        raise RequirementParseError('Dependency could not be parsed: {}'.format(line), 'invalid-name')
 
     if line.startswith('-e ') or req.editable:
-        raise ValueError('Editable option is not supported')
+        raise RequirementParseError('Editable option is not supported', 'editable')
 
     if req.local_file:
-        raise ValueError('Local file option is not supported')
+        raise RequirementParseError('Local file option is not supported', 'local-file')
 
     # get dependency link
     if req.uri:
@@ -391,8 +1431,9 @@ def parse_requirement_line(line, include_uri=False, include_extras=True, include
 
         # add version information to dependency link because pip requires a version hint.
         if not version_hint:
-            raise ValueError(
-                'Version hints must be provided for packages from non-PyPI sources')
+            raise RequirementParseError(
+                'Version hints must be provided for packages from non-PyPI sources', 'missing-version-hint',
+                column=line.find('#egg=') + 2 if '#egg=' in line else None)
         dependency_link += '-' + version_hint
 
         if req.subdirectory:
@@ -405,17 +1446,21 @@ def parse_requirement_line(line, include_uri=False, include_extras=True, include
             uri_line = uri_line.replace(
                 '&' + req.hash_name + '=' + req.hash, '')
 
-        uri_req = requirements.parser.Requirement.parse_line(uri_line)
+        uri_req = pep508.parse_line(uri_line)
         req.specs = list(set(req.specs + uri_req.specs))
     else:
         dependency_link = None
 
-    # get specifiers/markers
+    # get specifiers/markers, without trailing comments
     if ';' in line:
-        marker = line[line.find(';')+1:].strip()
+        marker = PATTERNS['comment'].sub('', line[line.find(';')+1:]).strip()
     else:
         marker = ''
 
+    # discard dependencies which don't apply to the target environment
+    if evaluate_markers and marker and not packaging.markers.Marker(marker).evaluate(environment):
+        return (None, None)
+
     # append dependency to requirements list with extras, specs, and specifiers/markers
     if include_uri and req.uri:
         req_setup = dependency_link.replace('#egg={}-{}'.format(req.name, version_hint),
@@ -438,20 +1483,25 @@ def parse_requirement_line(line, include_uri=False, include_extras=True, include
     return (requirement, dependency_link)
 
 
-def install_dependencies(dependencies, upgrade=False):
+def install_dependencies(dependencies, upgrade=False, lock_filename=None, find_links=None):
     """ Install dependencies
 
     Args:
         dependencies (:obj:`list`): list of dependencies
         upgrade (:obj:`bool`, optional): if :obj:`True`, upgrade package
+        lock_filename (:obj:`str`, optional): path to a lock file of pinned and hashed dependencies
+            (e.g. from :obj:`pkg_utils.wheelhouse.lock_dependencies`) to install without resolving their dependencies
+        find_links (:obj:`str`, optional): path to a local directory of distributions to install from instead of PyPI
     """
-    dependencies = " ".join(dependencies)
+    args = [sys.executable, "-m", "pip", "install"]
     if upgrade:
-        subprocess.check_call(
-            [sys.executable, "-m", "pip", "install", "-U", dependencies])
-    else:
-        subprocess.check_call(
-            [sys.executable, "-m", "pip", "install", dependencies])
+        args.append("-U")
+    if find_links:
+        args += ["--no-index", "--find-links", find_links]
+    if lock_filename:
+        args += ["--no-deps", "--require-hashes", "-r", lock_filename]
+    args += list(dependencies)
+    subprocess.check_call(args)
 
 
 def get_console_scripts(dirname, package_name):
@@ -480,6 +1530,9 @@ def get_console_scripts(dirname, package_name):
 def add_console_scripts(dirname, package_name, console_scripts):
     """ Add console scripts for a package
 
+    ``entry_points.txt`` is read and updated while holding an advisory lock on its directory, and is replaced
+    atomically, and only if its content changes (see :obj:`write_file_if_changed`).
+
     Args:
         dirname (:obj:`str`): path to the package
         package_name (:obj:`str`): package name
@@ -489,16 +1542,76 @@ def add_console_scripts(dirname, package_name, console_scripts):
         return
 
     egg_dir = os.path.join(dirname, package_name + '.egg-info')
+    filename = os.path.join(egg_dir, 'entry_points.txt')
     parser = configparser.ConfigParser()
 
-    parser.read(os.path.join(egg_dir, 'entry_points.txt'))
-    for name, func in parser.items('console_scripts'):
-        console_scripts[str(name)] = {
-            'function': str(func),
-        }
+    with _lock_directory(egg_dir):
+        parser.read(filename)
+        for name, func in parser.items('console_scripts'):
+            console_scripts[str(name)] = {
+                'function': str(func),
+            }
+
+        for name, metadata in console_scripts.items():
+            parser.set('console_scripts', name, metadata['function'])
+
+        content = io.StringIO()
+        parser.write(content)
+        _write_file_if_changed(filename, content.getvalue())
 
-    for name, metadata in console_scripts.items():
-        parser.set('console_scripts', name, metadata['function'])
 
-    with open(os.path.join(egg_dir, 'entry_points.txt'), 'w') as file:
-        parser.write(file)
+CONSOLE_SCRIPT_LAUNCHER_TEMPLATE = """#!{executable}
+# -*- coding: utf-8 -*-
+import re
+import sys
+from {module} import {import_name}
+if __name__ == '__main__':
+    sys.argv[0] = re.sub(r'(-script\\.pyw?|\\.exe)?$', '', sys.argv[0])
+    sys.exit({func}())
+"""
+
+
+def write_console_script_launchers(dirname, console_scripts, executable=None):
+    """ Write minimal launcher scripts for console scripts
+
+    Unlike the wrappers generated by setuptools for editable installations, the launchers import the
+    functions of the console scripts directly rather than through ``pkg_resources``. This avoids
+    scanning all of the installed distributions each time a console script is executed.
+
+    Args:
+        dirname (:obj:`str`): path to the directory to save the launchers (e.g. ``bin`` directory of a virtual environment)
+        console_scripts (:obj:`dict` of :obj:`dict`): console script names and functions, e.g. from :obj:`get_console_scripts`
+        executable (:obj:`str`, optional): path to the Python interpreter which should run the console scripts;
+            default: :obj:`sys.executable`
+
+    Returns:
+        :obj:`list` of :obj:`str`: paths to the launchers
+
+    Raises:
+        :obj:`ValueError`: if the function of a console script cannot be parsed
+    """
+    if not console_scripts:
+        return []
+
+    executable = executable or sys.executable
+
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+
+    launchers = {}
+    for name, metadata in sorted(console_scripts.items()):
+        match = PATTERNS['console_script_function'].match(metadata['function'])
+        if not match:
+            raise ValueError('Function of console script {} could not be parsed: {}'.format(
+                name, metadata['function']))
+        module, func = match.group(1, 2)
+        launchers[os.path.join(dirname, name)] = CONSOLE_SCRIPT_LAUNCHER_TEMPLATE.format(
+            executable=executable, module=module, import_name=func.partition('.')[0], func=func)
+
+    filenames = []
+    with _lock_directory(dirname):
+        for filename, content in launchers.items():
+            _write_file_if_changed(filename, content, executable=True)
+            filenames.append(filename)
+
+    return filenames
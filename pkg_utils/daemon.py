@@ -0,0 +1,367 @@
+""" Long-lived daemon which answers metadata queries over a Unix socket from warm caches
+
+The daemon speaks a line-oriented JSON protocol. Each request is a JSON object with a ``command``
+(``metadata``, ``deps``, ``version``, ``package-data``, ``readme`` or ``shutdown``) and its ``args``.
+Each response is a JSON object with either a ``result`` or an ``error``.
+
+:License: MIT
+"""
+
+from .core import (PackageMetadata, convert_readme_md_to_rst, get_long_description, get_version,
+                   expand_package_data_filename_patterns, merge_dependencies,
+                   parse_requirements_file, parse_optional_requirements_file)
+import copy
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+
+class MetadataCache(object):
+    """ Cache of package metadata which is invalidated when the input files of the metadata change
+
+    Attributes:
+        _entries (:obj:`dict`): dictionary which maps keys to tuples of the fingerprints of the inputs and the cached values
+        _lock (:obj:`threading.Lock`): lock which guards :obj:`_entries`
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def run(self, command, args):
+        """ Run a command
+
+        Args:
+            command (:obj:`str`): command (``metadata``, ``deps``, ``version``, ``package-data`` or ``readme``)
+            args (:obj:`dict`): arguments of the command
+
+        Returns:
+            :obj:`object`: JSON-serializable result
+
+        Raises:
+            :obj:`ValueError`: if the command is not supported
+        """
+        if command == 'metadata':
+            return self.get_package_metadata(args['dirname'], args['package_name'],
+                                             package_data_filename_patterns=args.get('package_data_filename_patterns')).__dict__
+        if command == 'deps':
+            install_requires, extras_require, tests_require, dependency_links = self.get_dependencies(
+                args['dirname'], **args.get('options', {}))
+            return {
+                'install_requires': install_requires,
+                'extras_require': extras_require,
+                'tests_require': tests_require,
+                'dependency_links': dependency_links,
+            }
+        if command == 'version':
+            return self.get_version(args['dirname'], args['package_name'])
+        if command == 'package-data':
+            return self.expand_package_data_filename_patterns(
+                args['dirname'], package_data_filename_patterns=args.get('package_data_filename_patterns'))
+        if command == 'readme':
+            if args.get('convert'):
+                self.convert_readme_md_to_rst(args['dirname'])
+            return self.get_long_description(args['dirname'])
+        raise ValueError('Unsupported command: {}'.format(command))
+
+    def get_package_metadata(self, dirname, package_name, package_data_filename_patterns=None):
+        """ Get meta data about a package
+
+        Args:
+            dirname (:obj:`str`): path to the package
+            package_name (:obj:`str`): package name
+            package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+
+        Returns:
+            :obj:`PackageMetadata`: meta data
+        """
+        md = PackageMetadata()
+        md.long_description = self.get_long_description(dirname)
+        md.version = self.get_version(dirname, package_name)
+        md.package_data = self.expand_package_data_filename_patterns(
+            dirname, package_data_filename_patterns=package_data_filename_patterns)
+        md.install_requires, md.extras_require, md.tests_require, md.dependency_links = self.get_dependencies(dirname)
+        return md
+
+    def convert_readme_md_to_rst(self, dirname):
+        """ Convert the README.md to README.rst, unless README.md hasn't changed since its last conversion
+
+        Args:
+            dirname (:obj:`str`): path to the package
+        """
+        md_filename = os.path.join(dirname, 'README.md')
+        rst_filename = os.path.join(dirname, 'README.rst')
+        self._memoize(('convert_readme_md_to_rst', dirname),
+                      lambda: _get_files_fingerprint([md_filename, rst_filename]),
+                      convert_readme_md_to_rst, dirname,
+                      update_fingerprint=lambda fingerprint: fingerprint[:1] + _get_files_fingerprint([rst_filename]))
+
+    def get_long_description(self, dirname):
+        """ Get the long description of a package from its README.rst file
+
+        Args:
+            dirname (:obj:`str`): path to the package
+
+        Returns:
+            :obj:`str`: long description
+        """
+        filenames = [os.path.join(dirname, 'README.rst')]
+        return self._memoize(('get_long_description', dirname), lambda: _get_files_fingerprint(filenames),
+                             get_long_description, dirname)
+
+    def get_version(self, dirname, package_name):
+        """ Get the version a package from its version file (``package/_version.py``)
+
+        Args:
+            dirname (:obj:`str`): path to the package
+            package_name (:obj:`str`): package name
+
+        Returns:
+            :obj:`str`: version
+        """
+        filenames = [os.path.join(dirname, package_name, '_version.py')]
+        return self._memoize(('get_version', dirname, package_name), lambda: _get_files_fingerprint(filenames),
+                             get_version, dirname, package_name)
+
+    def expand_package_data_filename_patterns(self, dirname, package_data_filename_patterns=None):
+        """ Expand the package data filenames, unless the directories of the modules haven't changed
+
+        Args:
+            dirname (:obj:`str`): path to the package
+            package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+
+        Returns:
+            :obj:`dict`: package data
+        """
+        package_data_filename_patterns = package_data_filename_patterns or {}
+        key = ('expand_package_data_filename_patterns', dirname,
+               json.dumps(package_data_filename_patterns, sort_keys=True))
+        dirnames = [os.path.join(dirname, module) for module in sorted(package_data_filename_patterns.keys())]
+        return self._memoize(key, lambda: _get_trees_fingerprint(dirnames),
+                             expand_package_data_filename_patterns, dirname,
+                             package_data_filename_patterns=package_data_filename_patterns)
+
+    def get_dependencies(self, dirname, **kwargs):
+        """ Parse required and optional dependencies from requirements.txt files, reparsing only the files which changed
+
+        Args:
+            dirname (:obj:`str`): path to the package
+            **kwargs: options for :obj:`pkg_utils.get_dependencies`
+
+        Returns:
+            :obj:`list` of :obj:`str`: requirements
+            :obj:`list` of :obj:`str`: extra/optional requirements
+            :obj:`list` of :obj:`str`: test requirements
+            :obj:`list` of :obj:`str`: dependency links
+        """
+        install_requires, install_links = self.parse_requirements_file(
+            os.path.join(dirname, 'requirements.txt'), **kwargs)
+        extras_require, extras_links = self.parse_optional_requirements_file(
+            os.path.join(dirname, 'requirements.optional.txt'), **kwargs)
+        tests_require, tests_links = self.parse_requirements_file(
+            os.path.join(dirname, 'tests', 'requirements.txt'), **kwargs)
+        docs_require, docs_links = self.parse_requirements_file(
+            os.path.join(dirname, 'docs', 'requirements.txt'), **kwargs)
+        return merge_dependencies(install_requires, extras_require, tests_require, docs_require,
+                                  install_links + extras_links + tests_links + docs_links)
+
+    def parse_requirements_file(self, filename, **kwargs):
+        """ Parse a requirements.txt file into list of requirements and dependency links
+
+        Args:
+            filename (:obj:`str`): path to requirements.txt file
+            **kwargs: options for :obj:`pkg_utils.parse_requirements_file`
+
+        Returns:
+            :obj:`list` of :obj:`str`: requirements
+            :obj:`list` of :obj:`str`: dependency links
+        """
+        key = ('parse_requirements_file', filename, json.dumps(kwargs, sort_keys=True))
+        return self._memoize(key, lambda: _get_files_fingerprint([filename]),
+                             parse_requirements_file, filename, **kwargs)
+
+    def parse_optional_requirements_file(self, filename, **kwargs):
+        """ Parse a requirements.optional.txt file into list of requirements and dependency links
+
+        Args:
+            filename (:obj:`str`): path to requirements.txt file
+            **kwargs: options for :obj:`pkg_utils.parse_optional_requirements_file`
+
+        Returns:
+            :obj:`dict` of :obj:`list` of :obj:`str`: requirements
+            :obj:`list` of :obj:`str`: dependency links
+        """
+        key = ('parse_optional_requirements_file', filename, json.dumps(kwargs, sort_keys=True))
+        return self._memoize(key, lambda: _get_files_fingerprint([filename]),
+                             parse_optional_requirements_file, filename, **kwargs)
+
+    def clear(self):
+        """ Clear the cache """
+        with self._lock:
+            self._entries.clear()
+
+    def _memoize(self, key, get_fingerprint, func, *args, update_fingerprint=None, **kwargs):
+        """ Get a cached value, or calculate and cache the value if the fingerprint of its inputs has changed
+
+        The inputs are fingerprinted before the value is calculated, so that inputs which change while the value is
+        calculated invalidate it.
+
+        Args:
+            key (:obj:`tuple`): key
+            get_fingerprint (:obj:`callable`): function which calculates the fingerprint of the inputs
+            func (:obj:`callable`): function which calculates the value
+            *args: positional arguments to :obj:`func`
+            update_fingerprint (:obj:`callable`, optional): function which updates the fingerprint of the inputs
+                with the state of the inputs which :obj:`func` writes itself
+            **kwargs: keyword arguments to :obj:`func`
+
+        Returns:
+            :obj:`object`: value
+        """
+        fingerprint = get_fingerprint()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == fingerprint:
+            return copy.deepcopy(entry[1])
+
+        value = func(*args, **kwargs)
+        if update_fingerprint is not None:
+            fingerprint = update_fingerprint(fingerprint)
+
+        with self._lock:
+            self._entries[key] = (fingerprint, value)
+        return copy.deepcopy(value)
+
+
+def _get_files_fingerprint(filenames):
+    """ Get a fingerprint of the state of files
+
+    Args:
+        filenames (:obj:`list` of :obj:`str`): paths to files
+
+    Returns:
+        :obj:`tuple`: fingerprint
+    """
+    fingerprint = []
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+            fingerprint.append((filename, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            fingerprint.append((filename, None, None))
+    return tuple(fingerprint)
+
+
+def _get_trees_fingerprint(dirnames):
+    """ Get a fingerprint of the structure of directory trees from the modification times of their directories
+
+    Args:
+        dirnames (:obj:`list` of :obj:`str`): paths to the roots of the trees
+
+    Returns:
+        :obj:`tuple`: fingerprint
+    """
+    fingerprint = []
+    for dirname in dirnames:
+        for subdirname, _, _ in os.walk(dirname):
+            fingerprint.append((subdirname, os.stat(subdirname).st_mtime_ns))
+    return tuple(fingerprint)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """ Handler for requests to the daemon """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line.decode())
+                if request['command'] == 'shutdown':
+                    threading.Thread(target=self.server.shutdown).start()
+                    response = {'result': None}
+                else:
+                    response = {'result': self.server.cache.run(request['command'], request.get('args', {}))}
+            except Exception as exception:
+                response = {'error': str(exception)}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Server which answers metadata queries over a Unix socket
+
+    Attributes:
+        cache (:obj:`MetadataCache`): cache of metadata
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, cache=None):
+        """
+        Args:
+            socket_path (:obj:`str`): path to the Unix socket
+            cache (:obj:`MetadataCache`, optional): cache of metadata
+
+        Raises:
+            :obj:`ValueError`: if the path exists and isn't the socket of a daemon which has stopped
+        """
+        if os.path.lexists(socket_path):
+            # only remove the sockets of daemons which have stopped
+            if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+                raise ValueError('{} already exists and is not a socket'.format(socket_path))
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                try:
+                    sock.connect(socket_path)
+                except OSError:
+                    os.remove(socket_path)
+                else:
+                    raise ValueError('A daemon is already listening on {}'.format(socket_path))
+        super(Server, self).__init__(socket_path, _RequestHandler)
+        self.cache = cache or MetadataCache()
+
+    def server_close(self):
+        super(Server, self).server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def serve(socket_path, cache=None):
+    """ Run the daemon until it receives a ``shutdown`` command
+
+    Args:
+        socket_path (:obj:`str`): path to the Unix socket
+        cache (:obj:`MetadataCache`, optional): cache of metadata
+    """
+    server = Server(socket_path, cache=cache)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def request(socket_path, command, args=None, timeout=None):
+    """ Send a command to the daemon
+
+    Args:
+        socket_path (:obj:`str`): path to the Unix socket
+        command (:obj:`str`): command
+        args (:obj:`dict`, optional): arguments of the command
+        timeout (:obj:`float`, optional): timeout in seconds
+
+    Returns:
+        :obj:`object`: result of the command
+
+    Raises:
+        :obj:`OSError`: if the daemon is not running
+        :obj:`ValueError`: if the daemon could not run the command
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({'command': command, 'args': args or {}}).encode() + b'\n')
+        with sock.makefile('rb') as file:
+            response = json.loads(file.readline().decode())
+    if 'error' in response:
+        raise ValueError(response['error'])
+    return response['result']
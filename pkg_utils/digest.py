@@ -0,0 +1,148 @@
+""" Stable digests of the dependencies of packages, e.g. to key caches of the environments of continuous integration jobs
+
+The digests are calculated from the canonical forms of the dependencies parsed by :obj:`pkg_utils.get_dependencies`,
+rather than from the contents of the requirements files. Consequently, digests don't change when comments,
+whitespace, the order of requirements, or the formatting of names, version specifiers or markers change.
+
+:License: MIT
+"""
+
+from .core import get_dependencies
+import hashlib
+import json
+import packaging.requirements
+import packaging.utils
+
+DIGEST_FORMAT_VERSION = 1
+
+
+def get_dependencies_digest(dirname, options=None, evaluate_markers=False, environment=None, algorithm='sha256'):
+    """ Get a digest of the dependencies of a package
+
+    Args:
+        dirname (:obj:`str`): path to the package
+        options (:obj:`list` of :obj:`str`, optional): if provided, only digest the requirements and the optional
+            requirements of these options, rather than all of the dependencies
+        evaluate_markers (:obj:`bool`, optional): if :obj:`True`, discard dependencies whose markers don't apply to
+            :obj:`environment`
+        environment (:obj:`dict`, optional): environment to evaluate markers against; default: the current environment
+        algorithm (:obj:`str`, optional): hash algorithm
+
+    Returns:
+        :obj:`str`: hexadecimal digest
+
+    Raises:
+        :obj:`ValueError`: if a requirement is invalid or an option is undefined
+    """
+    install_requires, extras_require, _, dependency_links = get_dependencies(
+        dirname, evaluate_markers=evaluate_markers, environment=environment)
+    return digest_dependencies(install_requires, extras_require, dependency_links, options=options, algorithm=algorithm)
+
+
+def digest_dependencies(install_requires, extras_require, dependency_links, options=None, algorithm='sha256'):
+    """ Get a digest of dependencies
+
+    Args:
+        install_requires (:obj:`list` of :obj:`str`): requirements (e.g. from :obj:`pkg_utils.get_dependencies`)
+        extras_require (:obj:`dict` of :obj:`list` of :obj:`str`): optional requirements of each option
+        dependency_links (:obj:`list` of :obj:`str`): dependency links
+        options (:obj:`list` of :obj:`str`, optional): if provided, only digest the requirements and the optional
+            requirements of these options. Selections of options which require the same set of dependencies have
+            the same digest.
+        algorithm (:obj:`str`, optional): hash algorithm
+
+    Returns:
+        :obj:`str`: hexadecimal digest
+
+    Raises:
+        :obj:`ValueError`: if a requirement is invalid or an option is undefined
+    """
+    dependencies = get_canonical_dependencies(install_requires, extras_require, dependency_links, options=options)
+    content = json.dumps(dependencies, sort_keys=True, separators=(',', ':'))
+    return hashlib.new(algorithm, content.encode('utf-8')).hexdigest()
+
+
+def get_canonical_dependencies(install_requires, extras_require, dependency_links, options=None):
+    """ Get the canonical form of dependencies which is digested by :obj:`digest_dependencies`
+
+    Args:
+        install_requires (:obj:`list` of :obj:`str`): requirements (e.g. from :obj:`pkg_utils.get_dependencies`)
+        extras_require (:obj:`dict` of :obj:`list` of :obj:`str`): optional requirements of each option
+        dependency_links (:obj:`list` of :obj:`str`): dependency links
+        options (:obj:`list` of :obj:`str`, optional): if provided, only include the requirements and the optional
+            requirements of these options
+
+    Returns:
+        :obj:`dict`: dictionary with the format ``version`` of the digest, the sorted canonical requirements
+            (``install_requires``), the sorted canonical optional requirements of each option (``extras_require``)
+            or, if :obj:`options` is provided, the union of the requirements and the optional requirements of the
+            options (``requires``), and the sorted dependency links (``dependency_links``)
+
+    Raises:
+        :obj:`ValueError`: if a requirement is invalid or an option is undefined
+    """
+    dependencies = {
+        'version': DIGEST_FORMAT_VERSION,
+        'dependency_links': sorted(set(link.strip() for link in dependency_links)),
+    }
+
+    if options is None:
+        dependencies['install_requires'] = _canonicalize_requirements(install_requires)
+        dependencies['extras_require'] = {option: _canonicalize_requirements(requires)
+                                          for option, requires in extras_require.items()}
+    else:
+        requires = list(install_requires)
+        for option in options:
+            if option not in extras_require:
+                raise ValueError('Option {} is not defined'.format(option))
+            requires += extras_require[option]
+        dependencies['requires'] = _canonicalize_requirements(requires)
+
+    return dependencies
+
+
+def canonicalize_requirement(require):
+    """ Get the canonical form of a requirement
+
+    The name and extras are normalized, the extras and version specifiers are sorted, and the whitespace and quotes
+    of the marker are normalized.
+
+    Args:
+        require (:obj:`str`): requirement (e.g. ``Numpy[Extra] >= 1.0, != 1.1; python_version < '3'``)
+
+    Returns:
+        :obj:`str`: canonical requirement (e.g. ``numpy[extra]!=1.1,>=1.0; python_version < "3"``)
+
+    Raises:
+        :obj:`ValueError`: if the requirement is invalid
+    """
+    try:
+        parsed_require = packaging.requirements.Requirement(require)
+    except packaging.requirements.InvalidRequirement as exception:
+        raise ValueError('Requirement {} is invalid: {}'.format(require, str(exception)))
+
+    canonical_require = packaging.utils.canonicalize_name(parsed_require.name)
+    if parsed_require.extras:
+        canonical_require += '[{}]'.format(','.join(sorted(packaging.utils.canonicalize_name(extra)
+                                                           for extra in parsed_require.extras)))
+    canonical_require += str(parsed_require.specifier)
+    if parsed_require.url:
+        canonical_require += ' @ ' + parsed_require.url
+    if parsed_require.marker is not None:
+        canonical_require += (' ; ' if parsed_require.url else '; ') + str(parsed_require.marker)
+    return canonical_require
+
+
+def _canonicalize_requirements(requires):
+    """ Get the sorted, deduplicated canonical forms of requirements
+
+    Args:
+        requires (:obj:`list` of :obj:`str`): requirements
+
+    Returns:
+        :obj:`list` of :obj:`str`: sorted canonical requirements
+
+    Raises:
+        :obj:`ValueError`: if a requirement is invalid
+    """
+    return sorted(set(canonicalize_requirement(require) for require in requires))
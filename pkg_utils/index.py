@@ -0,0 +1,392 @@
+""" Index of the metadata of the packages of a workspace in a local SQLite database
+
+The index stores the version, dependencies, dependency links and numbers of data files of each package, and is
+updated incrementally: only the packages whose input files (``README.rst``, ``package/_version.py``, the requirements
+files and the directories of the package data) changed since the last update are reread. The requirements are
+indexed by the normalized names of their projects, so that the packages which depend on a project, and the versions
+to which they pin it, can be queried without parsing any requirements files.
+
+:License: MIT
+"""
+
+from .core import PackageMetadata, get_package_metadata
+from .daemon import _get_files_fingerprint, _get_trees_fingerprint
+import concurrent.futures
+import json
+import os
+import packaging.requirements
+import packaging.utils
+import sqlite3
+
+INDEX_FORMAT_VERSION = 1
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS packages (
+        id INTEGER PRIMARY KEY,
+        dirname TEXT NOT NULL UNIQUE,
+        name TEXT NOT NULL,
+        version TEXT,
+        fingerprint TEXT NOT NULL,
+        metadata TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS requirements (
+        package_id INTEGER NOT NULL REFERENCES packages (id) ON DELETE CASCADE,
+        option TEXT NOT NULL,
+        requirement TEXT NOT NULL,
+        name TEXT,
+        pinned_version TEXT
+    );
+    CREATE INDEX IF NOT EXISTS requirements_name ON requirements (name);
+    CREATE INDEX IF NOT EXISTS requirements_package_id ON requirements (package_id);
+    CREATE TABLE IF NOT EXISTS dependency_links (
+        package_id INTEGER NOT NULL REFERENCES packages (id) ON DELETE CASCADE,
+        link TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS dependency_links_package_id ON dependency_links (package_id);
+    CREATE TABLE IF NOT EXISTS package_data (
+        package_id INTEGER NOT NULL REFERENCES packages (id) ON DELETE CASCADE,
+        module TEXT NOT NULL,
+        n_files INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS package_data_package_id ON package_data (package_id);
+'''
+
+
+class IndexedRequirement(object):
+    """ Requirement of a package of an index
+
+    Attributes:
+        package_name (:obj:`str`): name of the package which has the requirement
+        dirname (:obj:`str`): path to the package which has the requirement
+        option (:obj:`str`): option of the requirement (``install_requires`` or the name of an option of
+            ``extras_require``)
+        requirement (:obj:`str`): requirement
+        pinned_version (:obj:`str`): version to which the requirement pins its project (``==`` or ``===``), or
+            :obj:`None` if the requirement doesn't pin its project
+    """
+
+    def __init__(self, package_name, dirname, option, requirement, pinned_version=None):
+        self.package_name = package_name
+        self.dirname = dirname
+        self.option = option
+        self.requirement = requirement
+        self.pinned_version = pinned_version
+
+    def __eq__(self, other):
+        return isinstance(other, IndexedRequirement) and self.__dict__ == other.__dict__
+
+    def __repr__(self):
+        return 'IndexedRequirement({!r}, {!r}, {!r}, {!r}, {!r})'.format(
+            self.package_name, self.dirname, self.option, self.requirement, self.pinned_version)
+
+
+class WorkspaceIndex(object):
+    """ Index of the metadata of the packages of a workspace in a local SQLite database
+
+    Attributes:
+        filename (:obj:`str`): path to the database
+        _connection (:obj:`sqlite3.Connection`): connection to the database
+    """
+
+    def __init__(self, filename):
+        """
+        Args:
+            filename (:obj:`str`): path to the database; the database is created if it doesn't exist, and
+                rebuilt if it was created by an incompatible version of this module
+        """
+        self.filename = filename
+        self._connection = sqlite3.connect(filename)
+        self._connection.execute('PRAGMA foreign_keys = ON')
+        with self._connection:
+            format_version = self._connection.execute('PRAGMA user_version').fetchone()[0]
+            if format_version != INDEX_FORMAT_VERSION:
+                for table in ['package_data', 'dependency_links', 'requirements', 'packages']:
+                    self._connection.execute('DROP TABLE IF EXISTS {}'.format(table))
+                self._connection.execute('PRAGMA user_version = {:d}'.format(INDEX_FORMAT_VERSION))
+            self._connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ Close the database """
+        self._connection.close()
+
+    def update(self, workspace_dirname, package_data_filename_patterns=None, max_workers=None, errors=None):
+        """ Update the index with the packages of a workspace
+
+        The packages of the workspace are its directories which contain a ``setup.py`` file. The packages
+        whose input files changed since the last update are reread in parallel threads, and the packages which
+        were removed from the workspace are removed from the index.
+
+        Args:
+            workspace_dirname (:obj:`str`): path to the workspace
+            package_data_filename_patterns (:obj:`dict`, optional): dictionary which maps the path of each package to
+                its package data filename patterns (see :obj:`pkg_utils.get_package_metadata`)
+            max_workers (:obj:`int`, optional): number of threads
+            errors (:obj:`dict`, optional): if provided, rather than raising the first error, add the error of each
+                package whose metadata couldn't be read to this dictionary, keyed by the path of the package
+
+        Returns:
+            :obj:`dict`: dictionary with the sorted paths of the ``added``, ``updated`` and ``removed`` packages
+        """
+        package_data_filename_patterns = {os.path.abspath(dirname): patterns
+                                          for dirname, patterns in (package_data_filename_patterns or {}).items()}
+        dirnames = find_workspace_packages(workspace_dirname)
+        fingerprints = dict(self._connection.execute('SELECT dirname, fingerprint FROM packages'))
+        changes = {'added': [], 'updated': [], 'removed': []}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for dirname in dirnames:
+                package_name = get_workspace_package_name(dirname)
+                fingerprint = _get_package_fingerprint(dirname, package_name, package_data_filename_patterns.get(dirname))
+                if fingerprints.get(dirname) != fingerprint:
+                    futures.append((dirname, package_name, fingerprint, executor.submit(
+                        self._read_package_metadata, dirname, package_name, package_data_filename_patterns.get(dirname))))
+
+            for dirname, package_name, fingerprint, future in futures:
+                try:
+                    md = future.result()
+                except Exception as exception:
+                    if errors is None:
+                        raise
+                    errors[dirname] = exception
+                    continue
+                self._save_package(dirname, package_name, fingerprint, md)
+                changes['updated' if dirname in fingerprints else 'added'].append(dirname)
+
+        abs_workspace_dirname = os.path.join(os.path.abspath(workspace_dirname), '')
+        with self._connection:
+            for dirname in sorted(set(fingerprints.keys()).difference(dirnames)):
+                if dirname == abs_workspace_dirname[:-1] or dirname.startswith(abs_workspace_dirname):
+                    self._connection.execute('DELETE FROM packages WHERE dirname = ?', (dirname,))
+                    changes['removed'].append(dirname)
+
+        return changes
+
+    def update_package(self, dirname, package_name=None, package_data_filename_patterns=None):
+        """ Update the index with a package, if its input files changed since the last update
+
+        Args:
+            dirname (:obj:`str`): path to the package
+            package_name (:obj:`str`, optional): package name; default: the name of the top-level directory of the
+                package which contains ``_version.py``
+            package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the package was (re)indexed
+        """
+        dirname = os.path.abspath(dirname)
+        if package_name is None:
+            package_name = get_workspace_package_name(dirname)
+        fingerprint = _get_package_fingerprint(dirname, package_name, package_data_filename_patterns)
+        row = self._connection.execute('SELECT fingerprint FROM packages WHERE dirname = ?', (dirname,)).fetchone()
+        if row and row[0] == fingerprint:
+            return False
+        md = self._read_package_metadata(dirname, package_name, package_data_filename_patterns)
+        self._save_package(dirname, package_name, fingerprint, md)
+        return True
+
+    def remove_package(self, dirname):
+        """ Remove a package from the index
+
+        Args:
+            dirname (:obj:`str`): path to the package
+        """
+        with self._connection:
+            self._connection.execute('DELETE FROM packages WHERE dirname = ?', (os.path.abspath(dirname),))
+
+    def get_packages(self):
+        """ Get the packages of the index
+
+        Returns:
+            :obj:`list` of :obj:`dict`: ``dirname``, ``name``, ``version`` and number of data files of each module
+                (``package_data``) of each package, sorted by path
+        """
+        packages = []
+        for package_id, dirname, name, version in self._connection.execute(
+                'SELECT id, dirname, name, version FROM packages ORDER BY dirname'):
+            packages.append({
+                'dirname': dirname,
+                'name': name,
+                'version': version,
+                'package_data': dict(self._connection.execute(
+                    'SELECT module, n_files FROM package_data WHERE package_id = ? ORDER BY module', (package_id,))),
+            })
+        return packages
+
+    def get_metadata(self, dirname):
+        """ Get the indexed metadata of a package
+
+        Args:
+            dirname (:obj:`str`): path to the package
+
+        Returns:
+            :obj:`PackageMetadata`: metadata, or :obj:`None` if the package isn't indexed
+        """
+        row = self._connection.execute('SELECT metadata FROM packages WHERE dirname = ?',
+                                       (os.path.abspath(dirname),)).fetchone()
+        if row is None:
+            return None
+        md = PackageMetadata()
+        md.__dict__.update(json.loads(row[0]))
+        return md
+
+    def get_dependents(self, name, option=None):
+        """ Get the requirements of the indexed packages for a project
+
+        Args:
+            name (:obj:`str`): name of the project
+            option (:obj:`str`, optional): if provided, only get the requirements of this option (``install_requires``
+                or the name of an option of ``extras_require``)
+
+        Returns:
+            :obj:`list` of :obj:`IndexedRequirement`: requirements, sorted by package, option and requirement
+        """
+        query = ('SELECT packages.name, packages.dirname, requirements.option, requirements.requirement, '
+                 'requirements.pinned_version FROM requirements JOIN packages ON packages.id = requirements.package_id '
+                 'WHERE requirements.name = ?')
+        params = [packaging.utils.canonicalize_name(name)]
+        if option is not None:
+            query += ' AND requirements.option = ?'
+            params.append(option)
+        query += ' ORDER BY packages.dirname, requirements.option, requirements.requirement'
+        return [IndexedRequirement(*row) for row in self._connection.execute(query, params)]
+
+    def get_pins(self, name=None):
+        """ Get the requirements of the indexed packages which pin their projects to versions (``==`` or ``===``)
+
+        Args:
+            name (:obj:`str`, optional): if provided, only get the pins of this project
+
+        Returns:
+            :obj:`list` of :obj:`IndexedRequirement`: requirements, sorted by package, option and requirement
+        """
+        query = ('SELECT packages.name, packages.dirname, requirements.option, requirements.requirement, '
+                 'requirements.pinned_version FROM requirements JOIN packages ON packages.id = requirements.package_id '
+                 'WHERE requirements.pinned_version IS NOT NULL')
+        params = []
+        if name is not None:
+            query += ' AND requirements.name = ?'
+            params.append(packaging.utils.canonicalize_name(name))
+        query += ' ORDER BY packages.dirname, requirements.option, requirements.requirement'
+        return [IndexedRequirement(*row) for row in self._connection.execute(query, params)]
+
+    def _read_package_metadata(self, dirname, package_name, package_data_filename_patterns=None):
+        """ Read the metadata of a package
+
+        Args:
+            dirname (:obj:`str`): path to the package
+            package_name (:obj:`str`): package name
+            package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+
+        Returns:
+            :obj:`PackageMetadata`: metadata
+        """
+        return get_package_metadata(dirname, package_name, package_data_filename_patterns=package_data_filename_patterns)
+
+    def _save_package(self, dirname, package_name, fingerprint, md):
+        """ Save the metadata of a package to the index
+
+        Args:
+            dirname (:obj:`str`): path to the package
+            package_name (:obj:`str`): package name
+            fingerprint (:obj:`str`): fingerprint of the input files of the metadata
+            md (:obj:`PackageMetadata`): metadata
+        """
+        with self._connection:
+            self._connection.execute('DELETE FROM packages WHERE dirname = ?', (dirname,))
+            package_id = self._connection.execute(
+                'INSERT INTO packages (dirname, name, version, fingerprint, metadata) VALUES (?, ?, ?, ?, ?)',
+                (dirname, package_name, md.version, fingerprint, json.dumps(md.__dict__, sort_keys=True))).lastrowid
+
+            requirements = [('install_requires', require) for require in md.install_requires]
+            for option, requires in sorted(md.extras_require.items()):
+                requirements += [(option, require) for require in requires]
+            self._connection.executemany(
+                'INSERT INTO requirements (package_id, option, requirement, name, pinned_version) VALUES (?, ?, ?, ?, ?)',
+                [(package_id, option, require) + _parse_requirement(require) for option, require in requirements])
+
+            self._connection.executemany('INSERT INTO dependency_links (package_id, link) VALUES (?, ?)',
+                                         [(package_id, link) for link in md.dependency_links])
+            self._connection.executemany('INSERT INTO package_data (package_id, module, n_files) VALUES (?, ?, ?)',
+                                         [(package_id, module, len(filenames))
+                                          for module, filenames in sorted(md.package_data.items())])
+
+
+def find_workspace_packages(workspace_dirname):
+    """ Find the packages of a workspace
+
+    Args:
+        workspace_dirname (:obj:`str`): path to the workspace
+
+    Returns:
+        :obj:`list` of :obj:`str`: sorted absolute paths of the directories of the workspace which contain a
+            ``setup.py`` file, excluding hidden directories and the subdirectories of packages
+    """
+    dirnames = []
+    for dirname, subdirnames, filenames in os.walk(os.path.abspath(workspace_dirname)):
+        if 'setup.py' in filenames:
+            dirnames.append(dirname)
+            subdirnames[:] = []
+        else:
+            subdirnames[:] = [subdirname for subdirname in subdirnames if not subdirname.startswith('.')]
+    return sorted(dirnames)
+
+
+def get_workspace_package_name(dirname):
+    """ Get the name of a package from the top-level directory of the package which contains ``_version.py``
+
+    Args:
+        dirname (:obj:`str`): path to the package
+
+    Returns:
+        :obj:`str`: package name, or the name of the directory of the package if no top-level directory contains
+            ``_version.py``
+    """
+    for entry in sorted(os.scandir(dirname), key=lambda entry: entry.name):
+        if entry.is_dir() and os.path.isfile(os.path.join(entry.path, '_version.py')):
+            return entry.name
+    return os.path.basename(dirname)
+
+
+def _get_package_fingerprint(dirname, package_name, package_data_filename_patterns=None):
+    """ Get a fingerprint of the input files of the metadata of a package
+
+    Args:
+        dirname (:obj:`str`): path to the package
+        package_name (:obj:`str`): package name
+        package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+
+    Returns:
+        :obj:`str`: fingerprint
+    """
+    package_data_filename_patterns = package_data_filename_patterns or {}
+    filenames = [os.path.join(dirname, path) for path in [
+        'README.rst', os.path.join(package_name, '_version.py'), 'requirements.txt', 'requirements.optional.txt',
+        os.path.join('tests', 'requirements.txt'), os.path.join('docs', 'requirements.txt')]]
+    dirnames = [os.path.join(dirname, module) for module in sorted(package_data_filename_patterns.keys())]
+    return json.dumps([package_name, package_data_filename_patterns, _get_files_fingerprint(filenames),
+                       _get_trees_fingerprint(dirnames)], sort_keys=True)
+
+
+def _parse_requirement(require):
+    """ Get the normalized name of the project of a requirement and the version to which it pins the project
+
+    Args:
+        require (:obj:`str`): requirement
+
+    Returns:
+        :obj:`str`: normalized name of the project, or :obj:`None` if the requirement cannot be parsed
+        :obj:`str`: version to which the requirement pins the project, or :obj:`None` if the requirement doesn't pin
+            the project
+    """
+    try:
+        req = packaging.requirements.Requirement(require)
+    except packaging.requirements.InvalidRequirement:
+        return (None, None)
+    pins = [spec.version for spec in req.specifier if spec.operator in ('==', '===') and not spec.version.endswith('.*')]
+    return (packaging.utils.canonicalize_name(req.name), pins[0] if len(pins) == 1 else None)
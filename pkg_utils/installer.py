@@ -0,0 +1,434 @@
+""" Install pinned wheels from a local wheelhouse directly into an environment, without pip
+
+Because the requirements are already pinned (e.g. by :obj:`pkg_utils.wheelhouse.lock_dependencies`), no resolution is
+needed, and the wheels are simply unpacked into the installation scheme of the environment in parallel. Unlike pip, the
+modules aren't compiled to bytecode during installation; Python compiles them when they are first imported.
+
+:License: MIT
+"""
+
+from .core import write_console_script_launchers
+from .wheelhouse import get_wheelhouse_distributions, hash_file
+import base64
+import concurrent.futures
+import configparser
+import csv
+import email.parser
+import glob
+import hashlib
+import io
+import json
+import os
+import packaging.utils
+import pathlib
+import re
+import shutil
+import stat
+import sys
+import sysconfig
+import tempfile
+import zipfile
+
+INSTALLER = 'pkg_utils'
+CHUNK_SIZE = 1024 * 1024
+SHEBANG_REGEX = re.compile(rb'^#!python(w?)(?=\s|$)')
+
+
+class InstalledWheel(object):
+    """ Wheel installed into an environment
+
+    Attributes:
+        name (:obj:`str`): normalized name of the project
+        version (:obj:`packaging.version.Version`): version
+        filename (:obj:`str`): path to the wheel
+        dist_info_dirname (:obj:`str`): path to the ``.dist-info`` directory of the installed wheel
+        skipped (:obj:`bool`): :obj:`True` if the identical wheel was already installed
+    """
+
+    def __init__(self, name, version, filename, dist_info_dirname, skipped=False):
+        self.name = name
+        self.version = version
+        self.filename = filename
+        self.dist_info_dirname = dist_info_dirname
+        self.skipped = skipped
+
+
+def install_locked_requirements(locked_requires, wheelhouse, prefix=None, executable=None, tags=None, max_workers=None):
+    """ Install pinned requirements from the wheels in a wheelhouse
+
+    Args:
+        locked_requires (:obj:`list` of :obj:`pkg_utils.wheelhouse.LockedRequirement`): pinned requirements (e.g. from
+            :obj:`pkg_utils.wheelhouse.lock_dependencies` or :obj:`pkg_utils.wheelhouse.read_lock_file`)
+        wheelhouse (:obj:`str`): path to a directory of wheels
+        prefix (:obj:`str`, optional): prefix of the environment to install into; default: :obj:`sys.prefix`
+        executable (:obj:`str`, optional): path to the Python interpreter which should run the scripts;
+            default: :obj:`sys.executable`
+        tags (:obj:`set` of :obj:`packaging.tags.Tag`, optional): tags of the supported wheels;
+            default: the tags supported by the running interpreter
+        max_workers (:obj:`int`, optional): number of threads to install the wheels with
+
+    Returns:
+        :obj:`list` of :obj:`InstalledWheel`: installed wheels
+
+    Raises:
+        :obj:`ValueError`: if the wheelhouse doesn't contain a wheel for a requirement whose hash matches the pinned hashes
+    """
+    distributions = get_wheelhouse_distributions(wheelhouse, tags=tags)
+
+    filenames = []
+    hashes = {}
+    for locked_require in locked_requires:
+        name = packaging.utils.canonicalize_name(locked_require.name)
+        for distribution in distributions.get(name, []):
+            if distribution.is_wheel and distribution.version == locked_require.version:
+                if locked_require.hashes:
+                    hashes[distribution.filename] = hash_file(distribution.filename)
+                    if hashes[distribution.filename] not in locked_require.hashes:
+                        continue
+                filenames.append(distribution.filename)
+                break
+        else:
+            raise ValueError('No wheel in the wheelhouse matches {}=={}'.format(name, locked_require.version))
+
+    return install_wheels(filenames, prefix=prefix, executable=executable, max_workers=max_workers, hashes=hashes)
+
+
+def install_wheels(filenames, prefix=None, executable=None, max_workers=None, hashes=None):
+    """ Install wheels into an environment in parallel
+
+    Wheels which are already installed with the same hash are skipped, and other installed versions of the projects
+    of the wheels are uninstalled.
+
+    Args:
+        filenames (:obj:`list` of :obj:`str`): paths to wheels
+        prefix (:obj:`str`, optional): prefix of the environment to install into; default: :obj:`sys.prefix`
+        executable (:obj:`str`, optional): path to the Python interpreter which should run the scripts;
+            default: :obj:`sys.executable`
+        max_workers (:obj:`int`, optional): number of threads to install the wheels with
+        hashes (:obj:`dict` of :obj:`str`, optional): dictionary which maps paths to wheels to their hashes
+            (e.g. from :obj:`pkg_utils.wheelhouse.hash_file`), so that they don't have to be calculated again
+
+    Returns:
+        :obj:`list` of :obj:`InstalledWheel`: installed wheels, in the order of :obj:`filenames`
+
+    Raises:
+        :obj:`ValueError`: if a wheel is invalid or its files don't match its ``RECORD``
+    """
+    prefix = prefix or sys.prefix
+    paths = sysconfig.get_paths(vars={'base': prefix, 'platbase': prefix,
+                                      'installed_base': prefix, 'installed_platbase': prefix})
+    executable = executable or sys.executable
+    installed = _get_installed_distributions([paths['purelib'], paths['platlib']])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda filename: _install_wheel(filename, paths, executable, installed,
+                                                                 archive_hash=(hashes or {}).get(filename)),
+                                 filenames))
+
+
+def _get_installed_distributions(dirnames):
+    """ Get the distributions installed in site-packages directories
+
+    Args:
+        dirnames (:obj:`list` of :obj:`str`): paths to site-packages directories
+
+    Returns:
+        :obj:`dict` of :obj:`list` of :obj:`str`: dictionary which maps the normalized name of each project to the
+            paths of its ``.dist-info`` directories
+    """
+    installed = {}
+    for dirname in sorted(set(dirnames)):
+        if not os.path.isdir(dirname):
+            continue
+        for basename in os.listdir(dirname):
+            if basename.endswith('.dist-info'):
+                name = packaging.utils.canonicalize_name(basename[:-len('.dist-info')].partition('-')[0])
+                installed.setdefault(name, []).append(os.path.join(dirname, basename))
+    return installed
+
+
+def _install_wheel(filename, paths, executable, installed, archive_hash=None):
+    """ Install a wheel
+
+    Args:
+        filename (:obj:`str`): path to the wheel
+        paths (:obj:`dict` of :obj:`str`): installation scheme (``purelib``, ``platlib``, ``scripts``, ``data``,
+            ``include``)
+        executable (:obj:`str`): path to the Python interpreter which should run the scripts
+        installed (:obj:`dict` of :obj:`list` of :obj:`str`): dictionary which maps the normalized name of each
+            installed project to the paths of its ``.dist-info`` directories
+        archive_hash (:obj:`str`, optional): hash of the wheel (e.g. ``sha256:...``); default: calculate the hash
+
+    Returns:
+        :obj:`InstalledWheel`: installed wheel
+
+    Raises:
+        :obj:`ValueError`: if the wheel is invalid or its files don't match its ``RECORD``
+    """
+    name, version, _, _ = packaging.utils.parse_wheel_filename(os.path.basename(filename))
+    archive_hash = (archive_hash or hash_file(filename)).replace(':', '=', 1)
+
+    with zipfile.ZipFile(filename) as archive:
+        dist_info = _get_dist_info(archive, filename)
+        wheel_metadata = email.parser.Parser().parsestr(archive.read(dist_info + '/WHEEL').decode('utf-8'))
+        if not (wheel_metadata['Wheel-Version'] or '').startswith('1.'):
+            raise ValueError('Wheel version of {} is not supported: {}'.format(filename, wheel_metadata['Wheel-Version']))
+        root = paths['purelib'] if (wheel_metadata['Root-Is-Purelib'] or '').strip().lower() == 'true' else paths['platlib']
+        dist_info_dirname = os.path.join(root, dist_info)
+
+        # skip the wheel if it is already installed
+        for installed_dist_info_dirname in installed.get(name, []):
+            if _get_installed_archive_hash(installed_dist_info_dirname) == archive_hash:
+                return InstalledWheel(name, version, filename, installed_dist_info_dirname, skipped=True)
+
+        expected_hashes = _read_record(archive.read(dist_info + '/RECORD').decode('utf-8'))
+        signature_filenames = (dist_info + '/RECORD.jws', dist_info + '/RECORD.p7s')
+        data_prefix = dist_info[:-len('.dist-info')] + '.data/'
+        schemes = {
+            'purelib': paths['purelib'],
+            'platlib': paths['platlib'],
+            'scripts': paths['scripts'],
+            'data': paths['data'],
+            'headers': os.path.join(paths['include'], name),
+        }
+
+        # extract the files into a staging directory and verify their hashes, so that nothing is installed unless
+        # the whole wheel is valid
+        os.makedirs(root, exist_ok=True)
+        staging_dirname = tempfile.mkdtemp(prefix='.' + dist_info + '-', dir=root)
+        try:
+            staged = []
+            for info in archive.infolist():
+                if info.is_dir() or info.filename in (dist_info + '/RECORD', dist_info + '/INSTALLER'):
+                    continue
+                if info.filename.startswith(data_prefix):
+                    scheme, _, path = info.filename[len(data_prefix):].partition('/')
+                    if scheme not in schemes:
+                        raise ValueError('Scheme {} of {} is not supported'.format(scheme, filename))
+                    dest_root = schemes[scheme]
+                else:
+                    scheme = None
+                    path = info.filename
+                    dest_root = root
+
+                dest = os.path.normpath(os.path.join(dest_root, path))
+                if not dest.startswith(os.path.join(os.path.normpath(dest_root), '')):
+                    raise ValueError('Path {} of {} is outside of the installation directory'.format(
+                        info.filename, filename))
+                staged_filename = os.path.join(staging_dirname, str(len(staged)))
+                file_hash, size = _extract_file(archive, info, staged_filename,
+                                                executable if scheme == 'scripts' else None)
+                if info.filename not in expected_hashes and info.filename not in signature_filenames:
+                    raise ValueError('{} is not listed in the RECORD of {}'.format(info.filename, filename))
+                if expected_hashes.get(info.filename, file_hash) != file_hash:
+                    raise ValueError('Hash of {} does not match the RECORD of {}'.format(info.filename, filename))
+                staged.append((staged_filename, dest, file_hash, size))
+
+            # uninstall the other versions of the project and move the files into place
+            for installed_dist_info_dirname in installed.get(name, []):
+                _uninstall(installed_dist_info_dirname)
+            records = []
+            for staged_filename, dest, file_hash, size in staged:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                shutil.move(staged_filename, dest)
+                records.append((dest, file_hash, size))
+        finally:
+            shutil.rmtree(staging_dirname, ignore_errors=True)
+
+        # write the launchers of the entry points
+        if dist_info + '/entry_points.txt' in archive.namelist():
+            parser = configparser.ConfigParser(delimiters=('=',))
+            parser.optionxform = str
+            parser.read_string(archive.read(dist_info + '/entry_points.txt').decode('utf-8'))
+            scripts = {}
+            for section in ('console_scripts', 'gui_scripts'):
+                if parser.has_section(section):
+                    for script_name, func in parser.items(section):
+                        scripts[script_name] = {'function': func}
+            for launcher_filename in write_console_script_launchers(paths['scripts'], scripts, executable=executable):
+                with open(launcher_filename, 'rb') as file:
+                    content = file.read()
+                records.append((launcher_filename, _get_record_hash(content), len(content)))
+
+    # write the installer, the origin of the wheel and the record of the installed files
+    for basename, content in (
+            ('INSTALLER', INSTALLER + '\n'),
+            ('direct_url.json', json.dumps({'url': pathlib.Path(os.path.abspath(filename)).as_uri(),
+                                            'archive_info': {'hash': archive_hash}}))):
+        dest = os.path.join(dist_info_dirname, basename)
+        with open(dest, 'w') as file:
+            file.write(content)
+        records.append((dest, _get_record_hash(content.encode()), len(content.encode())))
+
+    with open(os.path.join(dist_info_dirname, 'RECORD'), 'w', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        for dest, file_hash, size in records:
+            writer.writerow((_get_record_path(dest, root), file_hash, size))
+        writer.writerow((_get_record_path(os.path.join(dist_info_dirname, 'RECORD'), root), '', ''))
+
+    return InstalledWheel(name, version, filename, dist_info_dirname)
+
+
+def _get_dist_info(archive, filename):
+    """ Get the name of the ``.dist-info`` directory of a wheel
+
+    Args:
+        archive (:obj:`zipfile.ZipFile`): wheel
+        filename (:obj:`str`): path to the wheel
+
+    Returns:
+        :obj:`str`: name of the ``.dist-info`` directory
+
+    Raises:
+        :obj:`ValueError`: if the wheel doesn't have a ``.dist-info`` directory
+    """
+    for name in archive.namelist():
+        if name.count('/') == 1 and name.endswith('.dist-info/WHEEL'):
+            return name.partition('/')[0]
+    raise ValueError('Wheel does not contain a .dist-info directory: {}'.format(filename))
+
+
+def _read_record(content):
+    """ Read the hashes of the files of a wheel from its ``RECORD``
+
+    Args:
+        content (:obj:`str`): content of the ``RECORD``
+
+    Returns:
+        :obj:`dict` of :obj:`str`: dictionary which maps the path of each file to its hash (e.g. ``sha256=...``)
+    """
+    return {row[0]: row[1] for row in csv.reader(io.StringIO(content)) if len(row) >= 2 and row[1]}
+
+
+def _extract_file(archive, info, dest, executable=None):
+    """ Extract a file from a wheel and calculate its hash
+
+    Args:
+        archive (:obj:`zipfile.ZipFile`): wheel
+        info (:obj:`zipfile.ZipInfo`): file
+        dest (:obj:`str`): path to save the file
+        executable (:obj:`str`, optional): if provided, the file is a script whose ``#!python`` or ``#!pythonw``
+            shebang should be rewritten to this interpreter
+
+    Returns:
+        :obj:`tuple`: hash of the content of the file in the wheel (e.g. ``sha256=...``) and its size
+    """
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    hasher = hashlib.sha256()
+    size = 0
+    mode = (info.external_attr >> 16) & 0o777
+    with archive.open(info) as src, open(dest, 'wb') as file:
+        first = True
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            size += len(chunk)
+            if first and executable:
+                match = SHEBANG_REGEX.match(chunk)
+                if match:
+                    interpreter = _get_gui_executable(executable) if match.group(1) else executable
+                    chunk = '#!{}'.format(interpreter).encode() + chunk[match.end():]
+                    mode |= stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH
+            first = False
+            file.write(chunk)
+    if mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH):
+        os.chmod(dest, os.stat(dest).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return 'sha256=' + base64.urlsafe_b64encode(hasher.digest()).rstrip(b'=').decode(), size
+
+
+def _get_gui_executable(executable):
+    """ Get the interpreter which should run the GUI scripts (``#!pythonw``) of an environment
+
+    Args:
+        executable (:obj:`str`): path to the Python interpreter which should run the scripts
+
+    Returns:
+        :obj:`str`: path to the ``pythonw`` interpreter next to :obj:`executable`, or :obj:`executable` if there
+            isn't one (e.g., on POSIX systems)
+    """
+    dirname, basename = os.path.split(executable)
+    root, ext = os.path.splitext(basename)
+    if root.lower() == 'python':
+        gui_executable = os.path.join(dirname, root + 'w' + ext)
+        if os.path.isfile(gui_executable):
+            return gui_executable
+    return executable
+
+
+def _get_record_hash(content):
+    """ Calculate the hash of the content of a file in the format of ``RECORD``
+
+    Args:
+        content (:obj:`bytes`): content
+
+    Returns:
+        :obj:`str`: hash (e.g. ``sha256=...``)
+    """
+    return 'sha256=' + base64.urlsafe_b64encode(hashlib.sha256(content).digest()).rstrip(b'=').decode()
+
+
+def _get_record_path(filename, root):
+    """ Get the path of an installed file in the format of ``RECORD``
+
+    Args:
+        filename (:obj:`str`): path to the installed file
+        root (:obj:`str`): path to the site-packages directory
+
+    Returns:
+        :obj:`str`: path relative to the site-packages directory, with forward slashes
+    """
+    return os.path.relpath(filename, root).replace(os.sep, '/')
+
+
+def _get_installed_archive_hash(dist_info_dirname):
+    """ Get the hash of the wheel which an installed distribution was installed from
+
+    Args:
+        dist_info_dirname (:obj:`str`): path to the ``.dist-info`` directory of the distribution
+
+    Returns:
+        :obj:`str`: hash (e.g. ``sha256=...``), or :obj:`None` if the hash wasn't recorded
+    """
+    filename = os.path.join(dist_info_dirname, 'direct_url.json')
+    if not os.path.isfile(filename):
+        return None
+    with open(filename, 'r') as file:
+        try:
+            return json.load(file).get('archive_info', {}).get('hash')
+        except ValueError:
+            return None
+
+
+def _uninstall(dist_info_dirname):
+    """ Uninstall the files of a distribution listed in its ``RECORD``
+
+    Args:
+        dist_info_dirname (:obj:`str`): path to the ``.dist-info`` directory of the distribution
+    """
+    root = os.path.dirname(dist_info_dirname)
+    record_filename = os.path.join(dist_info_dirname, 'RECORD')
+    if os.path.isfile(record_filename):
+        with open(record_filename, 'r', newline='') as file:
+            rows = list(csv.reader(file))
+        dirnames = set()
+        for row in rows:
+            if not row:
+                continue
+            filename = os.path.normpath(os.path.join(root, row[0]))
+            filenames = [filename]
+            if filename.endswith('.py'):
+                # bytecode of the module, but not of other modules which share its directory
+                module_dirname, module_basename = os.path.split(filename[:-len('.py')])
+                filenames.append(filename + 'c')
+                filenames.extend(glob.glob(os.path.join(glob.escape(module_dirname), '__pycache__',
+                                                        glob.escape(module_basename) + '.*.pyc')))
+            for filename in filenames:
+                if os.path.isfile(filename) or os.path.islink(filename):
+                    os.remove(filename)
+                dirnames.add(os.path.dirname(filename))
+
+        # remove the directories which became empty, deepest first
+        for dirname in sorted(dirnames, key=len, reverse=True):
+            while dirname.startswith(os.path.join(root, '')) and os.path.isdir(dirname) and not os.listdir(dirname):
+                os.rmdir(dirname)
+                dirname = os.path.dirname(dirname)
+    shutil.rmtree(dist_info_dirname, ignore_errors=True)
@@ -0,0 +1,140 @@
+""" Manifests of the sizes, modification times and content hashes of package data files
+
+Manifests can be saved between builds so that unchanged data files can be detected without rereading them,
+and so that packaging steps can reuse previously built contents for unchanged data.
+
+:License: MIT
+"""
+
+from .core import expand_package_data_filename_patterns, write_file_if_changed
+import concurrent.futures
+import hashlib
+import json
+import mmap
+import os
+
+MANIFEST_FORMAT_VERSION = 1
+MMAP_THRESHOLD = 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+def get_package_data_manifest(dirname, package_data_filename_patterns=None, manifest_filename=None, max_workers=None):
+    """ Expand the package data filenames and get a manifest of the sizes, modification times and hashes
+    of the data files
+
+    Args:
+        dirname (:obj:`str`): path to the package
+        package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+        manifest_filename (:obj:`str`, optional): path to a manifest saved by a previous build. The hashes of the files
+            whose sizes and modification times haven't changed are reused from this manifest, and the new manifest
+            is saved to this path.
+        max_workers (:obj:`int`, optional): number of threads to walk the directories and hash the files with
+
+    Returns:
+        :obj:`dict`: dictionary which maps each module to a dictionary which maps the path of each of its
+            data files to a dictionary with the ``size``, ``mtime_ns`` and ``blake2b`` hash of the file
+    """
+    package_data = expand_package_data_filename_patterns(
+        dirname, package_data_filename_patterns=package_data_filename_patterns, max_workers=max_workers)
+    old_manifest = read_package_data_manifest(manifest_filename) if manifest_filename else {}
+
+    manifest = {}
+    to_hash = []
+    for module, filenames in package_data.items():
+        manifest[module] = {}
+        old_module_manifest = old_manifest.get(module, {})
+        for filename in filenames:
+            stat = os.stat(os.path.join(dirname, module, filename))
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            old_entry = old_module_manifest.get(filename)
+            if old_entry and old_entry['size'] == entry['size'] and old_entry['mtime_ns'] == entry['mtime_ns']:
+                entry['blake2b'] = old_entry['blake2b']
+            else:
+                to_hash.append((entry, os.path.join(dirname, module, filename)))
+            manifest[module][filename] = entry
+
+    if to_hash:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for (entry, _), file_hash in zip(to_hash, executor.map(hash_file, [filename for _, filename in to_hash])):
+                entry['blake2b'] = file_hash
+
+    if manifest_filename:
+        write_package_data_manifest(manifest, manifest_filename)
+
+    return manifest
+
+
+def hash_file(filename):
+    """ Calculate the BLAKE2b hash of a file, memory-mapping large files and reading small files in chunks
+
+    Args:
+        filename (:obj:`str`): path to the file
+
+    Returns:
+        :obj:`str`: hexadecimal hash
+    """
+    hasher = hashlib.blake2b()
+    with open(filename, 'rb') as file:
+        if os.fstat(file.fileno()).st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                hasher.update(mapped_file)
+        else:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def read_package_data_manifest(filename):
+    """ Read a manifest of package data
+
+    Args:
+        filename (:obj:`str`): path to the manifest
+
+    Returns:
+        :obj:`dict`: manifest, or an empty dictionary if the file doesn't exist or has a different format version
+    """
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename, 'r') as file:
+        content = json.load(file)
+    if content.get('version') != MANIFEST_FORMAT_VERSION:
+        return {}
+    return content['files']
+
+
+def write_package_data_manifest(manifest, filename):
+    """ Save a manifest of package data, atomically and only if it changed (see :obj:`pkg_utils.write_file_if_changed`)
+
+    Args:
+        manifest (:obj:`dict`): manifest
+        filename (:obj:`str`): path to save the manifest
+    """
+    write_file_if_changed(filename, json.dumps({'version': MANIFEST_FORMAT_VERSION, 'files': manifest},
+                                               indent=2, sort_keys=True))
+
+
+def diff_package_data_manifests(old, new):
+    """ Compare two manifests of package data
+
+    Args:
+        old (:obj:`dict`): old manifest
+        new (:obj:`dict`): new manifest
+
+    Returns:
+        :obj:`dict`: dictionary which maps each module to a dictionary with the sorted paths of the ``added``,
+            ``removed``, ``changed`` and ``unchanged`` data files
+    """
+    diff = {}
+    for module in sorted(set(old.keys()) | set(new.keys())):
+        old_files = old.get(module, {})
+        new_files = new.get(module, {})
+        common = set(old_files.keys()) & set(new_files.keys())
+        diff[module] = {
+            'added': sorted(set(new_files.keys()) - common),
+            'removed': sorted(set(old_files.keys()) - common),
+            'changed': sorted(filename for filename in common
+                              if old_files[filename]['blake2b'] != new_files[filename]['blake2b']),
+            'unchanged': sorted(filename for filename in common
+                                if old_files[filename]['blake2b'] == new_files[filename]['blake2b']),
+        }
+    return diff
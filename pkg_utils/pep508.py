@@ -0,0 +1,564 @@
+""" Parser for the lines of pip requirements files
+
+Lines are parsed into the same fields as :obj:`requirements.parser.Requirement.parse_line` (VCS and other
+URLs with revisions and ``#egg=name-version``, ``subdirectory`` and hash fragments, local files, and
+`PEP 508 <https://peps.python.org/pep-0508>`_ dependency specifiers with names, extras, version specifiers,
+URLs and environment markers) without the overhead of building specifier and marker objects. Dependency
+specifiers are parsed by a recursive descent parser over a table of token patterns (:obj:`TOKENS`).
+
+:License: MIT
+"""
+
+import ast
+import re
+
+VCS = ('git', 'hg', 'svn', 'bzr')
+
+VCS_SCHEMES = (
+    'git', 'git+https', 'git+ssh', 'git+git',
+    'hg+http', 'hg+https', 'hg+static-http', 'hg+ssh',
+    'svn', 'svn+svn', 'svn+http', 'svn+https', 'svn+ssh',
+    'bzr+http', 'bzr+https', 'bzr+ssh', 'bzr+sftp', 'bzr+ftp', 'bzr+lp',
+)
+
+HASH_ALGORITHMS = ('sha1', 'sha224', 'sha384', 'sha256', 'sha512', 'md5')
+
+VCS_REGEX = re.compile(
+    r'^(?:(?P<name>[\w\[\]_\-,]+)\s*@)?\s*'
+    r'(?P<scheme>' + '|'.join(scheme.replace('+', r'\+') for scheme in VCS_SCHEMES) + r')://((?P<login>[^/@]+)@)?'
+    r'(?P<path>[^#@]+)(@(?P<revision>[^#]+))?(#(?P<fragment>\S+))?')
+URI_REGEX = re.compile(r'^(?P<scheme>https?|file|ftps?)://(?P<path>[^#]+)(#(?P<fragment>\S+))?')
+LOCAL_REGEX = re.compile(r'^((?P<scheme>file)://)?(?P<path>[^#]+)#(?P<fragment>\S+)?')
+EGG_VERSION_HINT_REGEX = re.compile(r'egg=([a-z0-9_]+)\-([a-z0-9\.]+)', re.IGNORECASE)
+EXTRAS_REGEX = re.compile(r'(?P<name>.+)\[(?P<extras>[^\]]+)\]')
+COMMENT_REGEX = re.compile(r'#.*')
+SPECIFIER_OPERATOR_REGEX = re.compile(r'^(===|==|~=|!=|<=|>=|<|>)\s*(.*)$', re.DOTALL)
+
+_RELEASE = r'v?(?:[0-9]+!)?[0-9]+(?:\.[0-9]+)*'
+_PRE_RELEASE = r'(?:[-_\.]?(?:alpha|beta|preview|pre|a|b|c|rc)[-_\.]?[0-9]*)?'
+_POST_RELEASE = r'(?:(?:-[0-9]+)|(?:[-_\.]?(?:post|rev|r)[-_\.]?[0-9]*))?'
+_DEV_RELEASE = r'(?:[-_\.]?dev[-_\.]?[0-9]*)?'
+_LOCAL = r'(?:\+[a-z0-9]+(?:[-_\.][a-z0-9]+)*)?'
+
+# patterns of the tokens of PEP 508 dependency specifiers
+TOKENS = {
+    'LEFT_PARENTHESIS': re.compile(r'\('),
+    'RIGHT_PARENTHESIS': re.compile(r'\)'),
+    'LEFT_BRACKET': re.compile(r'\['),
+    'RIGHT_BRACKET': re.compile(r'\]'),
+    'SEMICOLON': re.compile(r';'),
+    'COMMA': re.compile(r','),
+    'QUOTED_STRING': re.compile(r'''(?:'[^']*')|(?:"[^"]*")'''),
+    'OP': re.compile(r'===|==|~=|!=|<=|>=|<|>'),
+    'BOOLOP': re.compile(r'\b(?:or|and)\b'),
+    'IN': re.compile(r'\bin\b'),
+    'NOT': re.compile(r'\bnot\b'),
+    'VARIABLE': re.compile(
+        r'\b(?:python_version|python_full_version|os[._]name|sys[._]platform|platform_(?:release|system)'
+        r'|platform[._](?:version|machine|python_implementation)|python_implementation|implementation_(?:name|version)'
+        r'|extras?|dependency_groups)\b'),
+    'SPECIFIER': re.compile(
+        r'(?:===\s*[^\s;)]*)'
+        r'|(?:(?:==|!=)\s*' + _RELEASE + r'(?:\.\*|' + _PRE_RELEASE + _POST_RELEASE + _DEV_RELEASE + _LOCAL + r')?)'
+        r'|(?:~=\s*v?(?:[0-9]+!)?[0-9]+(?:\.[0-9]+)+' + _PRE_RELEASE + _POST_RELEASE + _DEV_RELEASE + r')'
+        r'|(?:(?:<=|>=|<|>)\s*' + _RELEASE + _PRE_RELEASE + _POST_RELEASE + _DEV_RELEASE + r')',
+        re.IGNORECASE),
+    'AT': re.compile(r'@'),
+    'URL': re.compile(r'[^ \t]+'),
+    'IDENTIFIER': re.compile(r'\b[a-zA-Z0-9][a-zA-Z0-9._-]*\b'),
+    'VERSION_PREFIX_TRAIL': re.compile(r'\.\*'),
+    'VERSION_LOCAL_LABEL_TRAIL': re.compile(r'\+[a-z0-9]+(?:[-_\.][a-z0-9]+)*'),
+    'WS': re.compile(r'[ \t]+'),
+    'END': re.compile(r'\Z'),
+}
+
+
+class InvalidRequirement(ValueError):
+    """ Invalid requirement
+
+    The message contains the requirement and a marker (``^``) under the location of the error.
+    """
+    pass
+
+
+class Requirement(object):
+    """ Requirement parsed from a line of a requirements file
+
+    Attributes:
+        line (:obj:`str`): line, without its egg version hint
+        editable (:obj:`bool`): whether the requirement is editable
+        local_file (:obj:`bool`): whether the requirement is a local file
+        specifier (:obj:`bool`): whether the requirement is a PEP 508 dependency specifier
+        vcs (:obj:`str`): version control system (e.g., ``git``)
+        name (:obj:`str`): name
+        subdirectory (:obj:`str`): subdirectory of the URI
+        uri (:obj:`str`): URI
+        path (:obj:`str`): path of a local file
+        revision (:obj:`str`): revision of the URI
+        hash_name (:obj:`str`): hash algorithm (e.g., ``sha256``)
+        hash (:obj:`str`): hash
+        extras (:obj:`list` of :obj:`str`): extras
+        specs (:obj:`list` of :obj:`tuple` of :obj:`str`): operators and versions of the version specifiers
+        version_hint (:obj:`str`): version hint from the ``egg`` fragment (``#egg=name-version``)
+    """
+
+    def __init__(self, line):
+        """
+        Args:
+            line (:obj:`str`): line
+        """
+        self.line = line
+        self.editable = False
+        self.local_file = False
+        self.specifier = False
+        self.vcs = None
+        self.name = None
+        self.subdirectory = None
+        self.uri = None
+        self.path = None
+        self.revision = None
+        self.hash_name = None
+        self.hash = None
+        self.extras = []
+        self.specs = []
+        self.version_hint = None
+
+
+def parse_line(line):
+    """ Parse a line of a requirements file
+
+    Args:
+        line (:obj:`str`): line
+
+    Returns:
+        :obj:`Requirement`: requirement
+
+    Raises:
+        :obj:`ValueError`: if the line is invalid
+    """
+    match = EGG_VERSION_HINT_REGEX.search(line)
+    if match:
+        version_hint = match.group(2)
+        line = EGG_VERSION_HINT_REGEX.sub(r'egg=\1', line)
+    else:
+        version_hint = None
+
+    req = Requirement(line)
+    req.version_hint = version_hint
+
+    vcs_match = VCS_REGEX.match(line)
+    uri_match = None if vcs_match else URI_REGEX.match(line)
+
+    if vcs_match:
+        groups = vcs_match.groupdict()
+        if groups['login']:
+            req.uri = '{}://{}@{}'.format(groups['scheme'], groups['login'], groups['path'])
+        else:
+            req.uri = '{}://{}'.format(groups['scheme'], groups['path'])
+        req.revision = groups['revision']
+        if groups['fragment']:
+            _parse_fragment_into(req, groups['fragment'])
+        for vcs in VCS:
+            if req.uri.startswith(vcs):
+                req.vcs = vcs
+        if groups['name']:
+            req.name, req.extras = _parse_extras(groups['name'])
+
+    elif uri_match:
+        groups = uri_match.groupdict()
+        req.uri = '{}://{}'.format(groups['scheme'], groups['path'])
+        if groups['fragment']:
+            _parse_fragment_into(req, groups['fragment'])
+        if groups['scheme'] == 'file':
+            req.local_file = True
+
+    elif '#egg=' in line:
+        groups = LOCAL_REGEX.match(line).groupdict()
+        req.local_file = True
+        if groups['fragment']:
+            fragment = _parse_fragment(groups['fragment'])
+            req.name = fragment.get('egg')
+            req.hash_name, req.hash = _get_hash(fragment)
+            req.subdirectory = fragment.get('subdirectory')
+        req.path = groups['path']
+
+    else:
+        req.specifier = True
+        name, extras, specs, _ = parse_dependency_specifier(COMMENT_REGEX.sub('', line))
+        req.name = name
+        req.extras = [extra.lower() for extra in set(extras)]
+        req.specs = specs
+
+    return req
+
+
+def parse_dependency_specifier(source):
+    """ Parse a PEP 508 dependency specifier
+
+    Args:
+        source (:obj:`str`): dependency specifier
+
+    Returns:
+        :obj:`str`: name
+        :obj:`list` of :obj:`str`: extras
+        :obj:`list` of :obj:`tuple` of :obj:`str`: operators and versions of the version specifiers
+        :obj:`str`: URL, or :obj:`None` if the specifier doesn't have a URL
+
+    Raises:
+        :obj:`InvalidRequirement`: if the specifier is invalid
+    """
+    tokenizer = _Tokenizer(source)
+
+    tokenizer.consume('WS')
+    name = tokenizer.expect('IDENTIFIER', 'package name at the start of dependency specifier')
+    tokenizer.consume('WS')
+
+    extras = []
+    if tokenizer.check('LEFT_BRACKET'):
+        open_position = tokenizer.position
+        tokenizer.read()
+        tokenizer.consume('WS')
+        extras = _parse_extras_list(tokenizer)
+        tokenizer.consume('WS')
+        tokenizer.expect_closing('RIGHT_BRACKET', 'LEFT_BRACKET', 'extras', open_position)
+    tokenizer.consume('WS')
+
+    url = None
+    specs = []
+    if tokenizer.check('AT'):
+        tokenizer.read()
+        tokenizer.consume('WS')
+        url_start = tokenizer.position
+        url = tokenizer.expect('URL', 'URL after @')
+        if not tokenizer.check('END'):
+            tokenizer.expect('WS', 'whitespace after URL')
+            if not tokenizer.check('END'):
+                _parse_requirement_marker(tokenizer, url_start, 'semicolon (after URL and whitespace)')
+    else:
+        specifier_start = tokenizer.position
+        open_position = None
+        if tokenizer.check('LEFT_PARENTHESIS'):
+            open_position = tokenizer.position
+            tokenizer.read()
+        tokenizer.consume('WS')
+        specs = _parse_version_many(tokenizer)
+        tokenizer.consume('WS')
+        if open_position is not None:
+            tokenizer.expect_closing('RIGHT_PARENTHESIS', 'LEFT_PARENTHESIS', 'version specifier', open_position)
+        tokenizer.consume('WS')
+        if not tokenizer.check('END'):
+            _parse_requirement_marker(
+                tokenizer, specifier_start,
+                'comma (within version specifier), semicolon (after version specifier)'
+                if specs else 'semicolon (after name with no version specifier)')
+
+    tokenizer.expect('END', 'end of dependency specifier')
+    return (name, extras, specs, url)
+
+
+def _parse_extras_list(tokenizer):
+    """ Parse the names of the extras of a dependency specifier
+
+    Args:
+        tokenizer (:obj:`_Tokenizer`): tokenizer
+
+    Returns:
+        :obj:`list` of :obj:`str`: extras
+    """
+    extras = []
+    if not tokenizer.check('IDENTIFIER'):
+        return extras
+    extras.append(tokenizer.read())
+
+    while True:
+        tokenizer.consume('WS')
+        if tokenizer.check('IDENTIFIER'):
+            tokenizer.raise_syntax_error('Expected comma between extra names')
+        if not tokenizer.check('COMMA'):
+            break
+        tokenizer.read()
+        tokenizer.consume('WS')
+        extras.append(tokenizer.expect('IDENTIFIER', 'extra name after comma'))
+
+    return extras
+
+
+def _parse_version_many(tokenizer):
+    """ Parse the version specifiers of a dependency specifier
+
+    Args:
+        tokenizer (:obj:`_Tokenizer`): tokenizer
+
+    Returns:
+        :obj:`list` of :obj:`tuple` of :obj:`str`: operators and versions of the version specifiers
+    """
+    specs = []
+    while tokenizer.check('SPECIFIER'):
+        span_start = tokenizer.position
+        specifier = tokenizer.read()
+        operator, version = SPECIFIER_OPERATOR_REGEX.match(specifier).groups()
+        specs.append((operator, version.strip()))
+
+        if tokenizer.check('VERSION_PREFIX_TRAIL'):
+            if operator in ('==', '!='):
+                message = '.* suffix cannot be used with pre-release, post-release, dev or local versions'
+            else:
+                message = '.* suffix can only be used with `==` or `!=` operators'
+            tokenizer.raise_syntax_error(message, span_start=span_start, span_end=tokenizer.position + 1)
+        if tokenizer.check('VERSION_LOCAL_LABEL_TRAIL'):
+            tokenizer.raise_syntax_error('Local version label can only be used with `==` or `!=` operators',
+                                         span_start=span_start)
+
+        tokenizer.consume('WS')
+        if not tokenizer.check('COMMA'):
+            break
+        tokenizer.read()
+        tokenizer.consume('WS')
+    return specs
+
+
+def _parse_requirement_marker(tokenizer, span_start, expected):
+    """ Parse the environment marker of a dependency specifier
+
+    Args:
+        tokenizer (:obj:`_Tokenizer`): tokenizer
+        span_start (:obj:`int`): start of the span to report if the marker doesn't begin with a semicolon
+        expected (:obj:`str`): description of the expected tokens to report if the marker doesn't begin with a semicolon
+    """
+    if not tokenizer.check('SEMICOLON'):
+        tokenizer.raise_syntax_error('Expected {} or end'.format(expected), span_start=span_start)
+    tokenizer.read()
+    _parse_marker(tokenizer)
+    tokenizer.consume('WS')
+
+
+def _parse_marker(tokenizer):
+    """ Parse a marker expression (``marker_atom (BOOLOP marker_atom)*``)
+
+    Args:
+        tokenizer (:obj:`_Tokenizer`): tokenizer
+    """
+    _parse_marker_atom(tokenizer)
+    while tokenizer.check('BOOLOP'):
+        tokenizer.read()
+        _parse_marker_atom(tokenizer)
+
+
+def _parse_marker_atom(tokenizer):
+    """ Parse a parenthesized marker expression or a comparison
+
+    Args:
+        tokenizer (:obj:`_Tokenizer`): tokenizer
+    """
+    tokenizer.consume('WS')
+    if tokenizer.check('LEFT_PARENTHESIS'):
+        open_position = tokenizer.position
+        tokenizer.read()
+        tokenizer.consume('WS')
+        _parse_marker(tokenizer)
+        tokenizer.consume('WS')
+        tokenizer.expect_closing('RIGHT_PARENTHESIS', 'LEFT_PARENTHESIS', 'marker expression', open_position)
+    else:
+        _parse_marker_var(tokenizer)
+        tokenizer.consume('WS')
+        if tokenizer.check('IN'):
+            tokenizer.read()
+        elif tokenizer.check('NOT'):
+            tokenizer.read()
+            tokenizer.expect('WS', "whitespace after 'not'")
+            tokenizer.expect('IN', "'in' after 'not'")
+        elif tokenizer.check('OP'):
+            tokenizer.read()
+        else:
+            tokenizer.raise_syntax_error('Expected marker operator, one of <=, <, !=, ==, >=, >, ~=, ===, in, not in')
+        tokenizer.consume('WS')
+        _parse_marker_var(tokenizer)
+    tokenizer.consume('WS')
+
+
+def _parse_marker_var(tokenizer):
+    """ Parse an environment variable or a quoted string of a marker
+
+    Args:
+        tokenizer (:obj:`_Tokenizer`): tokenizer
+    """
+    if tokenizer.check('VARIABLE'):
+        tokenizer.read()
+    elif tokenizer.check('QUOTED_STRING'):
+        position = tokenizer.position
+        text = tokenizer.read()
+        try:
+            ast.literal_eval(text)
+        except (SyntaxError, ValueError):
+            tokenizer.raise_syntax_error('Invalid quoted string', span_start=position, span_end=position + len(text))
+    else:
+        tokenizer.raise_syntax_error('Expected a marker variable or quoted string')
+
+
+class _Tokenizer(object):
+    """ Tokenizer for dependency specifiers
+
+    Attributes:
+        source (:obj:`str`): dependency specifier
+        position (:obj:`int`): position of the next token
+        _match (:obj:`re.Match`): match of the last successful check, which :obj:`read` consumes
+    """
+
+    def __init__(self, source):
+        """
+        Args:
+            source (:obj:`str`): dependency specifier
+        """
+        self.source = source
+        self.position = 0
+        self._match = None
+
+    def check(self, name):
+        """ Check whether the next token is of a type
+
+        Args:
+            name (:obj:`str`): type of the token (key of :obj:`TOKENS`)
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the next token is of the type
+        """
+        self._match = TOKENS[name].match(self.source, self.position)
+        return self._match is not None
+
+    def read(self):
+        """ Consume the token of the last successful check
+
+        Returns:
+            :obj:`str`: text of the token
+        """
+        text = self._match.group(0)
+        self.position += len(text)
+        self._match = None
+        return text
+
+    def consume(self, name):
+        """ Consume the next token if it is of a type
+
+        Args:
+            name (:obj:`str`): type of the token
+        """
+        if self.check(name):
+            self.read()
+
+    def expect(self, name, expected):
+        """ Consume the next token, which must be of a type
+
+        Args:
+            name (:obj:`str`): type of the token
+            expected (:obj:`str`): description of the expected token to report if the next token isn't of the type
+
+        Returns:
+            :obj:`str`: text of the token
+
+        Raises:
+            :obj:`InvalidRequirement`: if the next token isn't of the type
+        """
+        if not self.check(name):
+            self.raise_syntax_error('Expected {}'.format(expected))
+        return self.read()
+
+    def expect_closing(self, name, open_name, around, open_position):
+        """ Consume a closing bracket or parenthesis
+
+        Args:
+            name (:obj:`str`): type of the closing token
+            open_name (:obj:`str`): type of the opening token
+            around (:obj:`str`): description of the enclosed tokens
+            open_position (:obj:`int`): position of the opening token
+
+        Raises:
+            :obj:`InvalidRequirement`: if the next token isn't the closing token
+        """
+        if not self.check(name):
+            self.raise_syntax_error('Expected matching {} for {}, after {}'.format(name, open_name, around),
+                                    span_start=open_position)
+        self.read()
+
+    def raise_syntax_error(self, message, span_start=None, span_end=None):
+        """ Raise an error for an invalid dependency specifier
+
+        Args:
+            message (:obj:`str`): description of the error
+            span_start (:obj:`int`, optional): start of the invalid text; default: the current position
+            span_end (:obj:`int`, optional): end of the invalid text; default: the current position
+
+        Raises:
+            :obj:`InvalidRequirement`: always
+        """
+        span_start = self.position if span_start is None else span_start
+        span_end = self.position if span_end is None else span_end
+        raise InvalidRequirement('{}\n    {}\n    {}'.format(
+            message, self.source, ' ' * span_start + '~' * (span_end - span_start) + '^'))
+
+
+def _parse_fragment_into(req, fragment):
+    """ Parse the fragment of a URI into the name, extras, hash and subdirectory of a requirement
+
+    Args:
+        req (:obj:`Requirement`): requirement
+        fragment (:obj:`str`): fragment
+    """
+    fragment = _parse_fragment(fragment)
+    req.name, req.extras = _parse_extras(fragment.get('egg'))
+    req.hash_name, req.hash = _get_hash(fragment)
+    req.subdirectory = fragment.get('subdirectory')
+
+
+def _parse_fragment(fragment):
+    """ Parse the fragment of a URI (e.g., ``egg=name&subdirectory=path``)
+
+    Args:
+        fragment (:obj:`str`): fragment
+
+    Returns:
+        :obj:`dict`: dictionary which maps the keys of the fragment to their values
+
+    Raises:
+        :obj:`ValueError`: if the fragment is invalid
+    """
+    fragment = fragment.lstrip('#')
+    values = {}
+    for key_value in fragment.split('&'):
+        key_value = key_value.split('=')
+        if len(key_value) != 2:
+            raise ValueError('Invalid fragment string {}'.format(fragment))
+        values[key_value[0]] = key_value[1]
+    return values
+
+
+def _get_hash(fragment):
+    """ Get the first hash of a fragment
+
+    Args:
+        fragment (:obj:`dict`): parsed fragment
+
+    Returns:
+        :obj:`str`: hash algorithm, or :obj:`None` if the fragment doesn't have a hash
+        :obj:`str`: hash, or :obj:`None` if the fragment doesn't have a hash
+    """
+    for key, value in fragment.items():
+        if key.lower() in HASH_ALGORITHMS:
+            return (key, value)
+    return (None, None)
+
+
+def _parse_extras(name):
+    """ Separate the name and extras of an egg (e.g., ``name[extra1,extra2]``)
+
+    Args:
+        name (:obj:`str`): egg
+
+    Returns:
+        :obj:`str`: name
+        :obj:`list` of :obj:`str`: extras
+    """
+    if name is not None:
+        match = EXTRAS_REGEX.search(name)
+        if match:
+            return (match.group('name'), [extra.strip() for extra in match.group('extras').split(',')])
+    return (name, [])
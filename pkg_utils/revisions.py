@@ -0,0 +1,196 @@
+""" Metadata of packages at git revisions, read without checking out the revisions
+
+The input files of the metadata (``README.rst``, ``_version.py`` and the requirements files) are streamed from the
+object database of the repository through a single ``git cat-file --batch`` process, which can be shared by the
+queries of many revisions and packages of the same repository.
+
+:License: MIT
+"""
+
+from .core import (PATTERNS, PackageMetadata, merge_dependencies, parse_optional_requirement_lines,
+                   parse_requirement_lines)
+from .watch import diff_metadata
+import posixpath
+import subprocess
+
+
+class GitCatFile(object):
+    """ Process which streams the contents of the objects of a git repository (``git cat-file --batch``)
+
+    Attributes:
+        repo_dirname (:obj:`str`): path to the repository
+        _process (:obj:`subprocess.Popen`): ``git cat-file`` process
+    """
+
+    def __init__(self, repo_dirname):
+        self.repo_dirname = repo_dirname
+        self._process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=repo_dirname,
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def read(self, object_name):
+        """ Read the content of an object
+
+        Args:
+            object_name (:obj:`str`): name of the object (e.g. ``<revision>:<path>``)
+
+        Returns:
+            :obj:`str`: type of the object (e.g. ``blob``, ``commit``), or :obj:`None` if the object doesn't exist
+            :obj:`bytes`: content of the object, or :obj:`None` if the object doesn't exist
+
+        Raises:
+            :obj:`ValueError`: if the name contains a newline or ``git cat-file`` exited
+        """
+        header = self._request(object_name)
+        if header is None:
+            return (None, None)
+        _, object_type, size = header
+        content = self._process.stdout.read(size)
+        self._process.stdout.read(1)
+        return (object_type, content)
+
+    def resolve(self, revision):
+        """ Get the hash of the commit of a revision
+
+        Args:
+            revision (:obj:`str`): revision (e.g. branch, tag or hash)
+
+        Returns:
+            :obj:`str`: hash of the commit
+
+        Raises:
+            :obj:`ValueError`: if the revision doesn't exist
+        """
+        header = self._request('{}^{{commit}}'.format(revision))
+        if header is None:
+            raise ValueError('Revision {} does not exist in {}'.format(revision, self.repo_dirname))
+        object_hash, _, size = header
+        self._process.stdout.read(size + 1)
+        return object_hash
+
+    def _request(self, object_name):
+        """ Request an object and read the header of the response
+
+        Args:
+            object_name (:obj:`str`): name of the object
+
+        Returns:
+            :obj:`tuple`: hash, type and size of the object, or :obj:`None` if the object doesn't exist
+
+        Raises:
+            :obj:`ValueError`: if the name contains a newline or ``git cat-file`` exited
+        """
+        if '\n' in object_name:
+            raise ValueError('Object names cannot contain newlines: {}'.format(object_name))
+        self._process.stdin.write(object_name.encode('utf-8') + b'\n')
+        self._process.stdin.flush()
+
+        header = self._process.stdout.readline()
+        if not header:
+            raise ValueError('git cat-file exited for repository {}'.format(self.repo_dirname))
+        if header.endswith((b' missing\n', b' ambiguous\n')):
+            return None
+        object_hash, object_type, size = header.decode('utf-8').split()
+        return (object_hash, object_type, int(size))
+
+    def close(self):
+        """ Stop the ``git cat-file`` process """
+        if self._process.poll() is None:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process.stdout.close()
+
+
+def get_revision_metadata(repo_dirname, revision, package_name, package_dirname='', cat_file=None):
+    """ Get metadata about a package at a git revision without checking out the revision
+
+    The long description, version and dependencies are read like :obj:`pkg_utils.get_package_metadata`. Package data
+    isn't expanded because it depends on the tree of the revision rather than on a fixed set of files.
+
+    Args:
+        repo_dirname (:obj:`str`): path to the repository
+        revision (:obj:`str`): revision (e.g. branch, tag or hash)
+        package_name (:obj:`str`): package name
+        package_dirname (:obj:`str`, optional): path to the package relative to the root of the repository
+        cat_file (:obj:`GitCatFile`, optional): ``git cat-file`` process of the repository to share between queries
+
+    Returns:
+        :obj:`PackageMetadata`: meta data
+
+    Raises:
+        :obj:`ValueError`: if the revision doesn't exist, or test or documentation dependencies are defined in
+            `requirements.optional.txt`
+    """
+    if cat_file is None:
+        with GitCatFile(repo_dirname) as cat_file:
+            return get_revision_metadata(repo_dirname, revision, package_name, package_dirname=package_dirname,
+                                         cat_file=cat_file)
+
+    commit = cat_file.resolve(revision)
+
+    def read(path):
+        path = posixpath.normpath(posixpath.join(package_dirname, path))
+        object_type, content = cat_file.read('{}:{}'.format(commit, path))
+        if object_type != 'blob':
+            return None
+        return content.decode('utf-8', errors='replace')
+
+    md = PackageMetadata()
+
+    # get long description
+    md.long_description = read('README.rst') or ''
+
+    # get version
+    version_content = read(posixpath.join(package_name, '_version.py'))
+    match = PATTERNS['version'].search(version_content) if version_content else None
+    md.version = match.group(1) if match else None
+
+    # get dependencies
+    requires = {}
+    dependency_links = []
+    for name, path in (('install', 'requirements.txt'), ('tests', 'tests/requirements.txt'),
+                       ('docs', 'docs/requirements.txt')):
+        requires[name], links = parse_requirement_lines((read(path) or '').splitlines(True), filename=path)
+        dependency_links += links
+    extras_require, links = parse_optional_requirement_lines((read('requirements.optional.txt') or '').splitlines(True),
+                                                             filename='requirements.optional.txt')
+    dependency_links += links
+    md.install_requires, md.extras_require, md.tests_require, md.dependency_links = merge_dependencies(
+        requires['install'], extras_require, requires['tests'], requires['docs'], dependency_links)
+
+    return md
+
+
+def diff_revision_metadata(repo_dirname, old_revision, new_revision, package_name, package_dirname='', cat_file=None):
+    """ Get the difference between the metadata of a package at two git revisions
+
+    Args:
+        repo_dirname (:obj:`str`): path to the repository
+        old_revision (:obj:`str`): old revision
+        new_revision (:obj:`str`): new revision
+        package_name (:obj:`str`): package name
+        package_dirname (:obj:`str`, optional): path to the package relative to the root of the repository
+        cat_file (:obj:`GitCatFile`, optional): ``git cat-file`` process of the repository to share between queries
+
+    Returns:
+        :obj:`dict`: dictionary which maps the name of each changed attribute to its difference
+            (see :obj:`pkg_utils.watch.diff_metadata`)
+
+    Raises:
+        :obj:`ValueError`: if a revision doesn't exist
+    """
+    if cat_file is None:
+        with GitCatFile(repo_dirname) as cat_file:
+            return diff_revision_metadata(repo_dirname, old_revision, new_revision, package_name,
+                                          package_dirname=package_dirname, cat_file=cat_file)
+
+    old = get_revision_metadata(repo_dirname, old_revision, package_name, package_dirname=package_dirname,
+                                cat_file=cat_file)
+    new = get_revision_metadata(repo_dirname, new_revision, package_name, package_dirname=package_dirname,
+                                cat_file=cat_file)
+    return diff_metadata(old, new)
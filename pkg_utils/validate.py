@@ -0,0 +1,88 @@
+""" Validate the syntax of the requirements files of a repository
+
+Validation only parses each line of each requirements file. It doesn't normalize, merge or sort the dependencies,
+and it reports all of the invalid lines of all of the files rather than only the first invalid line.
+
+:License: MIT
+"""
+
+from .core import (EXCLUDED_DIRECTORY_PATTERNS, RequirementError, parse_requirements_file,
+                   parse_optional_requirements_file, walk_package_data)
+import concurrent.futures
+import os
+
+REQUIREMENTS_FILENAME_PATTERNS = ('**/requirements.txt', '**/requirements.*.txt', '**/requirements-*.txt')
+
+
+def find_requirements_files(dirname, max_workers=None):
+    """ Find the requirements files of a repository
+
+    Version control, cache and build directories (see :obj:`EXCLUDED_DIRECTORY_PATTERNS`) are not searched.
+
+    Args:
+        dirname (:obj:`str`): path to the repository
+        max_workers (:obj:`int`, optional): number of threads to walk the repository with
+
+    Returns:
+        :obj:`list` of :obj:`str`: sorted paths to the requirements files
+    """
+    return [os.path.join(dirname, filename)
+            for filename in walk_package_data(dirname, REQUIREMENTS_FILENAME_PATTERNS, max_workers=max_workers or 1,
+                                              exclude_patterns=EXCLUDED_DIRECTORY_PATTERNS)]
+
+
+def validate_requirements_files(dirname=None, filenames=None, max_workers=None):
+    """ Validate the requirements files of a repository
+
+    Args:
+        dirname (:obj:`str`, optional): path to a repository whose requirements files should be validated
+        filenames (:obj:`list` of :obj:`str`, optional): paths to additional requirements files to validate
+        max_workers (:obj:`int`, optional): if provided, find and validate the files with a pool of this number of
+            threads. Because parsing is CPU-bound, this is only faster when reading the files is slow (e.g., on
+            network file systems).
+
+    Returns:
+        :obj:`list` of :obj:`RequirementError`: errors, sorted by file and line number
+    """
+    filenames = list(filenames or [])
+    if dirname is not None:
+        filenames.extend(find_requirements_files(dirname, max_workers=max_workers))
+    filenames = sorted(set(filenames))
+
+    errors = []
+    if max_workers and max_workers > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for file_errors in executor.map(validate_requirements_file, filenames):
+                errors.extend(file_errors)
+    else:
+        for filename in filenames:
+            errors.extend(validate_requirements_file(filename))
+    return errors
+
+
+def validate_requirements_file(filename, optional=None):
+    """ Validate a requirements file
+
+    Args:
+        filename (:obj:`str`): path to the requirements file
+        optional (:obj:`bool`, optional): whether the file is an optional requirements file with sections for each
+            option (e.g., ``requirements.optional.txt``); default: whether the name of the file ends with ``.optional.txt``
+
+    Returns:
+        :obj:`list` of :obj:`RequirementError`: errors, sorted by line number
+
+    Raises:
+        :obj:`ValueError`: if the file doesn't exist
+    """
+    if not os.path.isfile(filename):
+        raise ValueError('Requirements file {} does not exist'.format(filename))
+
+    if optional is None:
+        optional = os.path.basename(filename).endswith('.optional.txt')
+
+    errors = []
+    if optional:
+        parse_optional_requirements_file(filename, diagnostics=errors)
+    else:
+        parse_requirements_file(filename, diagnostics=errors)
+    return errors
@@ -0,0 +1,393 @@
+""" Pool of virtual environments keyed by the digests of their dependencies
+
+Environments are built once for each distinct set of dependencies (see :obj:`pkg_utils.digest`), reused by later jobs,
+and evicted in least recently used order when the pool exceeds its disk budget. Jobs can use pooled environments
+directly, or clone them into their own directories with reflinks (copy-on-write copies) or hard links where the file
+system supports them. Parallel jobs, including jobs in other processes, coordinate through advisory file locks:
+each environment is built by only one job, and environments are only evicted when no job is using them.
+
+:License: MIT
+"""
+
+from .digest import digest_dependencies, get_canonical_dependencies
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+INDEX_FORMAT_VERSION = 1
+FICLONE = 0x40049409
+
+
+class VenvPool(object):
+    """ Pool of virtual environments keyed by the digests of their dependencies
+
+    Attributes:
+        dirname (:obj:`str`): path to the directory of the pool
+        max_size (:obj:`int`): maximum total size of the environments in bytes, or :obj:`None` for no limit
+        python (:obj:`str`): path to the Python interpreter to build the environments with
+        with_pip (:obj:`bool`): if :obj:`True`, install pip into the environments and install the dependencies
+            with it; otherwise, install the dependencies with the pip of :obj:`python` (requires pip >= 22.3)
+        find_links (:obj:`str`): path to a local directory of distributions to install from instead of PyPI
+    """
+
+    def __init__(self, dirname, max_size=None, python=None, with_pip=True, find_links=None):
+        """
+        Args:
+            dirname (:obj:`str`): path to the directory of the pool
+            max_size (:obj:`int`, optional): maximum total size of the environments in bytes
+            python (:obj:`str`, optional): path to the Python interpreter to build the environments with;
+                default: :obj:`sys.executable`
+            with_pip (:obj:`bool`, optional): if :obj:`True`, install pip into the environments and install
+                the dependencies with it; otherwise, install the dependencies with the pip of :obj:`python`
+            find_links (:obj:`str`, optional): path to a local directory of distributions to install from instead of PyPI
+
+        Raises:
+            :obj:`ValueError`: if advisory file locks are not supported on this platform
+        """
+        if fcntl is None:
+            raise ValueError('Pools of virtual environments require advisory file locks (fcntl)')  # pragma: no cover
+        self.dirname = dirname
+        self.max_size = max_size
+        self.python = python or sys.executable
+        self.with_pip = with_pip
+        self.find_links = find_links
+        for subdirname in ('envs', 'locks'):
+            os.makedirs(os.path.join(dirname, subdirname), exist_ok=True)
+
+    def get_key(self, install_requires, extras_require=None, dependency_links=None, options=None):
+        """ Get the key of the environment for dependencies
+
+        Args:
+            install_requires (:obj:`list` of :obj:`str`): requirements (e.g. from :obj:`pkg_utils.get_dependencies`)
+            extras_require (:obj:`dict` of :obj:`list` of :obj:`str`, optional): optional requirements of each option
+            dependency_links (:obj:`list` of :obj:`str`, optional): dependency links
+            options (:obj:`list` of :obj:`str`, optional): options whose optional requirements should be installed
+
+        Returns:
+            :obj:`str`: key
+
+        Raises:
+            :obj:`ValueError`: if a requirement is invalid or an option is undefined
+        """
+        dependencies_digest = digest_dependencies(install_requires, extras_require or {}, dependency_links or [],
+                                                  options=options or [])
+        return hashlib.sha256('\n'.join([dependencies_digest, os.path.abspath(self.python),
+                                         self.find_links or '']).encode('utf-8')).hexdigest()[:32]
+
+    @contextlib.contextmanager
+    def acquire(self, install_requires, extras_require=None, dependency_links=None, options=None):
+        """ Get an environment with dependencies, building it if the pool doesn't contain one
+
+        The environment is shared with other jobs, and it isn't evicted while the context is active. Jobs which
+        need to modify their environments should use :obj:`clone`.
+
+        Args:
+            install_requires (:obj:`list` of :obj:`str`): requirements (e.g. from :obj:`pkg_utils.get_dependencies`)
+            extras_require (:obj:`dict` of :obj:`list` of :obj:`str`, optional): optional requirements of each option
+            dependency_links (:obj:`list` of :obj:`str`, optional): dependency links
+            options (:obj:`list` of :obj:`str`, optional): options whose optional requirements should be installed
+
+        Yields:
+            :obj:`str`: path to the environment
+
+        Raises:
+            :obj:`ValueError`: if a requirement is invalid or an option is undefined
+            :obj:`subprocess.CalledProcessError`: if the environment couldn't be built
+        """
+        key = self.get_key(install_requires, extras_require=extras_require, dependency_links=dependency_links,
+                           options=options)
+        env_dirname = os.path.join(self.dirname, 'envs', key)
+
+        with open(os.path.join(self.dirname, 'locks', key + '.lock'), 'a+') as lock_file:
+            while True:
+                if not os.path.isdir(env_dirname):
+                    # build the environment while holding a separate exclusive lock, so that only one job builds it
+                    # without blocking the jobs which are using other environments or this environment
+                    with open(os.path.join(self.dirname, 'locks', key + '.build.lock'), 'a+') as build_lock_file:
+                        fcntl.flock(build_lock_file, fcntl.LOCK_EX)
+                        if not os.path.isdir(env_dirname):
+                            requires = get_canonical_dependencies(install_requires, extras_require or {},
+                                                                  dependency_links or [],
+                                                                  options=options or [])['requires']
+                            self._build(env_dirname, requires, dependency_links or [])
+                        fcntl.flock(build_lock_file, fcntl.LOCK_UN)
+
+                # mark the environment as in use; retry if it was evicted before the lock was acquired
+                fcntl.flock(lock_file, fcntl.LOCK_SH)
+                if os.path.isdir(env_dirname):
+                    break
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+            def touch(index):
+                entry = index.get(key) or {'size': _get_size(env_dirname)}
+                entry['last_used'] = time.time()
+                index[key] = entry
+            self._update_index(touch)
+            try:
+                yield env_dirname
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        if self.max_size is not None:
+            self.evict(keep=[key])
+
+    def clone(self, dest, install_requires, extras_require=None, dependency_links=None, options=None, hardlink=False):
+        """ Copy an environment with dependencies into a directory, building it if the pool doesn't contain one
+
+        Files are copied with reflinks (copy-on-write copies) where the file system supports them, and otherwise
+        with regular copies or, optionally, hard links. The paths in the scripts and configuration of the environment
+        are updated to the new location.
+
+        Args:
+            dest (:obj:`str`): path to copy the environment to
+            install_requires (:obj:`list` of :obj:`str`): requirements (e.g. from :obj:`pkg_utils.get_dependencies`)
+            extras_require (:obj:`dict` of :obj:`list` of :obj:`str`, optional): optional requirements of each option
+            dependency_links (:obj:`list` of :obj:`str`, optional): dependency links
+            options (:obj:`list` of :obj:`str`, optional): options whose optional requirements should be installed
+            hardlink (:obj:`bool`, optional): if :obj:`True`, hard link the files rather than copying them. Hard links
+                are cheapest, but the files of the copy must not be modified in place because they are shared with
+                the pool.
+
+        Returns:
+            :obj:`str`: path to the copy of the environment
+
+        Raises:
+            :obj:`ValueError`: if :obj:`dest` already exists, a requirement is invalid or an option is undefined
+            :obj:`subprocess.CalledProcessError`: if the environment couldn't be built
+        """
+        if os.path.exists(dest):
+            raise ValueError('{} already exists'.format(dest))
+        with self.acquire(install_requires, extras_require=extras_require, dependency_links=dependency_links,
+                          options=options) as env_dirname:
+            _copy_venv(env_dirname, dest, hardlink=hardlink)
+        return dest
+
+    def evict(self, max_size=None, keep=None):
+        """ Evict the least recently used environments which aren't in use until the total size of the pool is
+        within its budget
+
+        Args:
+            max_size (:obj:`int`, optional): maximum total size of the environments in bytes; default: :obj:`max_size`
+            keep (:obj:`list` of :obj:`str`, optional): keys of environments which shouldn't be evicted
+
+        Returns:
+            :obj:`list` of :obj:`str`: keys of the evicted environments
+        """
+        if max_size is None:
+            max_size = self.max_size
+        if max_size is None:
+            return []
+        keep = set(keep or [])
+        evicted = []
+
+        def evict_entries(index):
+            total_size = sum(entry['size'] for entry in index.values())
+            for key, entry in sorted(index.items(), key=lambda key_entry: key_entry[1]['last_used']):
+                if total_size <= max_size:
+                    break
+                if key in keep:
+                    continue
+                with open(os.path.join(self.dirname, 'locks', key + '.lock'), 'a+') as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # the environment is in use
+                    # move the environment out of the pool before deleting it, so that jobs never see a partially
+                    # deleted environment
+                    env_dirname = os.path.join(self.dirname, 'envs', key)
+                    evicted_dirname = tempfile.mkdtemp(prefix=key + '.evict-', dir=os.path.join(self.dirname, 'envs'))
+                    try:
+                        if os.path.isdir(env_dirname):
+                            os.rename(env_dirname, evicted_dirname)
+                    except OSError:
+                        os.rmdir(evicted_dirname)
+                        continue
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    shutil.rmtree(evicted_dirname, ignore_errors=True)
+                index.pop(key)
+                total_size -= entry['size']
+                evicted.append(key)
+
+        self._update_index(evict_entries)
+        return evicted
+
+    def get_index(self):
+        """ Get the index of the environments of the pool
+
+        Returns:
+            :obj:`dict`: dictionary which maps the key of each environment to a dictionary with its ``size`` in bytes
+                and the time when it was ``last_used``
+        """
+        filename = os.path.join(self.dirname, 'index.json')
+        if not os.path.isfile(filename):
+            return {}
+        with open(filename, 'r') as file:
+            content = json.load(file)
+        if content.get('version') != INDEX_FORMAT_VERSION:
+            return {}
+        return content['envs']
+
+    def _update_index(self, update):
+        """ Update the index of the environments of the pool while holding an exclusive lock on it
+
+        Args:
+            update (:obj:`callable`): function which modifies the index in place
+        """
+        with open(os.path.join(self.dirname, 'index.lock'), 'a+') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = self.get_index()
+            update(index)
+            filename = os.path.join(self.dirname, 'index.json')
+            with open(filename + '.tmp', 'w') as file:
+                json.dump({'version': INDEX_FORMAT_VERSION, 'envs': index}, file, indent=2, sort_keys=True)
+            os.replace(filename + '.tmp', filename)
+
+    def _build(self, env_dirname, requires, dependency_links):
+        """ Build an environment in a temporary directory and move it into the pool
+
+        Args:
+            env_dirname (:obj:`str`): path to the environment
+            requires (:obj:`list` of :obj:`str`): requirements
+            dependency_links (:obj:`list` of :obj:`str`): dependency links
+
+        Raises:
+            :obj:`subprocess.CalledProcessError`: if the environment couldn't be built
+        """
+        tmp_dirname = '{}.tmp-{}'.format(env_dirname, os.getpid())
+        shutil.rmtree(tmp_dirname, ignore_errors=True)
+        try:
+            args = [self.python, '-m', 'venv', tmp_dirname]
+            if not self.with_pip:
+                args.append('--without-pip')
+            subprocess.check_call(args)
+
+            if requires or dependency_links:
+                if self.with_pip:
+                    args = [_get_venv_python(tmp_dirname), '-m', 'pip', 'install', '-q']
+                else:
+                    args = [self.python, '-m', 'pip', '--python', _get_venv_python(tmp_dirname), 'install', '-q']
+                if self.find_links:
+                    args += ['--no-index', '--find-links', self.find_links]
+                subprocess.check_call(args + list(dependency_links) + list(requires))
+
+            _copy_venv(tmp_dirname, env_dirname, move=True)
+        finally:
+            shutil.rmtree(tmp_dirname, ignore_errors=True)
+
+
+def _get_venv_python(dirname):
+    """ Get the path to the Python interpreter of a virtual environment
+
+    Args:
+        dirname (:obj:`str`): path to the environment
+
+    Returns:
+        :obj:`str`: path to the interpreter
+    """
+    if sys.platform == 'win32':  # pragma: no cover
+        return os.path.join(dirname, 'Scripts', 'python.exe')
+    return os.path.join(dirname, 'bin', 'python')
+
+
+def _get_size(dirname):
+    """ Get the total size of the files in a directory
+
+    Args:
+        dirname (:obj:`str`): path to the directory
+
+    Returns:
+        :obj:`int`: total size in bytes
+    """
+    size = 0
+    for root, _, basenames in os.walk(dirname):
+        for basename in basenames:
+            size += os.lstat(os.path.join(root, basename)).st_size
+    return size
+
+
+def _copy_venv(src, dest, hardlink=False, move=False):
+    """ Copy or move a virtual environment, updating the paths in its scripts and configuration
+
+    Args:
+        src (:obj:`str`): path to the environment
+        dest (:obj:`str`): path to copy the environment to
+        hardlink (:obj:`bool`, optional): if :obj:`True`, hard link the files rather than copying them
+        move (:obj:`bool`, optional): if :obj:`True`, move the environment rather than copying it
+    """
+    src = os.path.abspath(src)
+    dest = os.path.abspath(dest)
+    scripts_dirname = os.path.dirname(_get_venv_python(src))
+
+    if move:
+        # update the paths before moving the environment into place, so that it is complete once it appears
+        for basename in ['pyvenv.cfg'] + os.listdir(scripts_dirname):
+            filename = os.path.join(src if basename == 'pyvenv.cfg' else scripts_dirname, basename)
+            if os.path.isfile(filename) and not os.path.islink(filename):
+                _rewrite_paths(filename, filename, src, dest)
+        os.rename(src, dest)
+        return
+
+    reflink = [True]
+    for root, dirnames, basenames in os.walk(src):
+        dest_root = os.path.join(dest, os.path.relpath(root, src))
+        os.makedirs(dest_root, exist_ok=True)
+        for basename in dirnames + basenames:
+            src_filename = os.path.join(root, basename)
+            dest_filename = os.path.join(dest_root, basename)
+            if os.path.islink(src_filename):
+                os.symlink(os.readlink(src_filename), dest_filename)
+            elif basename in basenames:
+                if root == scripts_dirname or (root == src and basename == 'pyvenv.cfg'):
+                    _rewrite_paths(src_filename, dest_filename, src, dest)
+                elif hardlink:
+                    os.link(src_filename, dest_filename)
+                else:
+                    _copy_file(src_filename, dest_filename, reflink)
+        dirnames[:] = [dirname for dirname in dirnames if not os.path.islink(os.path.join(root, dirname))]
+
+
+def _rewrite_paths(src_filename, dest_filename, old_dirname, new_dirname):
+    """ Copy a file, replacing the path of an environment in its content
+
+    Args:
+        src_filename (:obj:`str`): path to the file
+        dest_filename (:obj:`str`): path to save the copy
+        old_dirname (:obj:`str`): old path of the environment
+        new_dirname (:obj:`str`): new path of the environment
+    """
+    with open(src_filename, 'rb') as file:
+        content = file.read()
+    with open(dest_filename, 'wb') as file:
+        file.write(content.replace(old_dirname.encode(), new_dirname.encode()))
+    shutil.copymode(src_filename, dest_filename)
+
+
+def _copy_file(src, dest, reflink):
+    """ Copy a file with a reflink (copy-on-write copy) if the file system supports it, and otherwise with a regular copy
+
+    Args:
+        src (:obj:`str`): path to the file
+        dest (:obj:`str`): path to save the copy
+        reflink (:obj:`list` of :obj:`bool`): single-element list which indicates whether reflinks should be attempted;
+            set to :obj:`False` once the file system reports that it doesn't support them
+    """
+    if reflink[0] and sys.platform.startswith('linux'):
+        try:
+            with open(src, 'rb') as src_file, open(dest, 'wb') as dest_file:
+                fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+            shutil.copystat(src, dest)
+            return
+        except OSError:
+            reflink[0] = False
+    shutil.copy2(src, dest)
@@ -0,0 +1,143 @@
+""" Watch the input files of the metadata of a package and incrementally recompute the metadata when they change
+
+Changes are detected by polling the modification times and sizes of the input files (``README.md``,
+``README.rst``, ``package/_version.py``, the requirements files, and the directories of the package data),
+which works on any file system without additional services. Only the parts of the metadata whose inputs
+changed are recomputed (e.g., only ``requirements.optional.txt`` is reparsed when it changes).
+
+:License: MIT
+"""
+
+from .daemon import MetadataCache
+import sys
+import time
+
+
+class Watcher(object):
+    """ Watch the input files of the metadata of a package
+
+    Attributes:
+        dirname (:obj:`str`): path to the package
+        package_name (:obj:`str`): package name
+        package_data_filename_patterns (:obj:`dict`): package name, optionally with glob patterns in the filenames
+        convert_readme (:obj:`bool`): if :obj:`True`, convert README.md to README.rst when README.md changes
+        metadata (:obj:`PackageMetadata`): latest metadata
+        _cache (:obj:`MetadataCache`): cache of the parts of the metadata
+    """
+
+    def __init__(self, dirname, package_name, package_data_filename_patterns=None, convert_readme=False):
+        """
+        Args:
+            dirname (:obj:`str`): path to the package
+            package_name (:obj:`str`): package name
+            package_data_filename_patterns (:obj:`dict`, optional): package name, optionally with glob patterns in the filenames
+            convert_readme (:obj:`bool`, optional): if :obj:`True`, convert README.md to README.rst when README.md changes
+        """
+        self.dirname = dirname
+        self.package_name = package_name
+        self.package_data_filename_patterns = package_data_filename_patterns
+        self.convert_readme = convert_readme
+        self._cache = MetadataCache()
+        self.metadata = self._get_metadata()
+
+    def poll(self):
+        """ Recompute the parts of the metadata whose inputs changed since the last poll
+
+        Returns:
+            :obj:`dict`: difference between the previous and the new metadata (see :obj:`diff_metadata`)
+        """
+        metadata = self._get_metadata()
+        diff = diff_metadata(self.metadata, metadata)
+        self.metadata = metadata
+        return diff
+
+    def watch(self, callback, interval=1., max_polls=None, error_callback=None):
+        """ Poll the inputs of the metadata periodically and report the changes to the metadata
+
+        Errors in the inputs (e.g., invalid requirements) are reported, and polling continues from the last valid
+        metadata so that the changes are reported once the errors are fixed.
+
+        Args:
+            callback (:obj:`callable`): function which is called with the difference between the previous and new metadata
+                (see :obj:`diff_metadata`) each time the metadata changes
+            interval (:obj:`float`, optional): interval between polls in seconds
+            max_polls (:obj:`int`, optional): maximum number of polls; default: poll until interrupted
+            error_callback (:obj:`callable`, optional): function which is called with the exception each time the
+                metadata can't be computed; default: write the errors to standard error
+        """
+        n_polls = 0
+        while max_polls is None or n_polls < max_polls:
+            time.sleep(interval)
+            try:
+                diff = self.poll()
+            except (ValueError, OSError) as exception:
+                if error_callback is None:
+                    sys.stderr.write('{}\n'.format(exception))
+                else:
+                    error_callback(exception)
+                diff = None
+            if diff:
+                callback(diff)
+            n_polls += 1
+
+    def _get_metadata(self):
+        """ Get the metadata, recomputing the parts whose inputs changed
+
+        Returns:
+            :obj:`PackageMetadata`: metadata
+        """
+        if self.convert_readme:
+            self._cache.convert_readme_md_to_rst(self.dirname)
+        return self._cache.get_package_metadata(self.dirname, self.package_name,
+                                                package_data_filename_patterns=self.package_data_filename_patterns)
+
+
+def diff_metadata(old, new):
+    """ Get the difference between two versions of the metadata of a package
+
+    Args:
+        old (:obj:`PackageMetadata`): old metadata
+        new (:obj:`PackageMetadata`): new metadata
+
+    Returns:
+        :obj:`dict`: dictionary which maps the name of each changed attribute to its difference. The differences of
+            strings are dictionaries with the keys ``old`` and ``new``. The differences of lists are dictionaries with
+            the keys ``added`` and ``removed``. The differences of dictionaries (``extras_require``, ``package_data``)
+            are dictionaries which map each changed key to the difference of its list.
+    """
+    diff = {}
+    for attr, old_value in sorted(old.__dict__.items()):
+        new_value = getattr(new, attr)
+        if old_value == new_value:
+            continue
+        if isinstance(old_value, dict):
+            attr_diff = {}
+            for key in sorted(set(old_value.keys()) | set(new_value.keys())):
+                key_diff = _diff_lists(old_value.get(key, []), new_value.get(key, []))
+                if key_diff:
+                    attr_diff[key] = key_diff
+        elif isinstance(old_value, list):
+            attr_diff = _diff_lists(old_value, new_value)
+        else:
+            attr_diff = {'old': old_value, 'new': new_value}
+        if attr_diff:
+            diff[attr] = attr_diff
+    return diff
+
+
+def _diff_lists(old, new):
+    """ Get the difference between two lists
+
+    Args:
+        old (:obj:`list`): old list
+        new (:obj:`list`): new list
+
+    Returns:
+        :obj:`dict`: dictionary with the sorted ``added`` and ``removed`` items, or an empty dictionary if
+            the lists contain the same items
+    """
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    if not added and not removed:
+        return {}
+    return {'added': added, 'removed': removed}
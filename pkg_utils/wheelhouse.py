@@ -0,0 +1,569 @@
+""" Utilities for locking dependencies to the distributions in a local wheelhouse (a directory of wheels
+and source distributions, e.g. created with ``pip wheel`` or ``pip download``)
+
+:License: MIT
+"""
+
+from .core import get_dependencies, write_file_if_changed
+import email.parser
+import hashlib
+import json
+import os
+import packaging.requirements
+import packaging.specifiers
+import packaging.tags
+import packaging.utils
+import packaging.version
+import tarfile
+import threading
+import zipfile
+
+METADATA_CACHE_FORMAT_VERSION = 2
+
+
+class Distribution(object):
+    """ Distribution (wheel or source distribution) in a wheelhouse
+
+    Attributes:
+        name (:obj:`str`): normalized name of the project
+        version (:obj:`packaging.version.Version`): version
+        filename (:obj:`str`): path to the distribution
+    """
+
+    def __init__(self, name, version, filename):
+        self.name = name
+        self.version = version
+        self.filename = filename
+
+    @property
+    def is_wheel(self):
+        """ Determine whether the distribution is a wheel
+
+        Returns:
+            :obj:`bool`: :obj:`True` if the distribution is a wheel
+        """
+        return self.filename.endswith('.whl')
+
+    def get_requires(self):
+        """ Get the requirements of the distribution from its ``METADATA`` or ``PKG-INFO`` file
+
+        Returns:
+            :obj:`list` of :obj:`str`: requirements (``Requires-Dist``)
+
+        Raises:
+            :obj:`ValueError`: if the requirements of a source distribution aren't declared statically
+        """
+        return read_distribution_requires(self.filename)
+
+
+class LockedRequirement(object):
+    """ Requirement pinned to a distribution in a wheelhouse
+
+    Attributes:
+        name (:obj:`str`): normalized name of the project
+        version (:obj:`packaging.version.Version`): pinned version
+        hashes (:obj:`list` of :obj:`str`): hashes of the distributions of the version (e.g. ``sha256:...``)
+    """
+
+    def __init__(self, name, version, hashes):
+        self.name = name
+        self.version = version
+        self.hashes = hashes
+
+    def __str__(self):
+        return ' \\\n'.join(['{}=={}'.format(self.name, self.version)] +
+                            ['    --hash={}'.format(file_hash) for file_hash in self.hashes])
+
+
+class DistributionMetadataCache(object):
+    """ Persistent cache of the requirements and installed sizes of the distributions in a wheelhouse
+
+    Each entry is keyed by the absolute path of a distribution and is invalidated when the size or modification time
+    of the distribution changes, so that the metadata of each distribution is only read once across runs.
+
+    Attributes:
+        filename (:obj:`str`): path to save the cache, or :obj:`None` to only cache in memory
+        _entries (:obj:`dict`): dictionary which maps the path of each distribution to a dictionary with its ``size``,
+            ``mtime_ns``, ``requires`` and ``install_size``
+        _modified (:obj:`bool`): whether the entries have changed since the cache was read
+        _lock (:obj:`threading.Lock`): lock which guards :obj:`_entries`
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._entries = {}
+        self._modified = False
+        self._lock = threading.Lock()
+
+        if filename and os.path.isfile(filename):
+            with open(filename, 'r') as file:
+                content = json.load(file)
+            if content.get('version') == METADATA_CACHE_FORMAT_VERSION:
+                self._entries = content['distributions']
+
+    def get(self, filename):
+        """ Get the requirements and installed size of a distribution, reading them from the distribution if they
+        aren't cached or the distribution has changed
+
+        Args:
+            filename (:obj:`str`): path to a wheel or source distribution
+
+        Returns:
+            :obj:`dict`: dictionary with the ``size`` of the distribution, its requirements (``requires``) and the total
+                uncompressed size of its files (``install_size``)
+        """
+        filename = os.path.abspath(filename)
+        stat = os.stat(filename)
+        with self._lock:
+            entry = self._entries.get(filename)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry
+
+        entry = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'requires': read_distribution_requires(filename),
+            'install_size': get_distribution_install_size(filename),
+        }
+        with self._lock:
+            self._entries[filename] = entry
+            self._modified = True
+        return entry
+
+    def save(self):
+        """ Save the cache atomically if it has a path and its entries have changed """
+        with self._lock:
+            if not self.filename or not self._modified:
+                return
+            write_file_if_changed(self.filename, json.dumps(
+                {'version': METADATA_CACHE_FORMAT_VERSION, 'distributions': self._entries}, indent=2, sort_keys=True))
+            self._modified = False
+
+
+class DependencyClosure(object):
+    """ Transitive closure of the dependencies of a package, pinned to distributions in a wheelhouse
+
+    Attributes:
+        distributions (:obj:`list` of :obj:`Distribution`): pinned distributions, sorted by name
+        download_sizes (:obj:`dict` of :obj:`int`): dictionary which maps the name of each project to the size of its
+            distribution
+        install_sizes (:obj:`dict` of :obj:`int`): dictionary which maps the name of each project to the total
+            uncompressed size of the files of its distribution
+    """
+
+    def __init__(self, distributions, download_sizes, install_sizes):
+        self.distributions = distributions
+        self.download_sizes = download_sizes
+        self.install_sizes = install_sizes
+
+    @property
+    def download_size(self):
+        """ Get the total size of the distributions
+
+        Returns:
+            :obj:`int`: total size of the distributions in bytes
+        """
+        return sum(self.download_sizes.values())
+
+    @property
+    def install_size(self):
+        """ Get the total uncompressed size of the files of the distributions
+
+        Returns:
+            :obj:`int`: total uncompressed size in bytes
+        """
+        return sum(self.install_sizes.values())
+
+
+def get_wheelhouse_distributions(wheelhouse, tags=None):
+    """ Get the distributions in a wheelhouse
+
+    Args:
+        wheelhouse (:obj:`str`): path to a directory of wheels and source distributions
+        tags (:obj:`set` of :obj:`packaging.tags.Tag`, optional): tags of the supported wheels;
+            default: the tags supported by the running interpreter
+
+    Returns:
+        :obj:`dict` of :obj:`list` of :obj:`Distribution`: dictionary which maps the normalized name of each project
+            to its distributions, sorted from the newest to the oldest version
+    """
+    if tags is None:
+        tags = set(packaging.tags.sys_tags())
+
+    distributions = {}
+    for basename in sorted(os.listdir(wheelhouse)):
+        filename = os.path.join(wheelhouse, basename)
+        try:
+            if basename.endswith('.whl'):
+                name, version, _, dist_tags = packaging.utils.parse_wheel_filename(basename)
+                if tags.isdisjoint(dist_tags):
+                    continue
+            elif basename.endswith(('.tar.gz', '.zip')):
+                name, version = packaging.utils.parse_sdist_filename(basename)
+            else:
+                continue
+        except (packaging.utils.InvalidWheelFilename, packaging.utils.InvalidSdistFilename):
+            continue
+        distributions.setdefault(name, []).append(Distribution(name, version, filename))
+
+    for name_distributions in distributions.values():
+        name_distributions.sort(key=lambda distribution: (distribution.version, distribution.is_wheel), reverse=True)
+
+    return distributions
+
+
+def read_distribution_metadata(filename):
+    """ Read the metadata of a wheel or a source distribution without extracting it
+
+    Args:
+        filename (:obj:`str`): path to a wheel or source distribution
+
+    Returns:
+        :obj:`email.message.Message`: metadata
+
+    Raises:
+        :obj:`ValueError`: if the distribution doesn't contain a metadata file
+    """
+    if filename.endswith('.tar.gz'):
+        with tarfile.open(filename, 'r:gz') as archive:
+            for member in archive:
+                if member.isfile() and member.name.count('/') == 1 and member.name.endswith('/PKG-INFO'):
+                    return _parse_metadata(archive.extractfile(member).read())
+    else:
+        with zipfile.ZipFile(filename) as archive:
+            for name in archive.namelist():
+                if name.count('/') == 1 and (
+                        (name.endswith('.dist-info/METADATA') and filename.endswith('.whl'))
+                        or (name.endswith('/PKG-INFO') and not filename.endswith('.whl'))):
+                    return _parse_metadata(archive.read(name))
+    raise ValueError('Distribution does not contain metadata: {}'.format(filename))
+
+
+def read_distribution_requires(filename):
+    """ Read the requirements (``Requires-Dist``) of a wheel or a source distribution without extracting it
+
+    The requirements of a source distribution are only known if its ``PKG-INFO`` declares them statically, which
+    requires metadata version 2.2 or newer and that ``Requires-Dist`` isn't marked as ``Dynamic``. Older source
+    distributions which list requirements are trusted.
+
+    Args:
+        filename (:obj:`str`): path to a wheel or source distribution
+
+    Returns:
+        :obj:`list` of :obj:`str`: requirements
+
+    Raises:
+        :obj:`ValueError`: if the requirements of a source distribution aren't declared statically
+    """
+    metadata = read_distribution_metadata(filename)
+    requires = metadata.get_all('Requires-Dist') or []
+    if not filename.endswith('.whl'):
+        dynamic = [field.strip().lower() for field in metadata.get_all('Dynamic') or []]
+        try:
+            static = packaging.version.Version(metadata.get('Metadata-Version', '1.0')) >= packaging.version.Version('2.2')
+        except packaging.version.InvalidVersion:
+            static = False
+        if 'requires-dist' in dynamic or (not requires and not static):
+            raise ValueError('Requirements of {} are not declared in its PKG-INFO; add a wheel of it to the '
+                             'wheelhouse'.format(filename))
+    return requires
+
+
+def get_distribution_install_size(filename):
+    """ Get the total uncompressed size of the files of a wheel or source distribution without extracting it
+
+    Args:
+        filename (:obj:`str`): path to a wheel or source distribution
+
+    Returns:
+        :obj:`int`: total uncompressed size in bytes
+    """
+    if filename.endswith('.tar.gz'):
+        with tarfile.open(filename, 'r:gz') as archive:
+            return sum(member.size for member in archive if member.isfile())
+    with zipfile.ZipFile(filename) as archive:
+        return sum(info.file_size for info in archive.infolist())
+
+
+def _parse_metadata(content):
+    """ Parse the content of a metadata file
+
+    Args:
+        content (:obj:`bytes`): content of a ``METADATA`` or ``PKG-INFO`` file
+
+    Returns:
+        :obj:`email.message.Message`: metadata
+    """
+    return email.parser.Parser().parsestr(content.decode('utf-8', errors='replace'), headersonly=True)
+
+
+def hash_file(filename, algorithm='sha256'):
+    """ Calculate the hash of a file in the format used by pip's hash-checking mode
+
+    Args:
+        filename (:obj:`str`): path to the file
+        algorithm (:obj:`str`, optional): hash algorithm
+
+    Returns:
+        :obj:`str`: hash (e.g. ``sha256:...``)
+    """
+    hasher = hashlib.new(algorithm)
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return '{}:{}'.format(algorithm, hasher.hexdigest())
+
+
+def lock_requirements(requires, wheelhouse, environment=None, tags=None, max_iterations=100):
+    """ Pin requirements and their dependencies to the newest distributions in a wheelhouse which satisfy them
+
+    Args:
+        requires (:obj:`list` of :obj:`str`): requirements
+        wheelhouse (:obj:`str`): path to a directory of wheels and source distributions
+        environment (:obj:`dict`, optional): environment to evaluate markers against; default: the current environment
+        tags (:obj:`set` of :obj:`packaging.tags.Tag`, optional): tags of the supported wheels;
+            default: the tags supported by the running interpreter
+        max_iterations (:obj:`int`, optional): maximum number of rounds of pinning
+
+    Returns:
+        :obj:`list` of :obj:`LockedRequirement`: pinned requirements, sorted by name
+
+    Raises:
+        :obj:`ValueError`: if no distribution in the wheelhouse satisfies a requirement, the pins don't converge or the
+            requirements of a pinned source distribution aren't declared statically
+    """
+    distributions = get_wheelhouse_distributions(wheelhouse, tags=tags)
+    requires_cache = {}
+
+    def get_requires(distribution):
+        if distribution.filename not in requires_cache:
+            requires_cache[distribution.filename] = distribution.get_requires()
+        return requires_cache[distribution.filename]
+
+    pins = _pin_requirements(requires, distributions, get_requires, environment=environment, max_iterations=max_iterations)
+
+    locked_requires = []
+    for name, pin in sorted(pins.items()):
+        hashes = [hash_file(distribution.filename)
+                  for distribution in distributions[name]
+                  if distribution.version == pin.version]
+        locked_requires.append(LockedRequirement(name, pin.version, sorted(hashes)))
+    return locked_requires
+
+
+def lock_dependencies(dirname, wheelhouse, lock_filename=None, options=None, environment=None, tags=None):
+    """ Pin the dependencies of a package, including the dependencies of its options, to distributions in a
+    wheelhouse and, optionally, save them to a lock file which can be installed with :obj:`pkg_utils.install_dependencies`
+
+    Args:
+        dirname (:obj:`str`): path to the package
+        wheelhouse (:obj:`str`): path to a directory of wheels and source distributions
+        lock_filename (:obj:`str`, optional): path to save the pinned dependencies, atomically and only if they changed
+        options (:obj:`list` of :obj:`str`, optional): options of the optional dependencies to pin; default: all options
+        environment (:obj:`dict`, optional): environment to evaluate markers against; default: the current environment
+        tags (:obj:`set` of :obj:`packaging.tags.Tag`, optional): tags of the supported wheels;
+            default: the tags supported by the running interpreter
+
+    Returns:
+        :obj:`list` of :obj:`LockedRequirement`: pinned requirements
+
+    Raises:
+        :obj:`ValueError`: if no distribution in the wheelhouse satisfies a requirement
+    """
+    install_requires, extras_require, _, _ = get_dependencies(dirname, evaluate_markers=True, environment=environment)
+
+    requires = list(install_requires)
+    if options is None:
+        options = sorted(extras_require.keys())
+    for option in options:
+        requires += extras_require[option]
+
+    locked_requires = lock_requirements(requires, wheelhouse, environment=environment, tags=tags)
+
+    if lock_filename:
+        write_file_if_changed(lock_filename, ''.join(
+            ['# This file was generated by pkg_utils from the distributions in {}\n'.format(wheelhouse)] +
+            [str(locked_require) + '\n' for locked_require in locked_requires]))
+
+    return locked_requires
+
+
+def read_lock_file(filename):
+    """ Read a lock file saved by :obj:`lock_dependencies`
+
+    Args:
+        filename (:obj:`str`): path to the lock file
+
+    Returns:
+        :obj:`list` of :obj:`LockedRequirement`: pinned requirements
+
+    Raises:
+        :obj:`ValueError`: if a requirement isn't pinned to a single version
+    """
+    with open(filename, 'r') as file:
+        content = file.read().replace('\\\n', ' ')
+
+    locked_requires = []
+    for line in content.split('\n'):
+        line = line.partition('#')[0].strip()
+        if not line:
+            continue
+        tokens = line.split()
+        name, sep, version = tokens[0].partition('==')
+        if not sep or not name or not version:
+            raise ValueError('Requirement is not pinned: {}'.format(line))
+        hashes = [token[len('--hash='):] for token in tokens[1:] if token.startswith('--hash=')]
+        locked_requires.append(LockedRequirement(packaging.utils.canonicalize_name(name),
+                                                 packaging.version.Version(version), hashes))
+    return locked_requires
+
+
+def get_dependency_closure(install_requires, wheelhouse, extras_require=None, options=None, environment=None, tags=None,
+                           cache_filename=None):
+    """ Get the transitive closure of the dependencies of a package from the distributions in a wheelhouse, without
+    installing them, and the total download and installed size of the closure
+
+    The requirements of the distributions are read from their ``METADATA`` or ``PKG-INFO`` files without extracting
+    them, and can be cached between runs in a file.
+
+    Args:
+        install_requires (:obj:`list` of :obj:`str`): requirements (e.g. from :obj:`pkg_utils.get_dependencies`)
+        wheelhouse (:obj:`str`): path to a directory of wheels and source distributions
+        extras_require (:obj:`dict` of :obj:`list` of :obj:`str`, optional): optional requirements of each option
+            (e.g. from :obj:`pkg_utils.get_dependencies`)
+        options (:obj:`list` of :obj:`str`, optional): options of the optional requirements to include; default: all options
+        environment (:obj:`dict`, optional): environment to evaluate markers against; default: the current environment
+        tags (:obj:`set` of :obj:`packaging.tags.Tag`, optional): tags of the supported wheels;
+            default: the tags supported by the running interpreter
+        cache_filename (:obj:`str`, optional): path to a file to cache the requirements and sizes of the distributions
+
+    Returns:
+        :obj:`DependencyClosure`: pinned distributions and their sizes
+
+    Raises:
+        :obj:`ValueError`: if no distribution in the wheelhouse satisfies a requirement, an option is undefined or the
+            requirements of a pinned source distribution aren't declared statically
+    """
+    extras_require = extras_require or {}
+    requires = list(install_requires)
+    if options is None:
+        options = sorted(extras_require.keys())
+    for option in options:
+        if option not in extras_require:
+            raise ValueError('Option {} is not defined'.format(option))
+        requires += extras_require[option]
+
+    cache = DistributionMetadataCache(cache_filename)
+    distributions = get_wheelhouse_distributions(wheelhouse, tags=tags)
+    pins = _pin_requirements(requires, distributions, lambda distribution: cache.get(distribution.filename)['requires'],
+                             environment=environment)
+
+    download_sizes = {}
+    install_sizes = {}
+    for name, pin in pins.items():
+        entry = cache.get(pin.filename)
+        download_sizes[name] = entry['size']
+        install_sizes[name] = entry['install_size']
+    cache.save()
+
+    return DependencyClosure([pin for _, pin in sorted(pins.items())], download_sizes, install_sizes)
+
+
+def _pin_requirements(requires, distributions, get_requires, environment=None, max_iterations=100):
+    """ Pin requirements and their dependencies to the newest distributions which satisfy them
+
+    Args:
+        requires (:obj:`list` of :obj:`str`): requirements
+        distributions (:obj:`dict` of :obj:`list` of :obj:`Distribution`): dictionary which maps the normalized name of
+            each project to its distributions, sorted from the newest to the oldest version
+        get_requires (:obj:`callable`): function which gets the requirements (``Requires-Dist``) of a distribution
+        environment (:obj:`dict`, optional): environment to evaluate markers against; default: the current environment
+        max_iterations (:obj:`int`, optional): maximum number of rounds of pinning
+
+    Returns:
+        :obj:`dict` of :obj:`Distribution`: dictionary which maps the normalized name of each project to its pin
+
+    Raises:
+        :obj:`ValueError`: if no distribution satisfies a requirement or the pins don't converge
+    """
+    requires = [packaging.requirements.Requirement(require) for require in requires]
+    parsed_requires_cache = {}
+
+    pins = {}
+    for _ in range(max_iterations):
+        # collect the constraints on each project from the direct requirements and the dependencies of the current pins
+        specifiers = {}
+        extras = {}
+        # each requirement is queued with the extras requested of the project which requires it
+        queue = [(require, frozenset()) for require in requires]
+        visited = set()
+        while queue:
+            require, requirer_extras = queue.pop(0)
+            name = packaging.utils.canonicalize_name(require.name)
+            if require.marker is not None and not _evaluate_marker(require.marker, environment, requirer_extras):
+                continue
+            specifiers[name] = specifiers.get(name, packaging.specifiers.SpecifierSet()) & require.specifier
+            extras.setdefault(name, set()).update(require.extras)
+
+            pin = pins.get(name)
+            if pin is None or (name, frozenset(extras[name])) in visited:
+                continue
+            visited.add((name, frozenset(extras[name])))
+            if pin.filename not in parsed_requires_cache:
+                parsed_requires_cache[pin.filename] = [packaging.requirements.Requirement(dep)
+                                                       for dep in get_requires(pin)]
+            queue.extend((dep, frozenset(extras[name])) for dep in parsed_requires_cache[pin.filename])
+
+        # pin each project to the newest version which satisfies its constraints, preferring final releases
+        new_pins = {}
+        for name, specifier in specifiers.items():
+            candidates = _filter_distributions(specifier, distributions.get(name, []))
+            if not candidates:
+                raise ValueError('No distribution in the wheelhouse satisfies {}{}'.format(name, specifier))
+            new_pins[name] = candidates[0]
+
+        if {name: pin.filename for name, pin in new_pins.items()} == {name: pin.filename for name, pin in pins.items()}:
+            return pins
+        pins = new_pins
+
+    raise ValueError('Pins did not converge after {} iterations'.format(max_iterations))
+
+
+def _filter_distributions(specifier, distributions):
+    """ Get the distributions whose versions satisfy a specifier, like :obj:`packaging.specifiers.SpecifierSet.filter`
+
+    Pre-releases are only included if the specifier explicitly allows them, or if no final release satisfies the
+    specifier.
+
+    Args:
+        specifier (:obj:`packaging.specifiers.SpecifierSet`): specifier
+        distributions (:obj:`list` of :obj:`Distribution`): distributions
+
+    Returns:
+        :obj:`list` of :obj:`Distribution`: distributions which satisfy the specifier, in their original order
+    """
+    matches = [distribution for distribution in distributions
+               if specifier.contains(distribution.version, prereleases=True)]
+    if specifier.prereleases:
+        return matches
+    final_matches = [distribution for distribution in matches if not distribution.version.is_prerelease]
+    return final_matches or matches
+
+
+def _evaluate_marker(marker, environment, extras):
+    """ Evaluate a marker for an environment and the requested extras of a project
+
+    Args:
+        marker (:obj:`packaging.markers.Marker`): marker
+        environment (:obj:`dict`): environment or :obj:`None` for the current environment
+        extras (:obj:`set` of :obj:`str`): requested extras
+
+    Returns:
+        :obj:`bool`: :obj:`True` if the marker applies for the environment and at least one of the extras
+    """
+    for extra in [''] + sorted(extras):
+        env = dict(environment or {})
+        env['extra'] = extra
+        if marker.evaluate(env):
+            return True
+    return False
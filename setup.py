@@ -14,12 +14,12 @@ except:
     subprocess.check_call(
         [sys.executable, "-m", "pip", "install", "glob2"])
 try:
-    import requirements
+    import packaging
 except:
     import subprocess
     import sys
     subprocess.check_call(
-        [sys.executable, "-m", "pip", "install", "requirements_parser"])
+        [sys.executable, "-m", "pip", "install", "packaging"])
 
 # import
 import os
@@ -55,6 +55,11 @@ setuptools.setup(
     extras_require=md.extras_require,
     tests_require=md.tests_require,
     dependency_links=md.dependency_links,
+    entry_points={
+        'console_scripts': [
+            'pkg-utils = pkg_utils.__main__:main',
+        ],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Science/Research',
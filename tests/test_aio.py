@@ -0,0 +1,119 @@
+""" Tests for the asynchronous utilities
+
+:License: MIT
+"""
+
+from pkg_utils import aio
+from unittest import mock
+import asyncio
+import os
+import pkg_utils
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+try:
+    import pypandoc
+    pypandoc.get_pandoc_path()
+except (ImportError, OSError):  # pragma: no cover
+    pypandoc = None  # pragma: no cover
+
+
+class AioTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+
+        os.mkdir(os.path.join(dirname, 'package'))
+        os.mkdir(os.path.join(dirname, 'tests'))
+
+        with open(os.path.join(dirname, 'package', '_version.py'), 'w') as file:
+            file.write("__version__ = '0.0.1'")
+
+        with open(os.path.join(dirname, 'package', 'data.txt'), 'w') as file:
+            pass
+
+        with open(os.path.join(dirname, 'README.md'), 'w') as file:
+            file.write('# Test\n')
+
+        with open(os.path.join(dirname, 'README.rst'), 'w') as file:
+            file.write('Test\n====\n')
+
+        with open(os.path.join(dirname, 'requirements.txt'), 'w') as file:
+            file.write('req1\n')
+            file.write('req2 >= 1.0\n')
+
+        with open(os.path.join(dirname, 'requirements.optional.txt'), 'w') as file:
+            file.write('[opt]\n')
+            file.write('req3\n')
+
+        with open(os.path.join(dirname, 'tests', 'requirements.txt'), 'w') as file:
+            file.write('req4\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_aget_package_metadata(self):
+        expected = pkg_utils.get_package_metadata(self.dirname, 'package', {'package': ['*.txt']})
+
+        md = asyncio.run(aio.aget_package_metadata(self.dirname, 'package', {'package': ['*.txt']}))
+        self.assertEqual(md.__dict__, expected.__dict__)
+        self.assertEqual(md.version, '0.0.1')
+        self.assertEqual(md.long_description, 'Test\n====\n')
+        self.assertEqual(md.package_data, {'package': ['data.txt']})
+        self.assertEqual(md.install_requires, ['req1', 'req2 >= 1.0'])
+
+        md = asyncio.run(aio.aget_package_metadata(self.dirname, 'package', max_concurrency=1))
+        self.assertEqual(md.extras_require, {
+            'opt': ['req3'],
+            'tests': ['req4'],
+            'docs': [],
+            'all': ['req3', 'req4'],
+        })
+
+    def test_aget_package_metadata_error(self):
+        with open(os.path.join(self.dirname, 'requirements.optional.txt'), 'w') as file:
+            file.write('[tests]\n')
+            file.write('req1\n')
+
+        with self.assertRaisesRegex(ValueError, '^Test dependencies should be defined'):
+            asyncio.run(aio.aget_package_metadata(self.dirname, 'package'))
+
+    @unittest.skipIf(pypandoc is None, 'Test requires pandoc')
+    def test_aconvert_readme_md_to_rst(self):
+        os.remove(os.path.join(self.dirname, 'README.rst'))
+        asyncio.run(aio.aconvert_readme_md_to_rst(self.dirname))
+        with open(os.path.join(self.dirname, 'README.rst'), 'r') as file:
+            self.assertEqual(file.read(), 'Test\n====\n')
+
+    def test_aconvert_readme_md_to_rst_no_md(self):
+        os.remove(os.path.join(self.dirname, 'README.md'))
+        asyncio.run(aio.aconvert_readme_md_to_rst(self.dirname, max_concurrency=1))
+        with open(os.path.join(self.dirname, 'README.rst'), 'r') as file:
+            self.assertEqual(file.read(), 'Test\n====\n')
+
+    def test_ainstall_dependencies(self):
+        async def install():
+            semaphore = asyncio.Semaphore(1)
+            await asyncio.gather(
+                aio.ainstall_dependencies(['setuptools'], semaphore=semaphore),
+                aio.ainstall_dependencies(['setuptools'], upgrade=True, semaphore=semaphore),
+            )
+        asyncio.run(install())
+
+        asyncio.run(aio.ainstall_dependencies(['setuptools'], max_concurrency=1))
+
+    def test_ainstall_dependencies_lock_file(self):
+        # the arguments to pip are the same as those of the synchronous version
+        kwargs = {'upgrade': True, 'lock_filename': 'requirements.lock', 'find_links': 'wheelhouse'}
+        with mock.patch('subprocess.check_call') as check_call:
+            pkg_utils.install_dependencies(['req1'], **kwargs)
+        with mock.patch.object(aio, '_call', mock.AsyncMock(return_value=0)) as call:
+            asyncio.run(aio.ainstall_dependencies(['req1'], **kwargs))
+        self.assertEqual(list(call.call_args[0]), check_call.call_args[0][0])
+        self.assertIn('--require-hashes', check_call.call_args[0][0])
+
+    def test_ainstall_dependencies_error(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            asyncio.run(aio.ainstall_dependencies(['--no-such-option']))
@@ -0,0 +1,138 @@
+""" Tests for reading the metadata of packages from archives
+
+:License: MIT
+"""
+
+from pkg_utils import archives
+import os
+import pkg_utils
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+
+class ArchivesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.package_dirname = os.path.join(self.dirname, 'src', 'pkg-0.0.1')
+        self.archive_dirname = os.path.join(self.dirname, 'dist')
+        os.makedirs(self.archive_dirname)
+
+        for path, content in [
+            ('README.rst', 'Test\n====\n\n.. image:: data:image/png;base64,AAAA\n'),
+            ('pkg/_version.py', "__version__ = '0.0.1'\n"),
+            ('pkg/__init__.py', ''),
+            ('pkg/data/file1.txt', 'a'),
+            ('pkg/data/sub/file2.txt', 'bc'),
+            ('pkg/data/sub/file3.pdf', 'def'),
+            ('pkg/data/.gitignore', '*.pdf\n'),
+            ('requirements.txt', 'req1\nreq2 >= 1.0\n'),
+            ('requirements.optional.txt', '[opt]\nreq3\n'),
+            ('tests/requirements.txt', 'req4\n'),
+            ('docs/requirements.txt', 'req5\n'),
+        ]:
+            filename = os.path.join(self.package_dirname, path)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'w') as file:
+                file.write(content)
+
+        self.tar_filename = os.path.join(self.archive_dirname, 'pkg-0.0.1.tar.gz')
+        with tarfile.open(self.tar_filename, 'w:gz') as archive:
+            archive.add(self.package_dirname, arcname='pkg-0.0.1')
+
+        self.zip_filename = os.path.join(self.archive_dirname, 'pkg-0.0.1.zip')
+        with zipfile.ZipFile(self.zip_filename, 'w') as archive:
+            for root, _, filenames in os.walk(self.package_dirname):
+                for filename in filenames:
+                    filename = os.path.join(root, filename)
+                    archive.write(filename, os.path.join('pkg-0.0.1', os.path.relpath(filename, self.package_dirname)))
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_ArchiveFileSystem(self):
+        for filename in [self.tar_filename, self.zip_filename]:
+            with archives.ArchiveFileSystem(filename) as filesystem:
+                self.assertEqual(filesystem.root, 'pkg-0.0.1')
+                self.assertTrue(filesystem.isfile('README.rst'))
+                self.assertTrue(filesystem.isfile('./pkg/_version.py'))
+                self.assertFalse(filesystem.isfile('pkg'))
+                self.assertTrue(filesystem.isdir(''))
+                self.assertTrue(filesystem.isdir('pkg/data/'))
+                self.assertFalse(filesystem.isdir('README.rst'))
+
+                entries = {entry.name: entry for entry in filesystem.scandir('pkg/data/sub')}
+                self.assertEqual(sorted(entries.keys()), ['file2.txt', 'file3.pdf'])
+                self.assertTrue(entries['file2.txt'].is_file())
+                self.assertEqual(entries['file2.txt'].stat().st_size, 2)
+                self.assertTrue(any(entry.is_dir() for entry in filesystem.scandir('pkg/data')))
+
+                with filesystem.open('pkg/_version.py') as file:
+                    self.assertEqual(file.read(), "__version__ = '0.0.1'\n")
+                with filesystem.open('pkg/data/sub/file3.pdf', 'rb') as file:
+                    self.assertEqual(file.read(), b'def')
+
+                with self.assertRaises(FileNotFoundError):
+                    filesystem.open('missing.txt')
+                with self.assertRaises(FileNotFoundError):
+                    filesystem.scandir('missing')
+                with self.assertRaisesRegex(ValueError, 'not supported'):
+                    filesystem.open('README.rst', 'w')
+
+            with archives.ArchiveFileSystem(filename, root='') as filesystem:
+                self.assertTrue(filesystem.isfile('pkg-0.0.1/README.rst'))
+
+        filename = os.path.join(self.dirname, 'file.txt')
+        with open(filename, 'w') as file:
+            file.write('not an archive')
+        with self.assertRaisesRegex(ValueError, 'not a tar or zip archive'):
+            archives.ArchiveFileSystem(filename)
+
+    def test_get_archive_metadata(self):
+        package_data_filename_patterns = {'pkg': ['data/**/*']}
+        expected = pkg_utils.get_package_metadata(self.package_dirname, 'pkg',
+                                                  package_data_filename_patterns=package_data_filename_patterns)
+        for filename in [self.tar_filename, self.zip_filename]:
+            md = archives.get_archive_metadata(filename, package_data_filename_patterns=package_data_filename_patterns)
+            for attr in ['long_description', 'version', 'package_data', 'install_requires', 'extras_require',
+                         'tests_require', 'dependency_links']:
+                self.assertEqual(getattr(md, attr), getattr(expected, attr))
+            self.assertEqual(md.version, '0.0.1')
+            self.assertEqual(md.install_requires, ['req1', 'req2 >= 1.0'])
+            self.assertEqual(md.package_data, {
+                'pkg': ['data/.gitignore', 'data/file1.txt', 'data/sub/file2.txt', 'data/sub/file3.pdf']})
+
+        md = archives.get_archive_metadata(self.tar_filename, package_name='other')
+        self.assertEqual(md.version, None)
+
+        with archives.ArchiveFileSystem(self.zip_filename) as filesystem:
+            stats = pkg_utils.core.LongDescriptionStats()
+            self.assertEqual(pkg_utils.get_long_description('', strip_data_uris=True, stats=stats, filesystem=filesystem),
+                             'Test\n====\n\n.. image:: data:,\n')
+            self.assertEqual(stats.n_stripped, 1)
+
+            self.assertEqual(pkg_utils.expand_package_data_filename_patterns(
+                '', package_data_filename_patterns={'pkg': ['data/**/*']}, ignore_filename='.gitignore',
+                filesystem=filesystem), {'pkg': ['data/.gitignore', 'data/file1.txt', 'data/sub/file2.txt']})
+
+    def test_get_archives_metadata(self):
+        with open(os.path.join(self.archive_dirname, 'broken.tar.gz'), 'w') as file:
+            file.write('not an archive')
+        with open(os.path.join(self.archive_dirname, 'notes.txt'), 'w') as file:
+            file.write('not an archive')
+
+        errors = {}
+        metadata = archives.get_archives_metadata(self.archive_dirname, max_workers=2, errors=errors)
+        self.assertEqual(sorted(metadata.keys()), [self.tar_filename, self.zip_filename])
+        for md in metadata.values():
+            self.assertEqual(md.version, '0.0.1')
+            self.assertEqual(md.tests_require, ['req4'])
+        self.assertEqual(list(errors.keys()), [os.path.join(self.archive_dirname, 'broken.tar.gz')])
+        self.assertIsInstance(errors[os.path.join(self.archive_dirname, 'broken.tar.gz')], ValueError)
+
+        with self.assertRaisesRegex(ValueError, 'not a tar or zip archive'):
+            archives.get_archives_metadata(self.archive_dirname)
@@ -0,0 +1,96 @@
+""" Tests for the requirement conflict detection
+
+:License: MIT
+"""
+
+from pkg_utils import conflicts
+import os
+import packaging.specifiers
+import shutil
+import tempfile
+import unittest
+
+
+class ConflictsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        os.mkdir(os.path.join(dirname, 'tests'))
+
+        with open(os.path.join(dirname, 'requirements.txt'), 'w') as file:
+            file.write('numpy < 1.20\n')
+            file.write('Scipy_Lib >= 1.0\n')
+            file.write('req1; python_version < "3"\n')
+
+        with open(os.path.join(dirname, 'requirements.optional.txt'), 'w') as file:
+            file.write('[opt1]\n')
+            file.write('numpy >= 1.21\n')
+            file.write('[opt2]\n')
+            file.write('SCIPY_lib < 2.0\n')
+            file.write('req1 >= 2.0\n')
+            file.write('[opt3]\n')
+            file.write('scipy.lib < 1.0; python_version >= "3"\n')
+
+        with open(os.path.join(dirname, 'tests', 'requirements.txt'), 'w') as file:
+            file.write('req1 < 1.0; python_version < "3"\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_get_dependency_conflicts(self):
+        py3 = {'python_version': '3.8', 'python_full_version': '3.8.0'}
+        self.assertEqual(conflicts.get_dependency_conflicts(self.dirname, environment=py3), [
+            conflicts.RequirementConflict('numpy', 'all', ['numpy<1.20', 'numpy>=1.21']),
+            conflicts.RequirementConflict('scipy-lib', 'all', ['SCIPY_lib<2.0', 'Scipy_Lib>=1.0', 'scipy.lib<1.0; python_version >= "3"']),
+            conflicts.RequirementConflict('numpy', 'opt1', ['numpy<1.20', 'numpy>=1.21']),
+            conflicts.RequirementConflict('scipy-lib', 'opt3', ['Scipy_Lib>=1.0', 'scipy.lib<1.0; python_version >= "3"']),
+        ])
+
+        py2 = {'python_version': '2.7', 'python_full_version': '2.7.0'}
+        result = conflicts.get_dependency_conflicts(self.dirname, environment=py2)
+        self.assertEqual([(conflict.name, conflict.option) for conflict in result], [
+            ('numpy', 'all'),
+            ('req1', 'all'),
+            ('numpy', 'opt1'),
+        ])
+        self.assertEqual(str(result[1]), 'req1 (all): req1; python_version < "3" vs req1<1.0; python_version < "3" vs req1>=2.0')
+
+    def test_find_requirement_conflicts(self):
+        self.assertEqual(conflicts.find_requirement_conflicts(['req1 > 1.0', 'req1 <= 1.0']), [
+            conflicts.RequirementConflict('req1', 'install_requires', ['req1<=1.0', 'req1>1.0']),
+        ])
+        self.assertEqual(conflicts.find_requirement_conflicts(['req1 > 1.0', 'req2 <= 1.0'], {'opt': ['req2']}), [])
+
+        with self.assertRaisesRegex(ValueError, 'Dependency could not be parsed'):
+            conflicts.find_requirement_conflicts(['req1 >> 1.0'])
+
+    def test_is_satisfiable(self):
+        def satisfiable(spec):
+            return conflicts.is_satisfiable(packaging.specifiers.SpecifierSet(spec))
+
+        self.assertTrue(satisfiable(''))
+        self.assertTrue(satisfiable('>=1.0,<1.0.1'))
+        self.assertTrue(satisfiable('>1.0,<1.0.1'))
+        self.assertTrue(satisfiable('<1.0'))
+        self.assertTrue(satisfiable('>1.0'))
+        self.assertTrue(satisfiable('==1.*,!=1.0'))
+        self.assertTrue(satisfiable('~=1.4.5,!=1.4.5'))
+        self.assertTrue(satisfiable('>2.0rc1,<2.0rc2'))
+        self.assertTrue(satisfiable('===1.0-custom'))
+        self.assertTrue(satisfiable('===1.0-Custom,===1.0-custom'))
+        self.assertTrue(satisfiable('===1.0,>=1.0'))
+        self.assertTrue(satisfiable('>=1!1.0,<1!2.0'))
+
+        self.assertFalse(satisfiable('<1.20,>=1.21'))
+        self.assertFalse(satisfiable('<0.0'))
+        self.assertFalse(satisfiable('>1.0,<1.0'))
+        self.assertFalse(satisfiable('>=1.0,<1.0'))
+        self.assertFalse(satisfiable('==1.0,!=1.0'))
+        self.assertFalse(satisfiable('==1.*,>=2.0'))
+        self.assertFalse(satisfiable('~=1.4.5,>=1.5'))
+        self.assertFalse(satisfiable('~=1.4,<1.4'))
+        self.assertFalse(satisfiable('==1.0,==2.0'))
+        self.assertFalse(satisfiable('!=1.*,>=1.0,<2.0'))
+        self.assertFalse(satisfiable('>=1!1.0,<1.0'))
+        self.assertFalse(satisfiable('===1.0-custom,>=1.0'))
+        self.assertFalse(satisfiable('===1.0-custom,===1.0-other'))
@@ -6,11 +6,21 @@
 :License: MIT
 """
 
+import concurrent.futures
 import os
 import pkg_utils
+import re
 import shutil
+import subprocess
+import sys
 import tempfile
 import unittest
+from unittest import mock
+
+try:
+    import pkg_resources
+except ImportError:  # pragma: no cover
+    pkg_resources = None  # pragma: no cover
 
 
 class TestCase(unittest.TestCase):
@@ -134,6 +144,64 @@ class TestCase(unittest.TestCase):
             'git+https://github.com/opt/req18.git@branch#egg=req18-18.1.2',
         ])
 
+    def test_get_dependencies_evaluate_markers(self):
+        install_requires, extras_require, tests_require, dependency_links = pkg_utils.get_dependencies(
+            self.dirname, evaluate_markers=True, environment={'python_version': '2.6'})
+        self.assertEqual(install_requires, [
+            'req1',
+            'req2[opt2]',
+            'req3 >= 1.0',
+        ])
+        self.assertEqual(extras_require['docs'], [
+            'req10',
+            'req11',
+            'req16',
+            'req17',
+            'req18',
+        ])
+        self.assertEqual(dependency_links, [
+            'git+https://github.com/opt/req10.git@branch#egg=req10-10.1.2',
+            'git+https://github.com/opt/req16.git#egg=req16-16.1.2',
+            'git+https://github.com/opt/req17.git#egg=req17-17.1.2',
+            'git+https://github.com/opt/req18.git@branch#egg=req18-18.1.2',
+        ])
+
+        # markers of applicable dependencies are retained
+        install_requires, extras_require, _, dependency_links = pkg_utils.get_dependencies(
+            self.dirname, evaluate_markers=True)
+        self.assertEqual(install_requires, [
+            'req1',
+            'req2[opt2]',
+            'req3 >= 1.0',
+            'req4; python_version > "2.6"',
+        ])
+        self.assertIn('req15; python_version >= "2.7"', extras_require['docs'])
+        self.assertEqual(len(dependency_links), 6)
+
+        install_requires, _, _, _ = pkg_utils.get_dependencies(
+            self.dirname, include_markers=False, evaluate_markers=True, environment={'python_version': '2.7'})
+        self.assertEqual(install_requires, [
+            'req1',
+            'req2[opt2]',
+            'req3 >= 1.0',
+            'req4',
+        ])
+
+    def test_parse_requirement_lines_markers_with_comments(self):
+        lines = [
+            'req1; python_version >= "2.7"  # comment\n',
+            'req2 >= 1.0; python_version < "2.7" # comment\n',
+            'git+https://github.com/opt/req3.git#egg=req3-3.0.0 ; python_version >= "2.7" # comment\n',
+        ]
+        reqs, links = pkg_utils.parse_requirement_lines(lines)
+        self.assertEqual(reqs, ['req1; python_version >= "2.7"', 'req2 >= 1.0; python_version < "2.7"',
+                                'req3; python_version >= "2.7"'])
+        self.assertEqual(links, ['git+https://github.com/opt/req3.git#egg=req3-3.0.0'])
+
+        reqs, links = pkg_utils.parse_requirement_lines(lines, evaluate_markers=True,
+                                                        environment={'python_version': '3.11'})
+        self.assertEqual(reqs, ['req1; python_version >= "2.7"', 'req3; python_version >= "2.7"'])
+
     def test_get_package_metadata_tests_require_error(self):
         with open(os.path.join(self.dirname, 'requirements.optional.txt'), 'w') as file:
             file.write('[tests]\n')
@@ -153,6 +221,52 @@ class TestCase(unittest.TestCase):
     def test_PackageMetadata(self):
         pkg_utils.core.PackageMetadata()
 
+    def test_LazyPackageMetadata(self):
+        with open(os.path.join(self.dirname, 'README.rst'), 'w') as file:
+            file.write('Test\n====\n')
+        with open(os.path.join(self.dirname, 'package', 'data.txt'), 'w') as file:
+            pass
+        package_data_filename_patterns = {'package': ['*.txt']}
+        expected_md = pkg_utils.get_package_metadata(self.dirname, 'package',
+                                                     package_data_filename_patterns=package_data_filename_patterns)
+
+        # only the files of the accessed attributes are read
+        with mock.patch('pkg_utils.core.expand_package_data_filename_patterns',
+                        wraps=pkg_utils.core.expand_package_data_filename_patterns) as expand:
+            with mock.patch('pkg_utils.core.get_dependencies', wraps=pkg_utils.core.get_dependencies) as get_dependencies:
+                md = pkg_utils.get_package_metadata(self.dirname, 'package', lazy=True,
+                                                    package_data_filename_patterns=package_data_filename_patterns)
+                self.assertIsInstance(md, pkg_utils.PackageMetadata)
+                self.assertEqual(md.version, '0.0.1')
+                self.assertEqual(md.name, '')
+                self.assertEqual(expand.call_count, 0)
+                self.assertEqual(get_dependencies.call_count, 0)
+                self.assertEqual(sorted(md.__dict__.keys()), ['description', 'name', 'version'])
+
+                self.assertEqual(md.install_requires, expected_md.install_requires)
+                self.assertEqual(md.extras_require, expected_md.extras_require)
+                self.assertEqual(md.tests_require, expected_md.tests_require)
+                self.assertEqual(md.dependency_links, expected_md.dependency_links)
+                self.assertEqual(get_dependencies.call_count, 1)
+                self.assertEqual(expand.call_count, 0)
+
+                self.assertEqual(md.load().__dict__, expected_md.__dict__)
+                md.package_data
+                self.assertEqual(expand.call_count, 1)
+                self.assertEqual(get_dependencies.call_count, 1)
+
+        # attributes can be overridden before they are read
+        md = pkg_utils.core.LazyPackageMetadata(self.dirname, 'package', max_long_description_size=4)
+        md.version = '1.0.0'
+        md.tests_require = []
+        self.assertEqual(md.version, '1.0.0')
+        self.assertEqual(md.tests_require, [])
+        self.assertEqual(md.install_requires, expected_md.install_requires)
+        self.assertEqual(md.long_description, 'Test')
+
+        with self.assertRaises(AttributeError):
+            md.undefined
+
     def test_convert_readme_md_to_rst(self):
         pkg_utils.convert_readme_md_to_rst(self.dirname)
 
@@ -166,6 +280,80 @@ class TestCase(unittest.TestCase):
     def test_get_long_description_no_rst(self):
         self.assertEqual(pkg_utils.get_long_description(self.dirname), '')
 
+    def test_get_long_description_shrink(self):
+        image = 'data:image/png;base64,' + 'iVBORw0KGgo=' * 1000
+        content = ('Test\n====\n\n.. image:: {}\n\nText with a unicode character: \u03b1\n'
+                   'Another line\n').format(image)
+        with open(os.path.join(self.dirname, 'README.rst'), 'w', encoding='utf-8') as file:
+            file.write(content)
+        size = len(content.encode('utf-8'))
+
+        for use_mmap in [False, True]:
+            stats = pkg_utils.LongDescriptionStats()
+            self.assertEqual(pkg_utils.get_long_description(self.dirname, use_mmap=use_mmap, stats=stats), content)
+            self.assertEqual(stats.size, size)
+            self.assertEqual(stats.long_description_size, size)
+            self.assertEqual(stats.n_stripped, 0)
+            self.assertFalse(stats.truncated)
+
+            stats = pkg_utils.LongDescriptionStats()
+            long_description = pkg_utils.get_long_description(self.dirname, strip_data_uris=True, use_mmap=use_mmap,
+                                                              stats=stats)
+            self.assertEqual(long_description, content.replace(image, 'data:,'))
+            self.assertEqual(stats.size, size)
+            self.assertEqual(stats.long_description_size, len(long_description.encode('utf-8')))
+            self.assertEqual(stats.n_stripped, 1)
+            self.assertFalse(stats.truncated)
+
+            # truncated after the last complete line
+            stats = pkg_utils.LongDescriptionStats()
+            long_description = pkg_utils.get_long_description(self.dirname, max_size=70, strip_data_uris=True,
+                                                              use_mmap=use_mmap, stats=stats)
+            self.assertEqual(long_description, 'Test\n====\n\n.. image:: data:,\n\nText with a unicode character: \u03b1\n')
+            self.assertTrue(stats.truncated)
+            self.assertLessEqual(stats.long_description_size, 70)
+
+            self.assertEqual(pkg_utils.get_long_description(self.dirname, max_size=3, use_mmap=use_mmap), 'Tes')
+
+        md = pkg_utils.get_package_metadata(self.dirname, 'package', max_long_description_size=1000)
+        self.assertEqual(md.long_description, content.replace(image, 'data:,'))
+
+        # empty README
+        with open(os.path.join(self.dirname, 'README.rst'), 'w') as file:
+            pass
+        stats = pkg_utils.LongDescriptionStats()
+        self.assertEqual(pkg_utils.get_long_description(self.dirname, use_mmap=True, stats=stats), '')
+        self.assertEqual(stats.size, 0)
+
+    def test_shrink_long_description(self):
+        class SlicedBytes(bytes):
+            """ Bytes which record the sizes of their slices """
+
+            def __init__(self, value):
+                self.slice_sizes = []
+
+            def __getitem__(self, key):
+                value = super().__getitem__(key)
+                if isinstance(key, slice):
+                    self.slice_sizes.append(len(value))
+                return value
+
+        image = b'data:image/png;base64,' + b'iVBORw0KGgo=' * 1000
+        content = b'Line 1\n' + (b'.. image:: ' + image + b'\n' + b'Text\n' * 20) * 100
+
+        # equivalent to replacing all of the data URIs and then truncating the long description
+        stripped = pkg_utils.core.PATTERNS['data_uri'].sub(b'data:,', content)
+        for max_size in [None, 0, 1, 7, 20, 100, 1000, len(stripped) - 1, len(stripped), len(stripped) + 1]:
+            expected, _, truncated = pkg_utils.core._shrink_long_description(stripped, max_size=max_size)
+            self.assertEqual(pkg_utils.core._shrink_long_description(content, max_size=max_size, strip_data_uris=True),
+                             (expected, 100, truncated), max_size)
+
+        # only the slices which fit within the maximum size are copied
+        content = SlicedBytes(content)
+        pkg_utils.core._shrink_long_description(content, max_size=1000, strip_data_uris=True)
+        self.assertGreater(len(content.slice_sizes), 0)
+        self.assertLessEqual(sum(content.slice_sizes), 2 * 1001)
+
     def test_get_version(self):
         self.assertEqual(pkg_utils.get_version(self.dirname, 'package'), '0.0.1')
 
@@ -378,6 +566,272 @@ class TestCase(unittest.TestCase):
             ]),
         })
 
+    def test_expand_package_data_filename_patterns_max_workers(self):
+        def touch(*path):
+            filename = os.path.join(self.dirname, *path)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'w') as file:
+                pass
+
+        touch('pkg1', 'file-1.txt')
+        touch('pkg1', '.hidden')
+        touch('pkg1', 'file[1].csv')
+        touch('pkg1', 'dir1a', 'file1.txt')
+        touch('pkg1', 'dir1a', 'file2.pdf')
+        touch('pkg1', 'dir1b', 'dir1c', 'file3.txt')
+        touch('pkg1', 'dir1b', 'dir1d', 'dir1e', 'file4.txt')
+        touch('pkg1', 'dir1b', 'dir1d', 'dir1e', 'file5.pdf')
+        touch('pkg1', '.dir1f', 'file6.txt')
+        touch('pkg2', 'dir2a', 'dir2b', 'dir2c', 'dir2b', 'file7.txt')
+        os.mkdir(os.path.join(self.dirname, 'pkg3'))
+
+        filename_patterns = [
+            [],
+            ['*'],
+            ['**'],
+            ['**/*'],
+            ['*', '**/*'],
+            ['*.txt', '**/*.txt'],
+            ['**/*.pdf'],
+            ['dir1b/**/*'],
+            ['dir1b/**'],
+            ['dir1b/**/dir1e/*'],
+            ['**/dir2b/*'],
+            ['**/dir2b/**/*.txt'],
+            ['dir1?/*'],
+            ['dir1[ab]/*.txt'],
+            ['dir1[!a]/**/*.txt'],
+            ['file[[]1].csv'],
+            ['.*'],
+            ['.*/*'],
+            ['*/*/*'],
+            ['dir1a/file1.txt', 'dir1a/missing.txt'],
+            ['./*.txt', './dir1a/./*.txt'],
+            ['dir1b/../*.txt', 'dir1b/dir1c/../dir1d/**/*.txt'],
+        ]
+        for patterns in filename_patterns:
+            package_data_filename_patterns = {
+                'pkg1': patterns,
+                'pkg2': patterns,
+                'pkg3': patterns,
+                'pkg4': patterns,
+            }
+            expected = pkg_utils.expand_package_data_filename_patterns(
+                self.dirname, package_data_filename_patterns=package_data_filename_patterns)
+            for max_workers in [1, 4]:
+                self.assertEqual(pkg_utils.expand_package_data_filename_patterns(
+                    self.dirname, package_data_filename_patterns=package_data_filename_patterns,
+                    max_workers=max_workers), expected, (patterns, max_workers))
+
+        # the ``.`` and ``..`` components of patterns are normalized
+        self.assertEqual(pkg_utils.expand_package_data_filename_patterns(
+            self.dirname, {'pkg1': ['./*.txt', 'dir1b/dir1c/../dir1d/**/*.txt']}, max_workers=4), {
+            'pkg1': sorted(['file-1.txt', os.path.join('dir1b', 'dir1d', 'dir1e', 'file4.txt')]),
+        })
+
+        md = pkg_utils.get_package_metadata(self.dirname, 'package', package_data_filename_patterns={'pkg1': ['**/*.txt']},
+                                            max_workers=4)
+        self.assertEqual(md.package_data, {
+            'pkg1': sorted([
+                os.path.join('file-1.txt'),
+                os.path.join('dir1a', 'file1.txt'),
+                os.path.join('dir1b', 'dir1c', 'file3.txt'),
+                os.path.join('dir1b', 'dir1d', 'dir1e', 'file4.txt'),
+                os.path.join('.dir1f', 'file6.txt'),
+            ]),
+        })
+
+    def test_expand_package_data_filename_patterns_symlink_loops(self):
+        os.makedirs(os.path.join(self.dirname, 'm', 'd'))
+        os.makedirs(os.path.join(self.dirname, 'm', 'x'))
+        os.makedirs(os.path.join(self.dirname, 'm', 'y'))
+        for path in [('m', 'd', 'f.txt'), ('m', 'x', 'g.txt')]:
+            with open(os.path.join(self.dirname, *path), 'w'):
+                pass
+        os.symlink('..', os.path.join(self.dirname, 'm', 'd', 'up'))
+        os.symlink(os.path.join('..', 'y'), os.path.join(self.dirname, 'm', 'x', 'to_y'))
+        os.symlink(os.path.join('..', 'x'), os.path.join(self.dirname, 'm', 'y', 'to_x'))
+
+        # links to the directories which contain them or their ancestors aren't followed
+        for patterns in [['d/**/*.txt'], ['**/*.txt']]:
+            expected = pkg_utils.expand_package_data_filename_patterns(self.dirname, {'m': patterns})
+            for max_workers in [1, 2]:
+                self.assertEqual(pkg_utils.expand_package_data_filename_patterns(
+                    self.dirname, {'m': patterns}, max_workers=max_workers), expected, (patterns, max_workers))
+        self.assertEqual(expected, {'m': sorted([
+            os.path.join('d', 'f.txt'),
+            os.path.join('x', 'g.txt'),
+            os.path.join('y', 'to_x', 'g.txt'),
+        ])})
+        self.assertEqual(pkg_utils.core.walk_package_data(os.path.join(self.dirname, 'm'), ['**/*.txt'], max_workers=2),
+                         expected['m'])
+
+    def test_expand_package_data_filename_patterns_exclude_and_budgets(self):
+        def write(size, *path):
+            filename = os.path.join(self.dirname, *path)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'wb') as file:
+                file.write(b'0' * size)
+
+        write(10, 'pkg1', 'file1.txt')
+        write(300, 'pkg1', 'dir1a', 'file2.txt')
+        write(20, 'pkg1', 'dir1a', 'file3.tmp')
+        write(40, 'pkg1', 'dir1b', 'file4.txt')
+        write(50, 'pkg1', 'dir1b', 'dir1c', 'file5.txt')
+        write(5, 'pkg2', 'file6.txt')
+
+        package_data_filename_patterns = {'pkg1': ['**/*'], 'pkg2': ['*.txt']}
+
+        # exclusions
+        for max_workers in [None, 4]:
+            package_data = pkg_utils.expand_package_data_filename_patterns(
+                self.dirname, package_data_filename_patterns, max_workers=max_workers,
+                exclude_filename_patterns={'pkg1': ['**/*.tmp', 'dir1b/**']})
+            self.assertEqual(package_data, {
+                'pkg1': sorted([
+                    'file1.txt',
+                    os.path.join('dir1a', 'file2.txt'),
+                ]),
+                'pkg2': ['file6.txt'],
+            })
+
+        # excluded directories aren't descended into
+        scanned = []
+        scandir = os.scandir
+
+        def mock_scandir(path):
+            scanned.append(os.path.relpath(path, self.dirname))
+            return scandir(path)
+
+        with mock.patch('os.scandir', side_effect=mock_scandir):
+            pkg_utils.expand_package_data_filename_patterns(
+                self.dirname, {'pkg1': ['**/*']}, exclude_filename_patterns={'pkg1': ['dir1b']})
+        self.assertEqual(sorted(scanned), sorted(['pkg1', os.path.join('pkg1', 'dir1a')]))
+
+        # sizes
+        stats = pkg_utils.PackageDataStats(n_largest_files=2)
+        pkg_utils.expand_package_data_filename_patterns(self.dirname, package_data_filename_patterns, stats=stats)
+        self.assertEqual(stats.sizes, {'pkg1': 420, 'pkg2': 5})
+        self.assertEqual(stats.counts, {'pkg1': 5, 'pkg2': 1})
+        self.assertEqual(stats.total_size, 425)
+        self.assertEqual(stats.total_count, 6)
+        self.assertEqual(stats.largest_files, [
+            (300, 'pkg1', os.path.join('dir1a', 'file2.txt')),
+            (50, 'pkg1', os.path.join('dir1b', 'dir1c', 'file5.txt')),
+        ])
+
+        # budgets
+        pkg_utils.expand_package_data_filename_patterns(self.dirname, package_data_filename_patterns,
+                                                        max_size=425, max_files=6)
+        for max_workers in [None, 4]:
+            with self.assertRaisesRegex(ValueError, 'maximum size of 400 bytes'):
+                pkg_utils.expand_package_data_filename_patterns(self.dirname, package_data_filename_patterns,
+                                                                max_size=400, max_workers=max_workers)
+            with self.assertRaisesRegex(ValueError, 'maximum number of 5 files'):
+                pkg_utils.expand_package_data_filename_patterns(self.dirname, package_data_filename_patterns,
+                                                                max_files=5, max_workers=max_workers)
+
+        # the walk stops as soon as a budget is exceeded
+        scanned = []
+        with mock.patch('os.scandir', side_effect=mock_scandir):
+            with self.assertRaises(ValueError):
+                pkg_utils.expand_package_data_filename_patterns(self.dirname, {'pkg1': ['**/*']}, max_files=0)
+        self.assertEqual(scanned, ['pkg1'])
+
+    def test_expand_package_data_filename_patterns_ignore_files(self):
+        def write(content, *path):
+            filename = os.path.join(self.dirname, *path)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'w') as file:
+                file.write(content)
+
+        write('# comment\n\n*.log\n!keep.log\nbuild/\n/top.json\ncache\n', 'pkg', '.gitignore')
+        write('', 'pkg', 'top.json')
+        write('', 'pkg', 'a.log')
+        write('', 'pkg', 'keep.log')
+        write('', 'pkg', 'a.json')
+        write('', 'pkg', 'build', 'b.json')
+        write('', 'pkg', 'cache')
+        write('', 'pkg', 'sub', 'top.json')
+        write('', 'pkg', 'sub', 'c.log')
+        write('', 'pkg', 'sub', 'cache', 'd.json')
+        write('*.json\n!e.json\n', 'pkg', 'sub2', '.gitignore')
+        write('', 'pkg', 'sub2', 'e.json')
+        write('', 'pkg', 'sub2', 'f.json')
+        write('', 'pkg', 'sub2', 'build')
+        write('', 'pkg', 'sub2', 'nested', 'g.json')
+
+        for max_workers in [None, 4]:
+            package_data = pkg_utils.expand_package_data_filename_patterns(
+                self.dirname, {'pkg': ['**/*']}, ignore_filename='.gitignore', max_workers=max_workers)
+            self.assertEqual(package_data, {
+                'pkg': sorted([
+                    '.gitignore',
+                    'a.json',
+                    'keep.log',
+                    os.path.join('sub', 'top.json'),
+                    os.path.join('sub2', '.gitignore'),
+                    os.path.join('sub2', 'build'),
+                    os.path.join('sub2', 'e.json'),
+                ]),
+            })
+
+        # without ignore files
+        package_data = pkg_utils.expand_package_data_filename_patterns(self.dirname, {'pkg': ['**/*.json']},
+                                                                       ignore_filename='.missing')
+        self.assertEqual(len(package_data['pkg']), 8)
+
+    def test_expand_package_data_filename_patterns_excluded_directories(self):
+        def write(*path):
+            filename = os.path.join(self.dirname, *path)
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with open(filename, 'w') as file:
+                pass
+
+        write('pkg', 'data', 'a.json')
+        write('pkg', 'data', 'b', 'c.json')
+        n_ignored_dirs = 100
+        for i_dir in range(n_ignored_dirs):
+            write('pkg', 'node_modules', 'module_{}'.format(i_dir), 'package.json')
+            write('pkg', 'data', '.git', 'objects', str(i_dir), 'info.json')
+        write('pkg', '__pycache__', 'd.json')
+        write('pkg', 'data', '.tox', 'py3', 'e.json')
+
+        exclude_filename_patterns = {'pkg': pkg_utils.core.EXCLUDED_DIRECTORY_PATTERNS}
+        expected = {
+            'pkg': sorted([
+                os.path.join('data', 'a.json'),
+                os.path.join('data', 'b', 'c.json'),
+            ]),
+        }
+        for max_workers in [None, 4]:
+            self.assertEqual(pkg_utils.expand_package_data_filename_patterns(
+                self.dirname, {'pkg': ['**/*.json']}, exclude_filename_patterns=exclude_filename_patterns,
+                max_workers=max_workers), expected)
+
+        # count the directories which are scanned with and without pruning the ignored directories
+        scandir = os.scandir
+        n_scanned = {}
+        for pruned in [False, True]:
+            scanned = []
+
+            def mock_scandir(path):
+                scanned.append(path)
+                return scandir(path)
+
+            with mock.patch('os.scandir', side_effect=mock_scandir):
+                pkg_utils.expand_package_data_filename_patterns(
+                    self.dirname, {'pkg': ['**/*.json']},
+                    exclude_filename_patterns=exclude_filename_patterns if pruned else {'pkg': []})
+            n_scanned[pruned] = len(scanned)
+
+        self.assertEqual(n_scanned[True], 3)
+        self.assertGreater(n_scanned[False], 2 * n_ignored_dirs)
+
     def test_parse_requirements_file(self):
         reqs, links = pkg_utils.parse_requirements_file(os.path.join(self.dirname, 'requirements.txt'))
         self.assertEqual(reqs, [
@@ -456,6 +910,124 @@ class TestCase(unittest.TestCase):
         with self.assertRaisesRegex(ValueError, '^Required dependencies should not be '):
             pkg_utils.parse_optional_requirements_file(filename)
 
+    def test_parse_requirement_lines_diagnostics(self):
+        lines = [
+            'req1 >= 1.0\n',
+            '  req2 >=\n',
+            '# comment\n',
+            'git+https://github.com/opt/req3.git#egg=req3\n',
+            'req_4; python_version >>> "3"\n',
+            'req5\n',
+        ]
+        with self.assertRaises(pkg_utils.RequirementParseError) as context:
+            pkg_utils.parse_requirement_lines(lines)
+        self.assertEqual(context.exception.code, 'invalid-syntax')
+        self.assertEqual(context.exception.column, 6)
+
+        diagnostics = []
+        reqs, links = pkg_utils.parse_requirement_lines(lines, diagnostics=diagnostics, filename='requirements.txt')
+        self.assertEqual(reqs, ['req1 >= 1.0', 'req5'])
+        self.assertEqual(links, [])
+        self.assertEqual([(diagnostic.filename, diagnostic.line_number, diagnostic.column, diagnostic.code)
+                          for diagnostic in diagnostics], [
+            ('requirements.txt', 2, 8, 'invalid-syntax'),
+            ('requirements.txt', 4, 37, 'missing-version-hint'),
+            ('requirements.txt', 5, 24, 'invalid-syntax'),
+        ])
+        self.assertEqual(diagnostics[0].line, '  req2 >=')
+        self.assertEqual(str(diagnostics[1]), 'requirements.txt:4:37: missing-version-hint: '
+                         'Version hints must be provided for packages from non-PyPI sources')
+
+    def test_get_dependencies_diagnostics(self):
+        dirname = os.path.join(self.dirname, 'diagnostics')
+        os.makedirs(os.path.join(dirname, 'tests'))
+        with open(os.path.join(dirname, 'requirements.txt'), 'w') as file:
+            file.write('req1\n')
+            file.write('req_2 >=\n')
+        with open(os.path.join(dirname, 'requirements.optional.txt'), 'w') as file:
+            file.write('req3\n')
+            file.write('[opt1]\n')
+            file.write('req4\n')
+            file.write('req-5\n')
+            file.write('[opt 2]\n')
+            file.write('[tests]\n')
+            file.write('req6\n')
+        with open(os.path.join(dirname, 'tests', 'requirements.txt'), 'w') as file:
+            file.write('req7\n')
+            file.write('./req8\n')
+
+        with self.assertRaises(ValueError):
+            pkg_utils.get_dependencies(dirname)
+
+        diagnostics = []
+        install_requires, extras_require, tests_require, dependency_links = pkg_utils.get_dependencies(
+            dirname, diagnostics=diagnostics)
+        self.assertEqual(install_requires, ['req1'])
+        self.assertEqual(extras_require, {'opt1': ['req4'], 'tests': ['req7'], 'docs': [], 'all': ['req4', 'req7']})
+        self.assertEqual(tests_require, ['req7'])
+        self.assertEqual(dependency_links, [])
+        self.assertEqual([(os.path.relpath(diagnostic.filename, dirname), diagnostic.line_number, diagnostic.code)
+                          for diagnostic in diagnostics], [
+            ('requirements.txt', 2, 'invalid-syntax'),
+            ('requirements.optional.txt', 1, 'requirement-outside-section'),
+            ('requirements.optional.txt', 4, 'invalid-name'),
+            ('requirements.optional.txt', 5, 'invalid-section'),
+            (os.path.join('tests', 'requirements.txt'), 2, 'invalid-syntax'),
+            ('requirements.optional.txt', None, 'reserved-option'),
+        ])
+        self.assertEqual(str(diagnostics[-1]), '{}: reserved-option: {}'.format(
+            os.path.join(dirname, 'requirements.optional.txt'), pkg_utils.core.RESERVED_OPTIONS['tests']))
+
+    def test_parse_optional_requirement_lines_invalid_section_diagnostics(self):
+        diagnostics = []
+        extras_require, dependency_links = pkg_utils.parse_optional_requirement_lines([
+            '[opt1]',
+            'req1',
+            '[opt 2]',
+            'req2',
+            'req3 >=',
+            '[opt3]',
+            'req4',
+        ], diagnostics=diagnostics)
+        self.assertEqual(extras_require, {'opt1': ['req1'], 'opt3': ['req4']})
+        self.assertEqual(dependency_links, [])
+        self.assertEqual([(diagnostic.line_number, diagnostic.code) for diagnostic in diagnostics], [
+            (3, 'invalid-section'),
+            (5, 'invalid-syntax'),
+        ])
+
+    def test_parse_requirement_with_case_insensitive_version_hint(self):
+        reqs, links = pkg_utils.parse_requirement_lines([
+            'git+https://github.com/opt/req1.git#egg=Req1-1.2.3',
+            'git+https://github.com/opt/req2.git#EGG=req2-2.0.0RC1',
+        ])
+        self.assertEqual(reqs, ['Req1', 'req2'])
+        self.assertEqual(links, [
+            'git+https://github.com/opt/req1.git#egg=Req1-1.2.3',
+            'git+https://github.com/opt/req2.git#egg=req2-2.0.0RC1',
+        ])
+
+        reqs, links = pkg_utils.parse_requirement_lines(['git+https://github.com/opt/req1.git#egg=Req1-1.2.3'],
+                                                        include_uri=True)
+        self.assertEqual(reqs, ['git+https://github.com/opt/req1.git#egg=Req1'])
+
+    def test_compiled_patterns(self):
+        lines = []
+        for i_line in range(1000):
+            lines.append('git+https://github.com/opt/req{0}.git#egg=req{0}-{0}.1.2 ; python_version >= "2.7"'.format(i_line))
+            lines.append('req{}[opt] >= 1.0 ; python_version >= "3"  # comment'.format(i_line))
+        # the patterns are compiled once when the module is imported, and the parsers use the compiled patterns
+        for pattern in pkg_utils.core.PATTERNS.values():
+            self.assertIsInstance(pattern, re.Pattern)
+
+        patterns = {name: mock.Mock(wraps=pattern) for name, pattern in pkg_utils.core.PATTERNS.items()}
+        with mock.patch.dict(pkg_utils.core.PATTERNS, patterns):
+            reqs, _ = pkg_utils.parse_requirement_lines(lines, include_uri=True, include_extras=True, include_specs=True,
+                                                        include_markers=True)
+        self.assertEqual(len(reqs), len(lines))
+        self.assertEqual(patterns['requirement_name'].match.call_count, len(lines))
+        self.assertEqual(patterns['comment'].sub.call_count, len(lines))
+
     def test_parse_requirement_with_uri(self):
         reqs, links = pkg_utils.parse_requirement_lines(['req1'])
         self.assertEqual(reqs, ['req1'])
@@ -588,3 +1160,173 @@ class TestCase(unittest.TestCase):
                 'function': 'package.__main__3:main',
             },
         })
+
+    def test_add_console_scripts_concurrently(self):
+        egg_dir = os.path.join(self.dirname, 'package.egg-info')
+        entry_points_filename = os.path.join(egg_dir, 'entry_points.txt')
+        os.mkdir(egg_dir)
+        with open(entry_points_filename, 'w') as file:
+            file.write('[console_scripts]\n')
+
+        def add(i_entry):
+            pkg_utils.add_console_scripts(self.dirname, 'package', {
+                'entry{}'.format(i_entry): {'function': 'package.__main__{}:main'.format(i_entry)},
+            })
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(add, range(8)))
+
+        # the read-modify-write cycles are serialized, so no console scripts are lost
+        self.assertEqual(sorted(pkg_utils.get_console_scripts(self.dirname, 'package').keys()),
+                         ['entry{}'.format(i_entry) for i_entry in range(8)])
+        self.assertEqual(os.listdir(egg_dir), ['entry_points.txt'])
+
+        # the file isn't rewritten if its content doesn't change
+        mtime_ns = os.stat(entry_points_filename).st_mtime_ns
+        os.utime(entry_points_filename, ns=(0, 0))
+        add(0)
+        self.assertEqual(os.stat(entry_points_filename).st_mtime_ns, 0)
+        self.assertNotEqual(mtime_ns, 0)
+
+    def test_write_file_if_changed(self):
+        filename = os.path.join(self.dirname, 'file.txt')
+        self.assertTrue(pkg_utils.write_file_if_changed(filename, 'abc\n'))
+        with open(filename, 'r') as file:
+            self.assertEqual(file.read(), 'abc\n')
+
+        os.chmod(filename, 0o640)
+        inode = os.stat(filename).st_ino
+        self.assertFalse(pkg_utils.write_file_if_changed(filename, 'abc\n'))
+        self.assertEqual(os.stat(filename).st_ino, inode)
+
+        # the file is replaced, and keeps its mode
+        self.assertTrue(pkg_utils.write_file_if_changed(filename, 'def\n'))
+        self.assertNotEqual(os.stat(filename).st_ino, inode)
+        self.assertEqual(os.stat(filename).st_mode & 0o777, 0o640)
+        with open(filename, 'r') as file:
+            self.assertEqual(file.read(), 'def\n')
+
+        self.assertTrue(pkg_utils.write_file_if_changed(filename, 'def\n', executable=True))
+        self.assertEqual(os.stat(filename).st_mode & 0o777, 0o751)
+        self.assertFalse(pkg_utils.write_file_if_changed(filename, 'def\n', executable=True))
+
+        # readers never see partially written files
+        contents = ['{}\n'.format(i_content) * 10000 for i_content in range(8)]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda content: pkg_utils.write_file_if_changed(filename, content), contents))
+            with open(filename, 'r') as file:
+                self.assertIn(file.read(), contents + ['def\n'])
+        with open(filename, 'r') as file:
+            self.assertIn(file.read(), contents)
+
+        # temporary files are cleaned up
+        self.assertEqual(sorted(basename for basename in os.listdir(self.dirname) if basename.endswith('.tmp')), [])
+        with mock.patch('os.replace', side_effect=OSError('replace failed')):
+            with self.assertRaisesRegex(OSError, 'replace failed'):
+                pkg_utils.write_file_if_changed(filename, 'ghi\n')
+        self.assertEqual(sorted(basename for basename in os.listdir(self.dirname) if basename.endswith('.tmp')), [])
+
+    def test_convert_readme_md_to_rst_if_changed(self):
+        filename = os.path.join(self.dirname, 'README.rst')
+        with mock.patch('pypandoc.convert_file', return_value='Test\n====\n') as convert_file:
+            pkg_utils.convert_readme_md_to_rst(self.dirname)
+            self.assertEqual(convert_file.call_count, 1)
+            with open(filename, 'r') as file:
+                self.assertEqual(file.read(), 'Test\n====\n')
+
+            os.utime(filename, ns=(0, 0))
+            pkg_utils.convert_readme_md_to_rst(self.dirname)
+            self.assertEqual(os.stat(filename).st_mtime_ns, 0)
+
+    def _make_console_script_package(self):
+        with open(os.path.join(self.dirname, 'package', '__init__.py'), 'w') as file:
+            pass
+        with open(os.path.join(self.dirname, 'package', '__main__.py'), 'w') as file:
+            file.write('import sys\n')
+            file.write('class App(object):\n')
+            file.write('    @staticmethod\n')
+            file.write('    def run():\n')
+            file.write('        print(\'run \' + \' \'.join(sys.argv[1:]))\n')
+            file.write('def main():\n')
+            file.write('    print(\'pkg_resources\' in sys.modules)\n')
+
+        egg_dir = os.path.join(self.dirname, 'package.egg-info')
+        os.mkdir(egg_dir)
+        with open(os.path.join(egg_dir, 'PKG-INFO'), 'w') as file:
+            file.write('Metadata-Version: 1.1\n')
+            file.write('Name: package\n')
+            file.write('Version: 0.0.1\n')
+        with open(os.path.join(egg_dir, 'entry_points.txt'), 'w') as file:
+            file.write('[console_scripts]\n')
+            file.write('entry1 = package.__main__:main\n')
+            file.write('entry2 = package.__main__:App.run [opt]\n')
+
+    def _run_console_script(self, filename, *args):
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([self.dirname] + sys.path)
+        return subprocess.check_output([sys.executable, filename] + list(args), env=env).decode().strip()
+
+    def test_write_console_script_launchers(self):
+        self._make_console_script_package()
+        bin_dir = os.path.join(self.dirname, 'bin')
+
+        console_scripts = pkg_utils.get_console_scripts(self.dirname, 'package')
+        filenames = pkg_utils.write_console_script_launchers(bin_dir, console_scripts)
+        self.assertEqual(filenames, [os.path.join(bin_dir, 'entry1'), os.path.join(bin_dir, 'entry2')])
+
+        for filename in filenames:
+            self.assertTrue(os.access(filename, os.X_OK))
+        with open(filenames[0], 'r') as file:
+            self.assertEqual(file.readline(), '#!' + sys.executable + '\n')
+
+        self.assertEqual(self._run_console_script(filenames[0]), 'False')
+        self.assertEqual(self._run_console_script(filenames[1], 'arg1', 'arg2'), 'run arg1 arg2')
+
+        self.assertEqual(pkg_utils.write_console_script_launchers(bin_dir, None), [])
+
+    def test_write_console_script_launchers_executable(self):
+        filenames = pkg_utils.write_console_script_launchers(self.dirname, {
+            'entry1': {'function': 'package.__main__:main'},
+        }, executable='/usr/bin/python3')
+        with open(filenames[0], 'r') as file:
+            self.assertEqual(file.readline(), '#!/usr/bin/python3\n')
+
+    def test_write_console_script_launchers_error(self):
+        with self.assertRaisesRegex(ValueError, 'could not be parsed'):
+            pkg_utils.write_console_script_launchers(self.dirname, {
+                'entry1': {'function': 'package.__main__'},
+            })
+
+    @unittest.skipIf(pkg_resources is None, 'Comparison requires pkg_resources')
+    def test_write_console_script_launchers_imports(self):
+        self._make_console_script_package()
+        bin_dir = os.path.join(self.dirname, 'bin')
+        launcher, _ = pkg_utils.write_console_script_launchers(
+            bin_dir, pkg_utils.get_console_scripts(self.dirname, 'package'))
+
+        # wrapper generated by setuptools for editable installations
+        wrapper = os.path.join(self.dirname, 'entry1-wrapper')
+        with open(wrapper, 'w') as file:
+            file.write("__requires__ = 'package==0.0.1'\n")
+            file.write('import re\n')
+            file.write('import sys\n')
+            file.write('from pkg_resources import load_entry_point\n')
+            file.write("if __name__ == '__main__':\n")
+            file.write("    sys.exit(load_entry_point('package==0.0.1', 'console_scripts', 'entry1')())\n")
+        self.assertEqual(self._run_console_script(wrapper), 'True')
+
+        # compare the startup costs by the modules which the scripts import, which are independent of the load
+        # of the machine
+        def get_imported_modules(filename):
+            env = dict(os.environ)
+            env['PYTHONPATH'] = os.pathsep.join([self.dirname] + sys.path)
+            stderr = subprocess.run([sys.executable, '-X', 'importtime', filename], env=env, check=True,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE).stderr.decode()
+            return set(line.rpartition('|')[2].strip() for line in stderr.split('\n')
+                       if line.startswith('import time:') and not line.rstrip().endswith('imported package'))
+
+        launcher_modules = get_imported_modules(launcher)
+        wrapper_modules = get_imported_modules(wrapper)
+        self.assertIn('pkg_resources', wrapper_modules)
+        self.assertNotIn('pkg_resources', launcher_modules)
+        self.assertLess(len(launcher_modules), len(wrapper_modules))
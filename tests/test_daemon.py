@@ -0,0 +1,197 @@
+""" Tests for the metadata daemon
+
+:License: MIT
+"""
+
+from pkg_utils import daemon
+from unittest import mock
+import os
+import pkg_utils
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+
+class MetadataCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        os.mkdir(os.path.join(dirname, 'package'))
+        os.mkdir(os.path.join(dirname, 'package', 'data'))
+
+        with open(os.path.join(dirname, 'package', '_version.py'), 'w') as file:
+            file.write("__version__ = '0.0.1'")
+        with open(os.path.join(dirname, 'package', 'data', 'file1.txt'), 'w') as file:
+            pass
+        with open(os.path.join(dirname, 'README.rst'), 'w') as file:
+            file.write('Test\n====\n')
+        with open(os.path.join(dirname, 'requirements.txt'), 'w') as file:
+            file.write('req1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def touch(self, filename, content=''):
+        # advance the modification time so that changes within the resolution of the file system are detected
+        mtime = os.stat(filename).st_mtime + 10 if os.path.exists(filename) else None
+        with open(filename, 'w') as file:
+            file.write(content)
+        if mtime:
+            os.utime(filename, (mtime, mtime))
+
+    def test_get_package_metadata(self):
+        cache = daemon.MetadataCache()
+        patterns = {'package': ['data/*.txt']}
+        md = cache.get_package_metadata(self.dirname, 'package', package_data_filename_patterns=patterns)
+        expected_md = pkg_utils.get_package_metadata(self.dirname, 'package', package_data_filename_patterns=patterns)
+        self.assertEqual(md.__dict__, expected_md.__dict__)
+
+        # cached values are copies
+        md.install_requires.append('req2')
+        self.assertEqual(cache.get_dependencies(self.dirname)[0], ['req1'])
+
+    def test_invalidation(self):
+        cache = daemon.MetadataCache()
+        patterns = {'package': ['data/*.txt']}
+
+        self.assertEqual(cache.get_version(self.dirname, 'package'), '0.0.1')
+        self.assertEqual(cache.get_long_description(self.dirname), 'Test\n====\n')
+        self.assertEqual(cache.get_dependencies(self.dirname)[0], ['req1'])
+        self.assertEqual(cache.expand_package_data_filename_patterns(self.dirname, patterns), {'package': ['data/file1.txt']})
+
+        self.touch(os.path.join(self.dirname, 'package', '_version.py'), "__version__ = '0.0.2'")
+        self.touch(os.path.join(self.dirname, 'README.rst'), 'Test 2\n======\n')
+        self.touch(os.path.join(self.dirname, 'requirements.txt'), 'req2\n')
+        os.mkdir(os.path.join(self.dirname, 'tests'))
+        self.touch(os.path.join(self.dirname, 'tests', 'requirements.txt'), 'req3\n')
+        os.mkdir(os.path.join(self.dirname, 'package', 'data', 'subdir'))
+        self.touch(os.path.join(self.dirname, 'package', 'data', 'subdir', 'file2.txt'))
+
+        self.assertEqual(cache.get_version(self.dirname, 'package'), '0.0.2')
+        self.assertEqual(cache.get_long_description(self.dirname), 'Test 2\n======\n')
+        self.assertEqual(cache.get_dependencies(self.dirname)[0], ['req2'])
+        self.assertEqual(cache.get_dependencies(self.dirname)[2], ['req3'])
+        self.assertEqual(cache.expand_package_data_filename_patterns(self.dirname, patterns), {'package': ['data/file1.txt']})
+        self.assertEqual(cache.expand_package_data_filename_patterns(self.dirname, {'package': ['data/**/*.txt']}),
+                         {'package': ['data/file1.txt', 'data/subdir/file2.txt']})
+
+        cache.clear()
+        self.assertEqual(cache.get_version(self.dirname, 'package'), '0.0.2')
+
+    def test_inputs_changed_while_calculating(self):
+        cache = daemon.MetadataCache()
+        filename = os.path.join(self.dirname, 'requirements.txt')
+        parse_requirements_file = pkg_utils.parse_requirements_file
+
+        def parse_and_change(*args, **kwargs):
+            value = parse_requirements_file(*args, **kwargs)
+            self.touch(filename, 'req2\n')
+            return value
+
+        with mock.patch.object(daemon, 'parse_requirements_file', side_effect=parse_and_change):
+            self.assertEqual(cache.parse_requirements_file(filename), (['req1'], []))
+        self.assertEqual(cache.parse_requirements_file(filename), (['req2'], []))
+
+    def test_convert_readme_md_to_rst(self):
+        cache = daemon.MetadataCache()
+        md_filename = os.path.join(self.dirname, 'README.md')
+        rst_filename = os.path.join(self.dirname, 'README.rst')
+        self.touch(md_filename, 'Test\n')
+
+        def convert(dirname):
+            self.touch(rst_filename, 'Converted\n')
+
+        with mock.patch.object(daemon, 'convert_readme_md_to_rst', side_effect=convert) as convert_readme_md_to_rst:
+            cache.convert_readme_md_to_rst(self.dirname)
+            self.assertEqual(convert_readme_md_to_rst.call_count, 1)
+
+            # the README.rst written by the conversion doesn't invalidate it
+            cache.convert_readme_md_to_rst(self.dirname)
+            self.assertEqual(convert_readme_md_to_rst.call_count, 1)
+
+            self.touch(md_filename, 'Test 2\n')
+            cache.convert_readme_md_to_rst(self.dirname)
+            self.assertEqual(convert_readme_md_to_rst.call_count, 2)
+
+    def test_convert_readme_md_to_rst_without_md(self):
+        cache = daemon.MetadataCache()
+        cache.convert_readme_md_to_rst(self.dirname)
+        self.assertEqual(cache.get_long_description(self.dirname), 'Test\n====\n')
+
+    def test_run(self):
+        cache = daemon.MetadataCache()
+        self.assertEqual(cache.run('version', {'dirname': self.dirname, 'package_name': 'package'}), '0.0.1')
+        self.assertEqual(cache.run('deps', {'dirname': self.dirname})['install_requires'], ['req1'])
+        self.assertEqual(cache.run('readme', {'dirname': self.dirname}), 'Test\n====\n')
+        self.assertEqual(cache.run('metadata', {'dirname': self.dirname, 'package_name': 'package'})['version'], '0.0.1')
+        self.assertEqual(cache.run('package-data', {'dirname': self.dirname}), {})
+        with self.assertRaisesRegex(ValueError, 'Unsupported command'):
+            cache.run('unknown', {})
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        os.mkdir(os.path.join(dirname, 'package'))
+        with open(os.path.join(dirname, 'package', '_version.py'), 'w') as file:
+            file.write("__version__ = '0.0.1'")
+        with open(os.path.join(dirname, 'requirements.txt'), 'w') as file:
+            file.write('req1 >= 1.0\n')
+
+        self.socket_path = os.path.join(dirname, 'daemon.sock')
+        self.thread = threading.Thread(target=daemon.serve, args=(self.socket_path,))
+        self.thread.start()
+        while not os.path.exists(self.socket_path):
+            time.sleep(0.01)
+
+    def tearDown(self):
+        daemon.request(self.socket_path, 'shutdown')
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.socket_path))
+        shutil.rmtree(self.dirname)
+
+    def test_request(self):
+        self.assertEqual(daemon.request(self.socket_path, 'version',
+                                        {'dirname': self.dirname, 'package_name': 'package'}), '0.0.1')
+
+        # repeated requests are answered from the cache without reparsing the requirements
+        with mock.patch.object(daemon, 'parse_requirements_file',
+                               wraps=daemon.parse_requirements_file) as parse_requirements_file:
+            for i_request in range(10):
+                result = daemon.request(self.socket_path, 'deps', {'dirname': self.dirname})
+        self.assertEqual(result['install_requires'], ['req1 >= 1.0'])
+        self.assertEqual(parse_requirements_file.call_count, 3)
+
+    def test_existing_socket_path(self):
+        # running daemons aren't replaced
+        with self.assertRaisesRegex(ValueError, 'already listening'):
+            daemon.Server(self.socket_path)
+        self.assertEqual(daemon.request(self.socket_path, 'version',
+                                        {'dirname': self.dirname, 'package_name': 'package'}), '0.0.1')
+
+        # other files aren't removed
+        filename = os.path.join(self.dirname, 'file.txt')
+        with open(filename, 'w') as file:
+            file.write('content')
+        with self.assertRaisesRegex(ValueError, 'not a socket'):
+            daemon.Server(filename)
+        self.assertTrue(os.path.isfile(filename))
+
+        # the sockets of daemons which have stopped are replaced
+        stale_socket_path = os.path.join(self.dirname, 'stale.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(stale_socket_path)
+        sock.close()
+        server = daemon.Server(stale_socket_path)
+        server.server_close()
+        self.assertFalse(os.path.exists(stale_socket_path))
+
+    def test_request_error(self):
+        with self.assertRaisesRegex(ValueError, 'Unsupported command'):
+            daemon.request(self.socket_path, 'unknown')
+        with self.assertRaisesRegex(ValueError, "'dirname'"):
+            daemon.request(self.socket_path, 'version')
@@ -0,0 +1,83 @@
+""" Tests for the digests of dependencies
+
+:License: MIT
+"""
+
+from pkg_utils import digest
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class DigestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.write_requirements('numpy >= 1.0, != 1.1\nsix; python_version < "3"\n',
+                                '[opt]\nscipy\n[opt2]\nScipy\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write_requirements(self, requirements, optional_requirements):
+        with open(os.path.join(self.dirname, 'requirements.txt'), 'w') as file:
+            file.write(requirements)
+        with open(os.path.join(self.dirname, 'requirements.optional.txt'), 'w') as file:
+            file.write(optional_requirements)
+
+    def test_canonicalize_requirement(self):
+        self.assertEqual(digest.canonicalize_requirement("Numpy[Extra_2,b] >= 1.0, != 1.1; python_version < '3'"),
+                         'numpy[b,extra-2]!=1.1,>=1.0; python_version < "3"')
+        self.assertEqual(digest.canonicalize_requirement('pkg @ https://example.com/pkg.zip ; os_name == "nt"'),
+                         'pkg @ https://example.com/pkg.zip ; os_name == "nt"')
+        with self.assertRaisesRegex(ValueError, 'is invalid'):
+            digest.canonicalize_requirement('numpy >=')
+
+    def test_get_dependencies_digest(self):
+        value = digest.get_dependencies_digest(self.dirname)
+        self.assertRegex(value, '^[0-9a-f]{64}$')
+        self.assertEqual(digest.get_dependencies_digest(self.dirname), value)
+        self.assertEqual(len(digest.get_dependencies_digest(self.dirname, algorithm='md5')), 32)
+
+        # comments, order and formatting don't change the digest
+        self.write_requirements("# comment\nsix ; python_version<'3'\n\nNumPy!=1.1,>=1.0\n",
+                                '[opt]\nSciPy  # comment\n[opt2]\nscipy\n')
+        self.assertEqual(digest.get_dependencies_digest(self.dirname), value)
+
+        # changes to markers, specifiers and options change the digest
+        self.write_requirements('numpy >= 1.0, != 1.1\nsix\n',
+                                '[opt]\nscipy\n[opt2]\nScipy\n')
+        changed_value = digest.get_dependencies_digest(self.dirname)
+        self.assertNotEqual(changed_value, value)
+
+        self.write_requirements('numpy >= 1.0, != 1.1\nsix\n',
+                                '[opt]\nscipy\n')
+        self.assertNotEqual(digest.get_dependencies_digest(self.dirname), changed_value)
+
+    def test_get_dependencies_digest_options(self):
+        opt_value = digest.get_dependencies_digest(self.dirname, options=['opt'])
+        self.assertEqual(digest.get_dependencies_digest(self.dirname, options=['opt2']), opt_value)
+        self.assertEqual(digest.get_dependencies_digest(self.dirname, options=['opt', 'opt2']), opt_value)
+        self.assertNotEqual(digest.get_dependencies_digest(self.dirname, options=[]), opt_value)
+        self.assertNotEqual(digest.get_dependencies_digest(self.dirname), opt_value)
+
+        self.assertEqual(digest.get_dependencies_digest(self.dirname, options=[], evaluate_markers=True,
+                                                        environment={'python_version': '3.11'}),
+                         digest.digest_dependencies(['numpy>=1.0,!=1.1'], {}, [], options=[]))
+
+        with self.assertRaisesRegex(ValueError, 'Option undefined is not defined'):
+            digest.get_dependencies_digest(self.dirname, options=['undefined'])
+
+    def test_get_canonical_dependencies(self):
+        self.assertEqual(digest.get_canonical_dependencies(['B', 'a>=1'], {'x': ['C', 'c']}, [' http://b ', 'http://a']), {
+            'version': digest.DIGEST_FORMAT_VERSION,
+            'install_requires': ['a>=1', 'b'],
+            'extras_require': {'x': ['c']},
+            'dependency_links': ['http://a', 'http://b'],
+        })
+        self.assertEqual(digest.get_canonical_dependencies(['B'], {'x': ['C'], 'y': ['d']}, [], options=['x']), {
+            'version': digest.DIGEST_FORMAT_VERSION,
+            'requires': ['b', 'c'],
+            'dependency_links': [],
+        })
@@ -0,0 +1,161 @@
+""" Tests for the index of the metadata of the packages of a workspace
+
+:License: MIT
+"""
+
+from pkg_utils import index
+from unittest import mock
+import os
+import pkg_utils
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+
+class WorkspaceIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.workspace_dirname = os.path.join(self.dirname, 'workspace')
+        self.filename = os.path.join(self.dirname, 'index.sqlite')
+
+        self.write('pkg_a/setup.py', '')
+        self.write('pkg_a/pkg_a/_version.py', "__version__ = '0.0.1'\n")
+        self.write('pkg_a/pkg_a/data/file1.txt', '')
+        self.write('pkg_a/pkg_a/data/file2.txt', '')
+        self.write('pkg_a/requirements.txt', 'numpy == 1.26.0\nscipy >= 1.0\n')
+        self.write('pkg_a/requirements.optional.txt', '[plot]\nMatplotlib\n')
+        self.write('pkg_a/tests/requirements.txt', 'pytest\n')
+
+        self.write('group/pkg_b/setup.py', '')
+        self.write('group/pkg_b/pkg_b/_version.py', "__version__ = '0.0.2'\n")
+        self.write('group/pkg_b/requirements.txt', 'scipy\n')
+        self.write('group/pkg_b/requirements.optional.txt', '[plot]\nmatplotlib === 3.8.0\n[np]\nnumpy == 1.*\n')
+        self.write('group/pkg_b/subpkg/setup.py', '')
+
+        self.write('.hidden/pkg_c/setup.py', '')
+
+        self.pkg_a = os.path.join(self.workspace_dirname, 'pkg_a')
+        self.pkg_b = os.path.join(self.workspace_dirname, 'group', 'pkg_b')
+        self.package_data_filename_patterns = {self.pkg_a: {'pkg_a': ['data/*.txt']}}
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, path, content):
+        filename = os.path.join(self.workspace_dirname, path)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as file:
+            file.write(content)
+
+    def test_find_workspace_packages(self):
+        self.assertEqual(index.find_workspace_packages(self.workspace_dirname), [self.pkg_b, self.pkg_a])
+        self.assertEqual(index.get_workspace_package_name(self.pkg_a), 'pkg_a')
+        self.assertEqual(index.get_workspace_package_name(os.path.join(self.pkg_b, 'subpkg')), 'subpkg')
+
+    def test_update(self):
+        with index.WorkspaceIndex(self.filename) as workspace_index:
+            self.assertEqual(workspace_index.update(self.workspace_dirname, max_workers=2,
+                                                    package_data_filename_patterns=self.package_data_filename_patterns), {
+                'added': [self.pkg_b, self.pkg_a],
+                'updated': [],
+                'removed': [],
+            })
+            self.assertEqual(workspace_index.get_packages(), [
+                {'dirname': self.pkg_b, 'name': 'pkg_b', 'version': '0.0.2', 'package_data': {}},
+                {'dirname': self.pkg_a, 'name': 'pkg_a', 'version': '0.0.1', 'package_data': {'pkg_a': 2}},
+            ])
+
+            md = workspace_index.get_metadata(self.pkg_a)
+            expected_md = pkg_utils.get_package_metadata(
+                self.pkg_a, 'pkg_a', package_data_filename_patterns=self.package_data_filename_patterns[self.pkg_a])
+            self.assertEqual(md.__dict__, expected_md.__dict__)
+            self.assertEqual(workspace_index.get_metadata(os.path.join(self.dirname, 'missing')), None)
+
+            # only the packages whose inputs changed are reread
+            with mock.patch.object(workspace_index, '_read_package_metadata',
+                                   wraps=workspace_index._read_package_metadata) as read:
+                self.assertEqual(workspace_index.update(
+                    self.workspace_dirname, package_data_filename_patterns=self.package_data_filename_patterns), {
+                    'added': [], 'updated': [], 'removed': []})
+                self.assertEqual(read.call_count, 0)
+
+                self.write('group/pkg_b/requirements.txt', 'scipy\nnumpy == 2.0.0\n')
+                os.utime(os.path.join(self.pkg_b, 'requirements.txt'), ns=(0, 0))
+                self.assertEqual(workspace_index.update(
+                    self.workspace_dirname, package_data_filename_patterns=self.package_data_filename_patterns), {
+                    'added': [], 'updated': [self.pkg_b], 'removed': []})
+                self.assertEqual(read.call_count, 1)
+
+            self.assertEqual(workspace_index.get_metadata(self.pkg_b).install_requires, ['numpy == 2.0.0', 'scipy'])
+
+            shutil.rmtree(self.pkg_b)
+            self.assertEqual(workspace_index.update(
+                self.workspace_dirname, package_data_filename_patterns=self.package_data_filename_patterns), {
+                'added': [], 'updated': [], 'removed': [self.pkg_b]})
+            self.assertEqual([package['dirname'] for package in workspace_index.get_packages()], [self.pkg_a])
+
+        # the index persists
+        with index.WorkspaceIndex(self.filename) as workspace_index:
+            self.assertEqual([package['dirname'] for package in workspace_index.get_packages()], [self.pkg_a])
+
+    def test_update_errors(self):
+        self.write('pkg_a/requirements.optional.txt', '[tests]\npytest\n')
+        with index.WorkspaceIndex(self.filename) as workspace_index:
+            errors = {}
+            self.assertEqual(workspace_index.update(self.workspace_dirname, errors=errors)['added'], [self.pkg_b])
+            self.assertEqual(list(errors.keys()), [self.pkg_a])
+
+            with self.assertRaisesRegex(ValueError, 'tests'):
+                workspace_index.update(self.workspace_dirname)
+
+    def test_update_package(self):
+        with index.WorkspaceIndex(self.filename) as workspace_index:
+            self.assertTrue(workspace_index.update_package(self.pkg_a))
+            self.assertFalse(workspace_index.update_package(self.pkg_a))
+            self.assertTrue(workspace_index.update_package(self.pkg_a, package_data_filename_patterns={'pkg_a': ['data/*']}))
+            self.assertEqual(workspace_index.get_packages()[0]['package_data'], {'pkg_a': 2})
+
+            workspace_index.remove_package(self.pkg_a)
+            self.assertEqual(workspace_index.get_packages(), [])
+
+    def test_get_dependents_and_pins(self):
+        with index.WorkspaceIndex(self.filename) as workspace_index:
+            workspace_index.update(self.workspace_dirname)
+
+            self.assertEqual(workspace_index.get_dependents('MatPlotLib'), [
+                index.IndexedRequirement('pkg_b', self.pkg_b, 'all', 'matplotlib === 3.8.0', '3.8.0'),
+                index.IndexedRequirement('pkg_b', self.pkg_b, 'plot', 'matplotlib === 3.8.0', '3.8.0'),
+                index.IndexedRequirement('pkg_a', self.pkg_a, 'all', 'Matplotlib'),
+                index.IndexedRequirement('pkg_a', self.pkg_a, 'plot', 'Matplotlib'),
+            ])
+            self.assertEqual(workspace_index.get_dependents('scipy', option='install_requires'), [
+                index.IndexedRequirement('pkg_b', self.pkg_b, 'install_requires', 'scipy'),
+                index.IndexedRequirement('pkg_a', self.pkg_a, 'install_requires', 'scipy >= 1.0'),
+            ])
+            self.assertEqual(workspace_index.get_dependents('pytest', option='tests'), [
+                index.IndexedRequirement('pkg_a', self.pkg_a, 'tests', 'pytest'),
+            ])
+            self.assertEqual(workspace_index.get_dependents('undefined'), [])
+
+            self.assertEqual(workspace_index.get_pins('numpy'), [
+                index.IndexedRequirement('pkg_a', self.pkg_a, 'install_requires', 'numpy == 1.26.0', '1.26.0'),
+            ])
+            self.assertEqual([(pin.package_name, pin.requirement) for pin in workspace_index.get_pins()], [
+                ('pkg_b', 'matplotlib === 3.8.0'),
+                ('pkg_b', 'matplotlib === 3.8.0'),
+                ('pkg_a', 'numpy == 1.26.0'),
+            ])
+
+    def test_format_version(self):
+        with index.WorkspaceIndex(self.filename) as workspace_index:
+            workspace_index.update(self.workspace_dirname)
+
+        connection = sqlite3.connect(self.filename)
+        connection.execute('PRAGMA user_version = 0')
+        connection.close()
+
+        with index.WorkspaceIndex(self.filename) as workspace_index:
+            self.assertEqual(workspace_index.get_packages(), [])
@@ -0,0 +1,219 @@
+""" Tests for the direct wheel installer
+
+:License: MIT
+"""
+
+from pkg_utils import installer
+from pkg_utils import wheelhouse
+from test_wheelhouse import make_wheel
+from unittest import mock
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import unittest
+import zipfile
+
+
+class InstallerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        self.wheelhouse = os.path.join(dirname, 'wheelhouse')
+        self.prefix = os.path.join(dirname, 'env')
+        os.mkdir(self.wheelhouse)
+        self.paths = sysconfig.get_paths(vars={'base': self.prefix, 'platbase': self.prefix,
+                                               'installed_base': self.prefix, 'installed_platbase': self.prefix})
+
+        make_wheel(self.wheelhouse, 'pkg_utils_test_a', '1.0', files={
+            'pkg_utils_test_a/__init__.py': "__version__ = '1.0'\n",
+            'pkg_utils_test_a/old.py': '',
+            'pkg_utils_test_a-1.0.dist-info/entry_points.txt':
+                '[console_scripts]\npkg-utils-test-a = pkg_utils_test_a:main\n',
+        })
+        make_wheel(self.wheelhouse, 'pkg_utils_test_a', '2.0', files={
+            'pkg_utils_test_a/__init__.py': "__version__ = '2.0'\n\ndef main():\n    print(__version__)\n",
+            'pkg_utils_test_a-2.0.data/scripts/pkg-utils-test-a-script': '#!python\nimport pkg_utils_test_a\n',
+            'pkg_utils_test_a-2.0.data/data/share/pkg_utils_test_a.txt': 'data',
+            'pkg_utils_test_a-2.0.dist-info/entry_points.txt':
+                '[console_scripts]\npkg-utils-test-a = pkg_utils_test_a:main\n',
+        })
+        make_wheel(self.wheelhouse, 'pkg_utils_test_b', '1.0')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_install_wheels(self):
+        filenames = [os.path.join(self.wheelhouse, 'pkg_utils_test_a-2.0-py3-none-any.whl'),
+                     os.path.join(self.wheelhouse, 'pkg_utils_test_b-1.0-py3-none-any.whl')]
+        installed = installer.install_wheels(filenames, prefix=self.prefix, max_workers=2)
+        self.assertEqual([(wheel.name, str(wheel.version), wheel.skipped) for wheel in installed], [
+            ('pkg-utils-test-a', '2.0', False),
+            ('pkg-utils-test-b', '1.0', False),
+        ])
+
+        site_packages = self.paths['purelib']
+        dist_info_dirname = os.path.join(site_packages, 'pkg_utils_test_a-2.0.dist-info')
+        self.assertEqual(installed[0].dist_info_dirname, dist_info_dirname)
+        with open(os.path.join(dist_info_dirname, 'INSTALLER'), 'r') as file:
+            self.assertEqual(file.read(), 'pkg_utils\n')
+        with open(os.path.join(dist_info_dirname, 'direct_url.json'), 'r') as file:
+            self.assertEqual(json.load(file)['archive_info']['hash'], wheelhouse.hash_file(filenames[0]).replace(':', '='))
+
+        # RECORD lists every installed file with its hash
+        with open(os.path.join(dist_info_dirname, 'RECORD'), 'r', newline='') as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(rows[-1], ['pkg_utils_test_a-2.0.dist-info/RECORD', '', ''])
+        for path, file_hash, size in rows[:-1]:
+            with open(os.path.join(site_packages, path), 'rb') as file:
+                content = file.read()
+            if os.path.basename(path) != 'pkg-utils-test-a-script':
+                self.assertEqual(file_hash, installer._get_record_hash(content))
+                self.assertEqual(int(size), len(content))
+        paths = [os.path.normpath(os.path.join(site_packages, row[0])) for row in rows]
+        self.assertIn(os.path.join(self.paths['scripts'], 'pkg-utils-test-a'), paths)
+        self.assertIn(os.path.join(self.paths['scripts'], 'pkg-utils-test-a-script'), paths)
+        self.assertIn(os.path.join(self.paths['data'], 'share', 'pkg_utils_test_a.txt'), paths)
+
+        # scripts and entry points run with the interpreter
+        env = dict(os.environ, PYTHONPATH=site_packages)
+        output = subprocess.check_output([os.path.join(self.paths['scripts'], 'pkg-utils-test-a')], env=env)
+        self.assertEqual(output.decode().strip(), '2.0')
+        with open(os.path.join(self.paths['scripts'], 'pkg-utils-test-a-script'), 'r') as file:
+            self.assertEqual(file.readline(), '#!{}\n'.format(sys.executable))
+        subprocess.check_call([os.path.join(self.paths['scripts'], 'pkg-utils-test-a-script')], env=env)
+
+        # identical wheels are skipped
+        installed = installer.install_wheels(filenames, prefix=self.prefix)
+        self.assertEqual([wheel.skipped for wheel in installed], [True, True])
+
+    def test_install_wheels_replaces_other_versions(self):
+        site_packages = self.paths['purelib']
+        installer.install_wheels([os.path.join(self.wheelhouse, 'pkg_utils_test_a-1.0-py3-none-any.whl')],
+                                 prefix=self.prefix)
+        self.assertTrue(os.path.isfile(os.path.join(site_packages, 'pkg_utils_test_a', 'old.py')))
+
+        # bytecode of the removed modules is removed, but not the bytecode of other modules in the same directory
+        pycache_dirname = os.path.join(site_packages, 'pkg_utils_test_a', '__pycache__')
+        os.mkdir(pycache_dirname)
+        for basename in ['old.cpython-38.pyc', 'old.cpython-38.opt-1.pyc', 'other.cpython-38.pyc']:
+            with open(os.path.join(pycache_dirname, basename), 'w'):
+                pass
+
+        installer.install_wheels([os.path.join(self.wheelhouse, 'pkg_utils_test_a-2.0-py3-none-any.whl')],
+                                 prefix=self.prefix)
+        self.assertFalse(os.path.isdir(os.path.join(site_packages, 'pkg_utils_test_a-1.0.dist-info')))
+        self.assertFalse(os.path.isfile(os.path.join(site_packages, 'pkg_utils_test_a', 'old.py')))
+        self.assertEqual(os.listdir(pycache_dirname), ['other.cpython-38.pyc'])
+        self.assertTrue(os.path.isfile(os.path.join(site_packages, 'pkg_utils_test_a', '__init__.py')))
+
+    def test_install_wheels_errors(self):
+        filename = os.path.join(self.dirname, 'pkg_utils_test_b-1.0-py3-none-any.whl')
+        with zipfile.ZipFile(os.path.join(self.wheelhouse, 'pkg_utils_test_b-1.0-py3-none-any.whl')) as src, \
+                zipfile.ZipFile(filename, 'w') as dest:
+            for name in src.namelist():
+                dest.writestr(name, src.read(name) + (b'# modified\n' if name.endswith('__init__.py') else b''))
+        with self.assertRaisesRegex(ValueError, 'does not match the RECORD'):
+            installer.install_wheels([filename], prefix=self.prefix)
+
+        # nothing is installed from invalid wheels, and the installed versions are kept
+        site_packages = self.paths['purelib']
+        self.assertEqual(os.listdir(site_packages), [])
+        installer.install_wheels([os.path.join(self.wheelhouse, 'pkg_utils_test_a-1.0-py3-none-any.whl')],
+                                 prefix=self.prefix)
+        filename = os.path.join(self.dirname, 'pkg_utils_test_a-2.0-py3-none-any.whl')
+        with zipfile.ZipFile(os.path.join(self.wheelhouse, 'pkg_utils_test_a-2.0-py3-none-any.whl')) as src, \
+                zipfile.ZipFile(filename, 'w') as dest:
+            for name in src.namelist():
+                dest.writestr(name, src.read(name) + (b'# modified\n' if name.endswith('.txt') else b''))
+        with self.assertRaisesRegex(ValueError, 'does not match the RECORD'):
+            installer.install_wheels([filename], prefix=self.prefix)
+        self.assertEqual(sorted(os.listdir(site_packages)), ['pkg_utils_test_a', 'pkg_utils_test_a-1.0.dist-info'])
+        self.assertTrue(os.path.isfile(os.path.join(site_packages, 'pkg_utils_test_a', 'old.py')))
+        self.assertFalse(os.path.exists(os.path.join(self.paths['scripts'], 'pkg-utils-test-a-script')))
+
+        # files which aren't listed in the RECORD are rejected
+        filename = os.path.join(self.dirname, 'pkg_utils_test_b-1.0-py3-none-any.whl')
+        with zipfile.ZipFile(os.path.join(self.wheelhouse, 'pkg_utils_test_b-1.0-py3-none-any.whl')) as src, \
+                zipfile.ZipFile(filename, 'w') as dest:
+            for name in src.namelist():
+                dest.writestr(name, src.read(name))
+            dest.writestr('pkg_utils_test_b/unlisted.py', '')
+        with self.assertRaisesRegex(ValueError, 'pkg_utils_test_b/unlisted.py is not listed in the RECORD'):
+            installer.install_wheels([filename], prefix=self.prefix)
+        self.assertEqual(sorted(os.listdir(site_packages)), ['pkg_utils_test_a', 'pkg_utils_test_a-1.0.dist-info'])
+
+        # except signatures of the RECORD
+        filename = os.path.join(self.dirname, 'pkg_utils_test_b-1.0-py3-none-any.whl')
+        with zipfile.ZipFile(os.path.join(self.wheelhouse, 'pkg_utils_test_b-1.0-py3-none-any.whl')) as src, \
+                zipfile.ZipFile(filename, 'w') as dest:
+            for name in src.namelist():
+                dest.writestr(name, src.read(name))
+            dest.writestr('pkg_utils_test_b-1.0.dist-info/RECORD.jws', '{}')
+        installer.install_wheels([filename], prefix=self.prefix)
+        self.assertIn('pkg_utils_test_b-1.0.dist-info', os.listdir(site_packages))
+
+        filename = os.path.join(self.dirname, 'pkg_utils_test_d-1.0-py3-none-any.whl')
+        with zipfile.ZipFile(filename, 'w') as archive:
+            archive.writestr('pkg_utils_test_d/__init__.py', '')
+        with self.assertRaisesRegex(ValueError, 'does not contain a .dist-info directory'):
+            installer.install_wheels([filename], prefix=self.prefix)
+
+    def test_install_wheels_gui_scripts(self):
+        filename = make_wheel(self.dirname, 'pkg_utils_test_c', '1.0', files={
+            'pkg_utils_test_c-1.0.data/scripts/gui': '#!pythonw\nimport sys\n',
+            'pkg_utils_test_c-1.0.data/scripts/other': '#!python3\nimport sys\n',
+        })
+        installer.install_wheels([filename], prefix=self.prefix)
+        with open(os.path.join(self.paths['scripts'], 'gui'), 'r') as file:
+            self.assertEqual(file.readline(), '#!{}\n'.format(installer._get_gui_executable(sys.executable)))
+        with open(os.path.join(self.paths['scripts'], 'other'), 'r') as file:
+            self.assertEqual(file.readline(), '#!python3\n')
+
+        bin_dirname = os.path.join(self.dirname, 'bin')
+        os.mkdir(bin_dirname)
+        for basename in ['python.exe', 'pythonw.exe', 'python3']:
+            with open(os.path.join(bin_dirname, basename), 'w'):
+                pass
+        self.assertEqual(installer._get_gui_executable(os.path.join(bin_dirname, 'python.exe')),
+                         os.path.join(bin_dirname, 'pythonw.exe'))
+        self.assertEqual(installer._get_gui_executable(os.path.join(bin_dirname, 'python3')),
+                         os.path.join(bin_dirname, 'python3'))
+
+    def test_install_locked_requirements(self):
+        lock_filename = os.path.join(self.dirname, 'requirements.lock')
+        with open(lock_filename, 'w') as file:
+            file.write('# pinned\n')
+            file.write(str(wheelhouse.LockedRequirement('pkg-utils-test-a', '1.0', [wheelhouse.hash_file(
+                os.path.join(self.wheelhouse, 'pkg_utils_test_a-1.0-py3-none-any.whl'))])) + '\n')
+            file.write('pkg_utils_test_b==1.0\n')
+        locked_requires = wheelhouse.read_lock_file(lock_filename)
+        self.assertEqual([(req.name, str(req.version), len(req.hashes)) for req in locked_requires], [
+            ('pkg-utils-test-a', '1.0', 1),
+            ('pkg-utils-test-b', '1.0', 0),
+        ])
+
+        # each wheel is hashed at most once
+        with mock.patch.object(installer, 'hash_file', wraps=installer.hash_file) as hash_file:
+            installed = installer.install_locked_requirements(locked_requires, self.wheelhouse, prefix=self.prefix)
+        self.assertEqual([(wheel.name, str(wheel.version)) for wheel in installed], [
+            ('pkg-utils-test-a', '1.0'),
+            ('pkg-utils-test-b', '1.0'),
+        ])
+        self.assertEqual(sorted(os.path.basename(call[0][0]) for call in hash_file.call_args_list), [
+            'pkg_utils_test_a-1.0-py3-none-any.whl',
+            'pkg_utils_test_b-1.0-py3-none-any.whl',
+        ])
+
+        locked_requires[0].hashes = ['sha256:0']
+        with self.assertRaisesRegex(ValueError, 'No wheel in the wheelhouse matches pkg-utils-test-a==1.0'):
+            installer.install_locked_requirements(locked_requires, self.wheelhouse, prefix=self.prefix)
+
+        with open(lock_filename, 'w') as file:
+            file.write('pkg_utils_test_b >= 1.0\n')
+        with self.assertRaisesRegex(ValueError, 'is not pinned'):
+            wheelhouse.read_lock_file(lock_filename)
@@ -0,0 +1,178 @@
+""" Tests for the command line interface
+
+:License: MIT
+"""
+
+from pkg_utils import __main__
+from pkg_utils import daemon
+import contextlib
+import io
+import json
+import os
+import pkg_utils
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+
+class MainTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        os.mkdir(os.path.join(dirname, 'package'))
+
+        with open(os.path.join(dirname, 'package', '_version.py'), 'w') as file:
+            file.write("__version__ = '0.0.1'")
+        with open(os.path.join(dirname, 'package', 'data.txt'), 'w') as file:
+            pass
+        with open(os.path.join(dirname, 'README.rst'), 'w') as file:
+            file.write('Test\n====\n')
+        with open(os.path.join(dirname, 'requirements.txt'), 'w') as file:
+            file.write('req1 >= 1.0; python_version < "3"\n')
+            file.write('req2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def run_main(self, *argv):
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            exit_code = __main__.main(list(argv))
+        return (exit_code, stdout.getvalue(), stderr.getvalue())
+
+    def test_validate(self):
+        exit_code, stdout, _ = self.run_main('validate', self.dirname)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(stdout), [])
+
+        with open(os.path.join(self.dirname, 'requirements.optional.txt'), 'w') as file:
+            file.write('[opt]\nreq3 >=\n')
+        exit_code, stdout, _ = self.run_main('validate', self.dirname, '--max-workers', '2')
+        self.assertEqual(exit_code, 1)
+        errors = json.loads(stdout)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['filename'], os.path.join(self.dirname, 'requirements.optional.txt'))
+        self.assertEqual(errors[0]['line_number'], 2)
+
+        exit_code, stdout, _ = self.run_main('validate', os.path.join(self.dirname, 'requirements.txt'))
+        self.assertEqual(exit_code, 0)
+
+        exit_code, _, stderr = self.run_main('validate', os.path.join(self.dirname, 'missing.txt'))
+        self.assertEqual(exit_code, 1)
+        self.assertIn('error', json.loads(stderr))
+
+    def test_digest(self):
+        exit_code, stdout, _ = self.run_main('digest', self.dirname)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(stdout), pkg_utils.get_dependencies_digest(self.dirname))
+
+        exit_code, stdout, _ = self.run_main('digest', self.dirname, '--evaluate-markers', '--option', 'tests')
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(stdout), pkg_utils.digest_dependencies(['req2'], {'tests': []}, [], options=['tests']))
+
+        exit_code, _, stderr = self.run_main('digest', self.dirname, '--option', 'undefined')
+        self.assertEqual(exit_code, 1)
+        self.assertIn('error', json.loads(stderr))
+
+    def test_index(self):
+        with open(os.path.join(self.dirname, 'setup.py'), 'w') as file:
+            pass
+        filename = os.path.join(self.dirname, 'index.sqlite')
+
+        exit_code, stdout, _ = self.run_main('index', 'update', filename, self.dirname)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(stdout), {'added': [self.dirname], 'updated': [], 'removed': [], 'errors': {}})
+
+        exit_code, stdout, _ = self.run_main('index', 'dependents', filename, 'REQ1', '--option', 'install_requires')
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(stdout), [{
+            'package_name': 'package',
+            'dirname': self.dirname,
+            'option': 'install_requires',
+            'requirement': 'req1 >= 1.0; python_version < "3"',
+            'pinned_version': None,
+        }])
+
+        exit_code, stdout, _ = self.run_main('index', 'pins', filename)
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(stdout), [])
+
+        with open(os.path.join(self.dirname, 'requirements.optional.txt'), 'w') as file:
+            file.write('[docs]\nreq3\n')
+        exit_code, stdout, _ = self.run_main('index', 'update', filename, self.dirname)
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(list(json.loads(stdout)['errors'].keys()), [self.dirname])
+
+        exit_code, _, stderr = self.run_main('index', 'pins', os.path.join(self.dirname, 'missing', 'index.sqlite'))
+        self.assertEqual(exit_code, 1)
+        self.assertIn('error', json.loads(stderr))
+
+    def test_commands(self):
+        exit_code, stdout, _ = self.run_main('version', self.dirname, 'package')
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(json.loads(stdout), '0.0.1')
+
+        _, stdout, _ = self.run_main('deps', self.dirname)
+        self.assertEqual(json.loads(stdout)['install_requires'], ['req1 >= 1.0; python_version < "3"', 'req2'])
+
+        _, stdout, _ = self.run_main('deps', self.dirname, '--evaluate-markers')
+        self.assertEqual(json.loads(stdout)['install_requires'], ['req2'])
+
+        _, stdout, _ = self.run_main('deps', self.dirname, '--no-specs', '--no-markers')
+        self.assertEqual(json.loads(stdout)['install_requires'], ['req1', 'req2'])
+
+        _, stdout, _ = self.run_main('package-data', self.dirname, '--package-data', 'package:*.txt')
+        self.assertEqual(json.loads(stdout), {'package': ['data.txt']})
+
+        _, stdout, _ = self.run_main('readme', self.dirname)
+        self.assertEqual(json.loads(stdout), 'Test\n====\n')
+
+        _, stdout, _ = self.run_main('metadata', self.dirname, 'package', '--package-data', 'package:*.txt')
+        md = json.loads(stdout)
+        self.assertEqual(md['version'], '0.0.1')
+        self.assertEqual(md['package_data'], {'package': ['data.txt']})
+        self.assertEqual(md['extras_require'], {'tests': [], 'docs': [], 'all': []})
+
+    def test_errors(self):
+        exit_code, stdout, stderr = self.run_main('package-data', self.dirname, '--package-data', 'package')
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(stdout, '')
+        self.assertIn('MODULE:PATTERN', json.loads(stderr)['error'])
+
+        with open(os.path.join(self.dirname, 'requirements.txt'), 'w') as file:
+            file.write('-e git+https://github.com/opt/req1.git#egg=req1\n')
+        exit_code, _, stderr = self.run_main('deps', self.dirname)
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(json.loads(stderr)['error'], 'Editable option is not supported')
+
+        exit_code, _, _ = self.run_main('daemon', 'start')
+        self.assertEqual(exit_code, 2)
+
+    def test_daemon(self):
+        socket_path = os.path.join(self.dirname, 'daemon.sock')
+
+        # without a running daemon, queries are answered in-process
+        _, stdout, _ = self.run_main('--socket', socket_path, 'version', self.dirname, 'package')
+        self.assertEqual(json.loads(stdout), '0.0.1')
+        self.assertEqual(self.run_main('--socket', socket_path, 'daemon', 'stop')[0], 0)
+
+        thread = threading.Thread(target=__main__.main, args=(['--socket', socket_path, 'daemon', 'start'],))
+        thread.start()
+        while not os.path.exists(socket_path):
+            time.sleep(0.01)
+
+        try:
+            _, stdout, _ = self.run_main('--socket', socket_path, 'version', self.dirname, 'package')
+            self.assertEqual(json.loads(stdout), '0.0.1')
+
+            with open(os.path.join(self.dirname, 'requirements.txt'), 'w') as file:
+                file.write('-e git+https://github.com/opt/req1.git#egg=req1\n')
+            exit_code, _, stderr = self.run_main('--socket', socket_path, 'deps', self.dirname)
+            self.assertEqual(exit_code, 1)
+            self.assertEqual(json.loads(stderr)['error'], 'Editable option is not supported')
+        finally:
+            self.assertEqual(self.run_main('--socket', socket_path, 'daemon', 'stop')[0], 0)
+            thread.join()
@@ -0,0 +1,93 @@
+""" Tests for the package data manifests
+
+:License: MIT
+"""
+
+from pkg_utils import manifest
+from unittest import mock
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class ManifestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        os.makedirs(os.path.join(dirname, 'pkg', 'data', 'subdir'))
+        self.write('pkg/data/file1.txt', b'abc')
+        self.write('pkg/data/subdir/file2.bin', b'\x00' * (manifest.MMAP_THRESHOLD + 10))
+        self.write('pkg/data/empty.txt', b'')
+        self.manifest_filename = os.path.join(dirname, 'manifest.json')
+        self.patterns = {'pkg': ['data/**/*']}
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, filename, content):
+        filename = os.path.join(self.dirname, filename)
+        mtime = os.stat(filename).st_mtime + 10 if os.path.exists(filename) else None
+        with open(filename, 'wb') as file:
+            file.write(content)
+        if mtime:
+            os.utime(filename, (mtime, mtime))
+
+    def test_get_package_data_manifest(self):
+        md = manifest.get_package_data_manifest(self.dirname, self.patterns)
+        self.assertEqual(sorted(md.keys()), ['pkg'])
+        self.assertEqual(sorted(md['pkg'].keys()), [
+            os.path.join('data', 'empty.txt'),
+            os.path.join('data', 'file1.txt'),
+            os.path.join('data', 'subdir', 'file2.bin'),
+        ])
+        entry = md['pkg'][os.path.join('data', 'file1.txt')]
+        self.assertEqual(entry['size'], 3)
+        self.assertEqual(entry['mtime_ns'], os.stat(os.path.join(self.dirname, 'pkg', 'data', 'file1.txt')).st_mtime_ns)
+        self.assertEqual(entry['blake2b'], hashlib.blake2b(b'abc').hexdigest())
+        self.assertEqual(md['pkg'][os.path.join('data', 'subdir', 'file2.bin')]['blake2b'],
+                         hashlib.blake2b(b'\x00' * (manifest.MMAP_THRESHOLD + 10)).hexdigest())
+        self.assertEqual(md['pkg'][os.path.join('data', 'empty.txt')]['blake2b'], hashlib.blake2b(b'').hexdigest())
+
+        self.assertEqual(manifest.get_package_data_manifest(self.dirname, self.patterns, max_workers=4), md)
+        self.assertEqual(manifest.get_package_data_manifest(self.dirname), {})
+
+    def test_incremental(self):
+        old = manifest.get_package_data_manifest(self.dirname, self.patterns, manifest_filename=self.manifest_filename)
+        self.assertEqual(manifest.read_package_data_manifest(self.manifest_filename), old)
+
+        # unchanged manifests aren't rewritten
+        os.utime(self.manifest_filename, (0, 0))
+        self.assertEqual(manifest.get_package_data_manifest(self.dirname, self.patterns,
+                                                            manifest_filename=self.manifest_filename), old)
+        self.assertEqual(os.stat(self.manifest_filename).st_mtime, 0)
+
+        self.write('pkg/data/file1.txt', b'def')
+        self.write('pkg/data/file3.txt', b'ghi')
+        os.remove(os.path.join(self.dirname, 'pkg', 'data', 'empty.txt'))
+
+        with mock.patch.object(manifest, 'hash_file', side_effect=manifest.hash_file) as hash_file:
+            new = manifest.get_package_data_manifest(self.dirname, self.patterns, manifest_filename=self.manifest_filename)
+        self.assertEqual(sorted(os.path.relpath(call[0][0], self.dirname) for call in hash_file.call_args_list), [
+            os.path.join('pkg', 'data', 'file1.txt'),
+            os.path.join('pkg', 'data', 'file3.txt'),
+        ])
+
+        self.assertEqual(manifest.diff_package_data_manifests(old, new), {
+            'pkg': {
+                'added': [os.path.join('data', 'file3.txt')],
+                'removed': [os.path.join('data', 'empty.txt')],
+                'changed': [os.path.join('data', 'file1.txt')],
+                'unchanged': [os.path.join('data', 'subdir', 'file2.bin')],
+            },
+        })
+        self.assertEqual(manifest.diff_package_data_manifests({}, {}), {})
+
+    def test_read_package_data_manifest(self):
+        self.assertEqual(manifest.read_package_data_manifest(self.manifest_filename), {})
+
+        with open(self.manifest_filename, 'w') as file:
+            json.dump({'version': 0, 'files': {'pkg': {}}}, file)
+        self.assertEqual(manifest.read_package_data_manifest(self.manifest_filename), {})
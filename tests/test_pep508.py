@@ -0,0 +1,280 @@
+""" Tests for the parser for the lines of pip requirements files
+
+:License: MIT
+"""
+
+from pkg_utils import pep508
+from unittest import mock
+import itertools
+import pkg_utils
+import re
+import sys
+import time
+import unittest
+
+try:
+    import requirements.parser
+except ImportError:  # pragma: no cover
+    requirements = None  # pragma: no cover
+
+# corpus of requirement lines for differential testing against requirements-parser
+CORPUS = [
+    'req1',
+    'req1 ',
+    '  req1',
+    'Req1',
+    'req1.sub',
+    'req_1',
+    'req-1',
+    'req1 #comment',
+    'req1#comment',
+    'req1 >= 1.0',
+    'req1>=1.0',
+    'req1 >= 1.0, < 2.0',
+    'req1 >=1.0,<2.0,!=1.5',
+    'req1 (>= 1.0, < 2.0)',
+    'req1 == 1.0.*',
+    'req1 != 1.0.*',
+    'req1 ~= 1.0',
+    'req1 ~= 1',
+    'req1 === foo',
+    'req1 === 1.0; python_version >= "3"',
+    'req1 == 1.0+local',
+    'req1 >= 1.0+local',
+    'req1 >= 1.0.*',
+    'req1 == 1.0rc1.*',
+    'req1 >= v1.0',
+    'req1 >= 1.0a1',
+    'req1 >= 1.0.post1.dev2',
+    'req1 >= 1.0-1',
+    'req1 >= 1!1.0',
+    'req1 >=',
+    'req1 >= foo',
+    'req1 >> 1.0',
+    'req1 1.0',
+    'req1 >= 1.0 <= 2.0',
+    'req1 (>= 1.0',
+    'req1[extra]',
+    'req1 [ extra1 , extra2 ]',
+    'req1[Extra1,extra2]',
+    'req1[extra1,Extra1]',
+    'req1[extra1 extra2]',
+    'req1[extra1,]',
+    'req1[]',
+    'req1[extra1',
+    'req1[extra1] >= 1.0; python_version < "3"',
+    'req1; python_version >= "2.7"',
+    'req1 ; python_version >= "2.7"',
+    'req1;python_version>="2.7"',
+    'req1; python_version >= "2.7" and sys_platform == "linux"',
+    'req1; (python_version >= "2.7" or os_name == "nt") and platform_machine != "x86"',
+    'req1; os.name == "nt"',
+    "req1; 'linux' in sys_platform",
+    'req1; "linux" not in sys_platform',
+    'req1; "linux" notin sys_platform',
+    'req1; extra == "test"',
+    'req1; python_version >>> "3"',
+    'req1; python_version',
+    'req1; unknown_var == "3"',
+    'req1; python_version >= "3" # comment',
+    'req1; python_version >= "3" or',
+    'req1; (python_version >= "3"',
+    'req1; python_version >= 3',
+    'req1; python_version >= "3',
+    'req1 @ https://example.com/req1.tar.gz',
+    'req1 @ https://example.com/req1.tar.gz ; python_version >= "3"',
+    'req1 @ https://example.com/req1.tar.gz python_version',
+    'req1 @',
+    'req1[extra] @ https://example.com/req1.tar.gz',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1',
+    'git+https://github.com/opt/req1.git#egg=req1',
+    'git+https://github.com/opt/req1.git',
+    'git+https://github.com/opt/req1.git@branch#egg=req1-1.0.1',
+    'git+https://github.com/opt/req1.git@v1.0#egg=req1-1.0.1 #comment',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1[extra1,extra2]',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1[extra1, extra2]; python_version >= "2.7"',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1 ; python_version >= "2.7"',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1 ; python_version >>> "2.7"',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1 >= 1.0',
+    'git+https://github.com/opt/req1.git#egg=Req1-1.0.1',
+    'git+https://github.com/opt/req1.git#EGG=req1-1.0.1RC1',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1&subdirectory=sub/dir',
+    'git+https://github.com/opt/req1.git#subdirectory=sub/dir&egg=req1-1.0.1',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1&sha256=abc123',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1&subdirectory=sub&md5=abc&sha1=def',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1&invalid',
+    'git+https://github.com/opt/req1.git#egg=req1-1.0.1&a=b=c',
+    'git+https://user@github.com/opt/req1.git#egg=req1-1.0.1',
+    'git+ssh://git@github.com/opt/req1.git@master#egg=req1-1.0.1',
+    'git://github.com/opt/req1.git#egg=req1-1.0.1',
+    'hg+https://hg.example.com/req1#egg=req1-1.0.1',
+    'svn+https://svn.example.com/req1/trunk@123#egg=req1-1.0.1',
+    'bzr+lp:req1#egg=req1-1.0.1',
+    'req1 @ git+https://github.com/opt/req1.git#egg=req1-1.0.1',
+    'req1[extra1] @ git+https://github.com/opt/req1.git@branch#egg=req2-1.0.1',
+    'https://example.com/req1.tar.gz#egg=req1-1.0.1',
+    'https://example.com/req1.tar.gz',
+    'https://example.com/req1.tar.gz#sha256=abc123',
+    'https://example.com/req1.tar.gz#egg=req1-1.0.1&sha256=abc123',
+    'ftp://example.com/req1.tar.gz#egg=req1-1.0.1',
+    'file:///path/to/req1#egg=req1-1.0.1',
+    './path/to/req1#egg=req1-1.0.1',
+    './path/to/req1#egg=req1',
+    './path/to/req1#egg=req1[extra1]',
+    '/path/to/req1#egg=req1&subdirectory=sub',
+    './path/to/req1',
+    '-e git+https://github.com/opt/req1.git#egg=req1-1.0.1',
+    '-e ./path/to/req1',
+    '-r other.txt',
+    '--index-url https://example.com',
+    '[extra]',
+    '<<<',
+    '',
+    '#',
+]
+
+
+def reference_parse_line(line):
+    """ Parse a line with requirements-parser, extracting egg version hints as :obj:`pkg_utils.core` did
+    before it had its own parser
+    """
+    egg_version_hint_regex = re.compile(r'egg=([a-z0-9_]+)\-([a-z0-9\.]+)', re.IGNORECASE)
+    match = egg_version_hint_regex.search(line)
+    if match:
+        version_hint = match.group(2)
+        line = egg_version_hint_regex.sub(r'egg=\1', line)
+    else:
+        version_hint = None
+    req = requirements.parser.Requirement.parse_line(line)
+    req.version_hint = version_hint
+    return req
+
+
+def get_error(exception):
+    """ Get the location of a parse error, without its message, which varies among the versions of packaging
+
+    Args:
+        exception (:obj:`ValueError`): parse error
+
+    Returns:
+        :obj:`tuple`: class of the error and the lines of its message which mark the location of the error
+    """
+    lines = str(exception).split('\n')
+    if len(lines) == 3:
+        return (ValueError, lines[1], lines[2])
+    return (ValueError, str(exception))
+
+
+def get_fields(req):
+    return {
+        'line': req.line,
+        'editable': req.editable,
+        'local_file': req.local_file,
+        'specifier': req.specifier,
+        'vcs': req.vcs,
+        'name': req.name,
+        'subdirectory': req.subdirectory,
+        'uri': req.uri,
+        'path': req.path,
+        'revision': req.revision,
+        'hash_name': req.hash_name,
+        'hash': req.hash,
+        'extras': sorted(req.extras),
+        'specs': sorted(req.specs),
+        'version_hint': req.version_hint,
+    }
+
+
+class Pep508TestCase(unittest.TestCase):
+
+    def test_parse_line(self):
+        req = pep508.parse_line('git+https://user@github.com/opt/req1.git@v1.0#egg=req1-1.0.1[opt1,opt2]'
+                                '&subdirectory=sub&sha256=abc ; python_version >= "3"')
+        self.assertEqual(req.uri, 'git+https://user@github.com/opt/req1.git')
+        self.assertEqual(req.vcs, 'git')
+        self.assertEqual(req.revision, 'v1.0')
+        self.assertEqual(req.name, 'req1')
+        self.assertEqual(req.extras, ['opt1', 'opt2'])
+        self.assertEqual(req.version_hint, '1.0.1')
+        self.assertEqual(req.subdirectory, 'sub')
+        self.assertEqual((req.hash_name, req.hash), ('sha256', 'abc'))
+        self.assertFalse(req.local_file)
+
+        req = pep508.parse_line('Req1[Opt1] (>= 1.0, != 1.5.*) ; python_version >= "3" and extra == "test"')
+        self.assertTrue(req.specifier)
+        self.assertEqual(req.name, 'Req1')
+        self.assertEqual(req.extras, ['opt1'])
+        self.assertEqual(sorted(req.specs), [('!=', '1.5.*'), ('>=', '1.0')])
+
+        # duplicate specifiers are preserved (older versions of packaging deduplicate them)
+        req = pep508.parse_line('req1 >= 1.0, >= 1.0')
+        self.assertEqual(req.specs, [('>=', '1.0'), ('>=', '1.0')])
+
+        req = pep508.parse_line('./path/to/req1#egg=req1-1.0.1')
+        self.assertTrue(req.local_file)
+        self.assertEqual(req.path, './path/to/req1')
+        self.assertEqual(req.name, 'req1')
+
+    def test_parse_line_errors(self):
+        with self.assertRaisesRegex(pep508.InvalidRequirement, '^Expected package name at the start of dependency specifier\n'
+                                    '    -r other.txt\n'
+                                    '    \\^$'):
+            pep508.parse_line('-r other.txt')
+        with self.assertRaisesRegex(pep508.InvalidRequirement, '^Expected matching RIGHT_PARENTHESIS for LEFT_PARENTHESIS, '
+                                    'after version specifier\n'
+                                    '    req1 \\(>= 1.0\n'
+                                    '         ~~~~~~~\\^$'):
+            pep508.parse_line('req1 (>= 1.0')
+        with self.assertRaisesRegex(ValueError, '^Invalid fragment string'):
+            pep508.parse_line('git+https://github.com/opt/req1.git#egg=req1&invalid')
+
+    @unittest.skipIf(requirements is None, 'Differential tests require requirements-parser')
+    def test_differential(self):
+        for line in CORPUS:
+            try:
+                expected = get_fields(reference_parse_line(line))
+            except ValueError as exception:
+                expected = get_error(exception)
+
+            try:
+                result = get_fields(pep508.parse_line(line))
+            except ValueError as exception:
+                result = get_error(exception)
+
+            self.assertEqual(result, expected, line)
+
+    @unittest.skipIf(requirements is None, 'Differential tests require requirements-parser')
+    def test_differential_parse_requirement_line(self):
+        for line, options in itertools.product(CORPUS, itertools.product([False, True], repeat=4)):
+            kwargs = dict(zip(['include_uri', 'include_extras', 'include_specs', 'include_markers'], options))
+
+            with mock.patch('pkg_utils.core.pep508.parse_line', side_effect=reference_parse_line):
+                try:
+                    expected = pkg_utils.core.parse_requirement_line(line, **kwargs)
+                except ValueError as exception:
+                    expected = get_error(exception)
+
+            try:
+                result = pkg_utils.core.parse_requirement_line(line, **kwargs)
+            except ValueError as exception:
+                result = get_error(exception)
+
+            self.assertEqual(result, expected, (line, kwargs))
+
+    @unittest.skipIf(requirements is None, 'Benchmark requires requirements-parser')
+    def test_benchmark(self):
+        lines = []
+        for i_line in range(2500):
+            lines.append('req{} >= 1.0, < 2.0'.format(i_line))
+            lines.append('req{}[extra1] ; python_version >= "3" and sys_platform == "linux"'.format(i_line))
+            lines.append('git+https://github.com/opt/req{0}.git@branch#egg=req{0}-{0}.1.2'.format(i_line))
+            lines.append('req{} ~= 1.0'.format(i_line))
+
+        # the durations vary among machines, so they are reported rather than compared
+        results = {}
+        for name, parse_line in [('reference', reference_parse_line), ('native', pep508.parse_line)]:
+            start = time.time()
+            results[name] = [get_fields(parse_line(line)) for line in lines]
+            sys.stderr.write('Parsed {} lines with the {} parser in {:.3f} s\n'.format(
+                len(lines), name, time.time() - start))
+        self.assertEqual(results['native'], results['reference'])
@@ -0,0 +1,107 @@
+""" Tests for the metadata of packages at git revisions
+
+:License: MIT
+"""
+
+from pkg_utils import revisions
+from unittest import mock
+import os
+import pkg_utils
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+
+class RevisionsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        self.package_dirname = os.path.join(dirname, 'packages', 'pkg')
+        os.makedirs(os.path.join(self.package_dirname, 'pkg'))
+        os.makedirs(os.path.join(self.package_dirname, 'tests'))
+        self.git('init', '-q')
+
+        self.write('README.rst', 'Test\n====\n')
+        self.write('pkg/_version.py', "__version__ = '0.0.1'\n")
+        self.write('requirements.txt', 'req1\nreq2 >= 1.0\n')
+        self.write('requirements.optional.txt', '[opt]\nreq3\n')
+        self.write('tests/requirements.txt', 'req4\n')
+        self.commit('v1')
+
+        self.write('pkg/_version.py', "__version__ = '0.0.2'\n")
+        self.write('requirements.txt', '# comment\nreq2 >= 1.1\nreq1\n')
+        self.write('requirements.optional.txt', '[opt]\nreq3\n[opt2]\nreq5\n')
+        os.remove(os.path.join(self.package_dirname, 'tests', 'requirements.txt'))
+        self.commit('v2')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def git(self, *args):
+        return subprocess.check_output(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com'] + list(args),
+                                       cwd=self.dirname).decode().strip()
+
+    def write(self, path, content):
+        with open(os.path.join(self.package_dirname, path), 'w') as file:
+            file.write(content)
+
+    def commit(self, tag):
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', tag)
+        self.git('tag', tag)
+
+    def test_get_revision_metadata(self):
+        md = revisions.get_revision_metadata(self.dirname, 'v1', 'pkg', package_dirname='packages/pkg')
+        self.assertEqual(md.long_description, 'Test\n====\n')
+        self.assertEqual(md.version, '0.0.1')
+        self.assertEqual(md.install_requires, ['req1', 'req2 >= 1.0'])
+        self.assertEqual(md.tests_require, ['req4'])
+        self.assertEqual(md.extras_require['opt'], ['req3'])
+
+        # the metadata matches the metadata of the checked out revision
+        md = revisions.get_revision_metadata(self.dirname, 'HEAD', 'pkg', package_dirname='packages/pkg')
+        checked_out_md = pkg_utils.get_package_metadata(self.package_dirname, 'pkg')
+        for attr in ['long_description', 'version', 'install_requires', 'extras_require', 'tests_require',
+                     'dependency_links']:
+            self.assertEqual(getattr(md, attr), getattr(checked_out_md, attr))
+
+        md = revisions.get_revision_metadata(self.dirname, 'v1', 'other')
+        self.assertEqual(md.long_description, '')
+        self.assertEqual(md.version, None)
+        self.assertEqual(md.install_requires, [])
+
+        with self.assertRaisesRegex(ValueError, 'Revision v3 does not exist'):
+            revisions.get_revision_metadata(self.dirname, 'v3', 'pkg')
+
+    def test_diff_revision_metadata(self):
+        diff = revisions.diff_revision_metadata(self.dirname, 'v1', 'v2', 'pkg', package_dirname='packages/pkg')
+        self.assertEqual(diff, {
+            'version': {'old': '0.0.1', 'new': '0.0.2'},
+            'install_requires': {'added': ['req2 >= 1.1'], 'removed': ['req2 >= 1.0']},
+            'tests_require': {'added': [], 'removed': ['req4']},
+            'extras_require': {
+                'all': {'added': ['req5'], 'removed': ['req4']},
+                'opt2': {'added': ['req5'], 'removed': []},
+                'tests': {'added': [], 'removed': ['req4']},
+            },
+        })
+        self.assertEqual(revisions.diff_revision_metadata(self.dirname, 'v2', 'HEAD', 'pkg',
+                                                          package_dirname='packages/pkg'), {})
+
+    def test_git_cat_file(self):
+        v2_hash = self.git('rev-parse', 'v2')
+
+        # a single process serves the queries of many revisions
+        with mock.patch('subprocess.Popen', wraps=subprocess.Popen) as popen:
+            with revisions.GitCatFile(self.dirname) as cat_file:
+                for revision in ['v1', 'v2', 'HEAD']:
+                    revisions.get_revision_metadata(self.dirname, revision, 'pkg', package_dirname='packages/pkg',
+                                                    cat_file=cat_file)
+                self.assertEqual(cat_file.read('v1:packages/pkg/pkg/_version.py'), ('blob', b"__version__ = '0.0.1'\n"))
+                self.assertEqual(cat_file.read('v1:packages/pkg/pkg')[0], 'tree')
+                self.assertEqual(cat_file.read('v1:missing file.txt'), (None, None))
+                self.assertEqual(cat_file.resolve('v2'), v2_hash)
+                with self.assertRaisesRegex(ValueError, 'cannot contain newlines'):
+                    cat_file.read('v1:\nv2:')
+        self.assertEqual(popen.call_count, 1)
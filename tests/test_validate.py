@@ -0,0 +1,115 @@
+""" Tests for the validation of requirements files
+
+:License: MIT
+"""
+
+from pkg_utils import validate
+from unittest import mock
+import os
+import pkg_utils
+import shutil
+import tempfile
+import unittest
+
+
+class ValidateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, content, *path):
+        filename = os.path.join(self.dirname, *path)
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as file:
+            file.write(content)
+        return filename
+
+    def test_validate_requirements_file(self):
+        filename = self.write(
+            '# comment\n'
+            'req1 >= 1.0\n'
+            '\n'
+            'req2 >=\n'
+            'req3; python_version >>> "3"\n'
+            '-e git+https://github.com/opt/req4.git#egg=req4-1.0\n'
+            'git+https://github.com/opt/req5.git#egg=req5\n'
+            'req6\n',
+            'requirements.txt')
+        errors = validate.validate_requirements_file(filename)
+        self.assertEqual([error.line_number for error in errors], [4, 5, 6, 7])
+        self.assertEqual(errors[0].filename, filename)
+        self.assertEqual(errors[0].line, 'req2 >=')
+        self.assertEqual(errors[3].message, 'Version hints must be provided for packages from non-PyPI sources')
+        self.assertEqual(str(errors[3]), '{}:7:37: missing-version-hint: Version hints must be provided for packages '
+                         'from non-PyPI sources'.format(filename))
+        self.assertNotIn('\n', errors[0].message)
+
+        self.assertEqual(validate.validate_requirements_file(self.write('req1\n', 'requirements.txt')), [])
+
+    def test_validate_optional_requirements_file(self):
+        filename = self.write(
+            'req1\n'
+            '[option1]\n'
+            'req2\n'
+            'req3 >=\n'
+            '[option 2]\n'
+            '[option3]\n'
+            'req4\n',
+            'requirements.optional.txt')
+        errors = validate.validate_requirements_file(filename)
+        self.assertEqual([error.line_number for error in errors], [1, 4, 5])
+        self.assertTrue(errors[0].message.startswith('Required dependencies should not be placed'))
+        self.assertTrue(errors[2].message.startswith('Could not parse optional dependency'))
+
+        errors = validate.validate_requirements_file(filename, optional=False)
+        self.assertEqual([error.line_number for error in errors], [2, 4, 5, 6])
+
+    def test_validate_requirements_files(self):
+        self.write('req1\nreq2 >=\n', 'requirements.txt')
+        self.write('req1\n[opt]\nreq2 >=\n', 'requirements.optional.txt')
+        self.write('req1 >=\n', 'tests', 'requirements.txt')
+        self.write('req1\n', 'docs', 'requirements.txt')
+        self.write('req1 >=\n', 'requirements-dev.txt')
+        self.write('req1 >=\n', 'node_modules', 'pkg', 'requirements.txt')
+        self.write('req1 >=\n', 'other.txt')
+        os.symlink('..', os.path.join(self.dirname, 'tests', 'up'))
+
+        self.assertEqual(validate.find_requirements_files(self.dirname, max_workers=2), sorted([
+            os.path.join(self.dirname, 'requirements.txt'),
+            os.path.join(self.dirname, 'requirements.optional.txt'),
+            os.path.join(self.dirname, 'requirements-dev.txt'),
+            os.path.join(self.dirname, 'tests', 'requirements.txt'),
+            os.path.join(self.dirname, 'docs', 'requirements.txt'),
+        ]))
+
+        for max_workers in [None, 1, 4]:
+            errors = pkg_utils.validate_requirements_files(self.dirname, max_workers=max_workers)
+            self.assertEqual([(os.path.relpath(error.filename, self.dirname), error.line_number) for error in errors], [
+                ('requirements-dev.txt', 1),
+                ('requirements.optional.txt', 1),
+                ('requirements.optional.txt', 3),
+                ('requirements.txt', 2),
+                (os.path.join('tests', 'requirements.txt'), 1),
+            ])
+
+        errors = pkg_utils.validate_requirements_files(filenames=[os.path.join(self.dirname, 'other.txt')])
+        self.assertEqual(errors, [pkg_utils.RequirementError(os.path.join(self.dirname, 'other.txt'), 1, 'req1 >=',
+                                                             errors[0].message, column=6, code='invalid-syntax')])
+        self.assertIn("RequirementError(", repr(errors[0]))
+
+    def test_validate_many_requirements_files(self):
+        n_files = 500
+        for i_file in range(n_files):
+            self.write('req{0}_a >= 1.0\nreq{0}_b; python_version >= "3"\n'.format(i_file), 'pkg{}'.format(i_file), 'requirements.txt')
+
+        # each file is parsed once in process, without running pip or other subprocesses
+        with mock.patch.object(validate, 'parse_requirements_file',
+                               wraps=validate.parse_requirements_file) as parse_requirements_file:
+            with mock.patch('subprocess.Popen', side_effect=AssertionError('subprocesses should not be run')):
+                errors = pkg_utils.validate_requirements_files(self.dirname)
+        self.assertEqual(errors, [])
+        self.assertEqual(parse_requirements_file.call_count, n_files)
@@ -0,0 +1,175 @@
+""" Tests for the pool of virtual environments
+
+:License: MIT
+"""
+
+from pkg_utils import venv_pool
+from test_wheelhouse import make_wheel
+from unittest import mock
+import concurrent.futures
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import unittest
+
+
+class VenvPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        self.wheelhouse = os.path.join(dirname, 'wheelhouse')
+        os.mkdir(self.wheelhouse)
+        make_wheel(self.wheelhouse, 'pkg_utils_test_a', '1.0')
+        make_wheel(self.wheelhouse, 'pkg_utils_test_b', '1.0')
+        self.pool = venv_pool.VenvPool(os.path.join(dirname, 'pool'), with_pip=False, find_links=self.wheelhouse)
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def import_version(self, env_dirname, module):
+        return subprocess.check_output([os.path.join(env_dirname, 'bin', 'python'), '-c',
+                                        'import {0}; print({0}.__version__)'.format(module)]).decode().strip()
+
+    def test_get_key(self):
+        extras_require = {'opt': ['pkg_utils_test_b'], 'opt2': ['PKG-utils-test-b']}
+        key = self.pool.get_key(['pkg_utils_test_a'], extras_require=extras_require, options=['opt'])
+        self.assertEqual(self.pool.get_key(['Pkg_Utils_Test_A'], extras_require=extras_require, options=['opt2']), key)
+        self.assertNotEqual(self.pool.get_key(['pkg_utils_test_a'], extras_require=extras_require), key)
+        self.assertNotEqual(venv_pool.VenvPool(self.pool.dirname).get_key(
+            ['pkg_utils_test_a'], extras_require=extras_require, options=['opt']), key)
+
+    def test_acquire(self):
+        with mock.patch.object(self.pool, '_build', wraps=self.pool._build) as build:
+            with self.pool.acquire(['pkg_utils_test_a'], extras_require={'opt': ['pkg_utils_test_b']},
+                                   options=['opt']) as env_dirname:
+                self.assertEqual(self.import_version(env_dirname, 'pkg_utils_test_a'), '1.0')
+                self.assertEqual(self.import_version(env_dirname, 'pkg_utils_test_b'), '1.0')
+            self.assertEqual(build.call_count, 1)
+
+            # equivalent dependencies reuse the environment
+            with self.pool.acquire(['pkg_utils_test_a', 'pkg-utils-test-b']) as other_env_dirname:
+                self.assertEqual(other_env_dirname, env_dirname)
+            self.assertEqual(build.call_count, 1)
+
+        index = self.pool.get_index()
+        self.assertEqual(list(index.keys()), [os.path.basename(env_dirname)])
+        self.assertGreater(index[os.path.basename(env_dirname)]['size'], 0)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.pool.dirname, 'envs'))), [os.path.basename(env_dirname)])
+
+        # the paths of environments are updated when they are moved into the pool
+        with open(os.path.join(env_dirname, 'bin', 'activate'), 'r') as file:
+            self.assertIn(env_dirname, file.read())
+
+    def test_acquire_concurrently(self):
+        def acquire(_):
+            with self.pool.acquire(['pkg_utils_test_a']) as env_dirname:
+                return env_dirname
+
+        with mock.patch.object(self.pool, '_build', wraps=self.pool._build) as build:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                env_dirnames = list(executor.map(acquire, range(4)))
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(len(set(env_dirnames)), 1)
+
+    def test_acquire_fresh_key_concurrently(self):
+        # both jobs use the environment at the same time once one of them has built it
+        barrier = threading.Barrier(2, timeout=60)
+
+        def acquire(_):
+            with self.pool.acquire(['pkg_utils_test_b']) as env_dirname:
+                self.assertTrue(os.path.isdir(env_dirname))
+                barrier.wait()
+                return env_dirname
+
+        with mock.patch.object(self.pool, '_build', wraps=self.pool._build) as build:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                env_dirnames = list(executor.map(acquire, range(2)))
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual(len(set(env_dirnames)), 1)
+        key = os.path.basename(env_dirnames[0])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.pool.dirname, 'locks'))),
+                         [key + '.build.lock', key + '.lock'])
+
+    def test_build_error(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            with self.pool.acquire(['pkg_utils_test_c']):
+                pass  # pragma: no cover
+        self.assertEqual(os.listdir(os.path.join(self.pool.dirname, 'envs')), [])
+        self.assertEqual(self.pool.get_index(), {})
+
+    def test_clone(self):
+        for hardlink in [False, True]:
+            dest = os.path.join(self.dirname, 'env-{}'.format(hardlink))
+            self.assertEqual(self.pool.clone(dest, ['pkg_utils_test_a'], hardlink=hardlink), dest)
+            self.assertEqual(self.import_version(dest, 'pkg_utils_test_a'), '1.0')
+            with open(os.path.join(dest, 'bin', 'activate'), 'r') as file:
+                content = file.read()
+            self.assertIn(dest, content)
+            self.assertNotIn(self.pool.dirname, content)
+            with open(os.path.join(dest, 'pyvenv.cfg'), 'r') as file:
+                self.assertNotIn(self.pool.dirname, file.read())
+
+        with self.assertRaisesRegex(ValueError, 'already exists'):
+            self.pool.clone(dest, ['pkg_utils_test_a'])
+
+    def test_evict(self):
+        self.assertEqual(self.pool.evict(), [])
+
+        with self.pool.acquire(['pkg_utils_test_a']) as env_dirname_a:
+            pass
+        with self.pool.acquire(['pkg_utils_test_b']) as env_dirname_b:
+            pass
+        key_a = os.path.basename(env_dirname_a)
+        key_b = os.path.basename(env_dirname_b)
+        size = sum(entry['size'] for entry in self.pool.get_index().values())
+
+        self.assertEqual(self.pool.evict(max_size=size), [])
+
+        # environments which are in use aren't evicted
+        with self.pool.acquire(['pkg_utils_test_a']):
+            self.assertEqual(self.pool.evict(max_size=0), [key_b])
+        self.assertFalse(os.path.isdir(env_dirname_b))
+        self.assertTrue(os.path.isdir(env_dirname_a))
+
+        # the least recently used environments are evicted when the pool exceeds its budget
+        self.pool.max_size = size - 1
+        with self.pool.acquire(['pkg_utils_test_b']):
+            pass
+        self.assertEqual(list(self.pool.get_index().keys()), [key_b])
+        self.assertFalse(os.path.isdir(env_dirname_a))
+        self.assertTrue(os.path.isdir(env_dirname_b))
+
+    def test_evict_error(self):
+        with self.pool.acquire(['pkg_utils_test_a']) as env_dirname:
+            pass
+        key = os.path.basename(env_dirname)
+
+        # environments which couldn't be deleted completely aren't used
+        with mock.patch('shutil.rmtree', side_effect=lambda path, ignore_errors=False: None):
+            self.assertEqual(self.pool.evict(max_size=0), [key])
+        self.assertFalse(os.path.isdir(env_dirname))
+        self.assertEqual(self.pool.get_index(), {})
+
+        with mock.patch.object(self.pool, '_build', wraps=self.pool._build) as build:
+            with self.pool.acquire(['pkg_utils_test_a']) as env_dirname:
+                self.assertEqual(self.import_version(env_dirname, 'pkg_utils_test_a'), '1.0')
+            self.assertEqual(build.call_count, 1)
+
+    def test_build_moves_complete_environments(self):
+        # the paths of the environment are updated before it is moved into the pool
+        rename = os.rename
+
+        def check_rename(src, dest):
+            with open(os.path.join(src, 'bin', 'activate'), 'r') as file:
+                content = file.read()
+            self.assertIn(dest, content)
+            self.assertNotIn(src, content)
+            rename(src, dest)
+
+        with mock.patch('os.rename', side_effect=check_rename) as mock_rename:
+            with self.pool.acquire(['pkg_utils_test_a']) as env_dirname:
+                pass
+        self.assertEqual(mock_rename.call_count, 1)
+        self.assertTrue(os.path.isdir(env_dirname))
@@ -0,0 +1,121 @@
+""" Tests for watching the inputs of package metadata
+
+:License: MIT
+"""
+
+from pkg_utils import __main__
+from pkg_utils import daemon
+from pkg_utils import watch
+from unittest import mock
+import contextlib
+import io
+import json
+import os
+import pkg_utils
+import shutil
+import tempfile
+import unittest
+
+
+class WatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        os.mkdir(os.path.join(dirname, 'package'))
+
+        self.write('package/_version.py', "__version__ = '0.0.1'")
+        self.write('README.rst', 'Test\n====\n')
+        self.write('requirements.txt', 'req1\n')
+        self.write('requirements.optional.txt', '[opt]\nreq2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def write(self, filename, content):
+        # advance the modification time so that changes within the resolution of the file system are detected
+        filename = os.path.join(self.dirname, filename)
+        mtime = os.stat(filename).st_mtime + 10 if os.path.exists(filename) else None
+        with open(filename, 'w') as file:
+            file.write(content)
+        if mtime:
+            os.utime(filename, (mtime, mtime))
+
+    def test_poll(self):
+        watcher = watch.Watcher(self.dirname, 'package', package_data_filename_patterns={'package': ['*.json']})
+        self.assertEqual(watcher.metadata.version, '0.0.1')
+        self.assertEqual(watcher.poll(), {})
+
+        with mock.patch.object(daemon, 'parse_requirements_file',
+                               side_effect=pkg_utils.parse_requirements_file) as parse_requirements_file:
+            with mock.patch.object(daemon, 'parse_optional_requirements_file',
+                                   side_effect=pkg_utils.parse_optional_requirements_file) as parse_optional_requirements_file:
+                self.write('requirements.optional.txt', '[opt]\nreq2\nreq3\n[opt2]\nreq4\n')
+                self.assertEqual(watcher.poll(), {
+                    'extras_require': {
+                        'all': {'added': ['req3', 'req4'], 'removed': []},
+                        'opt': {'added': ['req3'], 'removed': []},
+                        'opt2': {'added': ['req4'], 'removed': []},
+                    },
+                })
+                self.assertEqual(parse_requirements_file.call_count, 0)
+                self.assertEqual(parse_optional_requirements_file.call_count, 1)
+
+        self.write('requirements.txt', 'req1\nreq3\n')
+        self.write('package/_version.py', "__version__ = '0.0.2'")
+        self.write('package/data.json', '{}')
+        self.assertEqual(watcher.poll(), {
+            'install_requires': {'added': ['req3'], 'removed': []},
+            'extras_require': {
+                'all': {'added': [], 'removed': ['req3']},
+                'opt': {'added': [], 'removed': ['req3']},
+            },
+            'version': {'old': '0.0.1', 'new': '0.0.2'},
+            'package_data': {'package': {'added': ['data.json'], 'removed': []}},
+        })
+        self.assertEqual(watcher.metadata.version, '0.0.2')
+        self.assertEqual(watcher.poll(), {})
+
+    def test_watch(self):
+        watcher = watch.Watcher(self.dirname, 'package', convert_readme=True)
+        diffs = []
+        watcher.watch(diffs.append, interval=0., max_polls=1)
+        self.assertEqual(diffs, [])
+
+        self.write('README.rst', 'Test 2\n======\n')
+        watcher.watch(diffs.append, interval=0., max_polls=2)
+        self.assertEqual(diffs, [{'long_description': {'old': 'Test\n====\n', 'new': 'Test 2\n======\n'}}])
+
+    def test_watch_errors(self):
+        watcher = watch.Watcher(self.dirname, 'package')
+        diffs = []
+        errors = []
+
+        # invalid inputs are reported and the last valid metadata is kept
+        self.write('requirements.txt', 'req1\nreq3 >>> 1.0\n')
+        watcher.watch(diffs.append, interval=0., max_polls=2, error_callback=errors.append)
+        self.assertEqual(diffs, [])
+        self.assertEqual(len(errors), 2)
+        self.assertIsInstance(errors[0], ValueError)
+        self.assertEqual(watcher.metadata.install_requires, ['req1'])
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            watcher.watch(diffs.append, interval=0., max_polls=1)
+        self.assertIn('req3', stderr.getvalue())
+
+        # the changes are reported once the inputs are fixed
+        self.write('requirements.txt', 'req1\nreq3 >= 1.0\n')
+        watcher.watch(diffs.append, interval=0., max_polls=1, error_callback=errors.append)
+        self.assertEqual(diffs, [{'install_requires': {'added': ['req3 >= 1.0'], 'removed': []}}])
+        self.assertEqual(len(errors), 2)
+
+    def test_cli(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.assertEqual(__main__.main(['watch', self.dirname, 'package', '--interval', '0', '--max-polls', '1']), 0)
+        self.assertEqual(stdout.getvalue(), '')
+
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            self.assertEqual(__main__.main(['watch', self.dirname, 'package', '--package-data', 'package']), 1)
+        self.assertIn('MODULE:PATTERN', json.loads(stderr.getvalue())['error'])
@@ -0,0 +1,290 @@
+""" Tests for the wheelhouse utilities
+
+:License: MIT
+"""
+
+from pkg_utils import wheelhouse
+import base64
+import hashlib
+import json
+import os
+import pkg_utils
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+
+def make_wheel(dirname, name, version, requires=(), tag='py3-none-any', files=None):
+    """ Make a minimal wheel
+
+    Args:
+        dirname (:obj:`str`): directory to save the wheel
+        name (:obj:`str`): name of the project
+        version (:obj:`str`): version
+        requires (:obj:`list` of :obj:`str`, optional): requirements
+        tag (:obj:`str`, optional): compatibility tag
+        files (:obj:`dict` of :obj:`str`, optional): dictionary which maps paths to the content of files
+
+    Returns:
+        :obj:`str`: path to the wheel
+    """
+    dist_info = '{}-{}.dist-info'.format(name, version)
+    if files is None:
+        files = {'{}/__init__.py'.format(name): "__version__ = '{}'\n".format(version)}
+    files = dict(files)
+    files[dist_info + '/METADATA'] = ''.join(
+        ['Metadata-Version: 2.1\n', 'Name: {}\n'.format(name), 'Version: {}\n'.format(version)] +
+        ['Requires-Dist: {}\n'.format(require) for require in requires])
+    files[dist_info + '/WHEEL'] = 'Wheel-Version: 1.0\nGenerator: tests\nRoot-Is-Purelib: true\nTag: {}\n'.format(tag)
+
+    record = []
+    for path, content in sorted(files.items()):
+        digest = base64.urlsafe_b64encode(hashlib.sha256(content.encode()).digest()).rstrip(b'=').decode()
+        record.append('{},sha256={},{}\n'.format(path, digest, len(content.encode())))
+    record.append(dist_info + '/RECORD,,\n')
+    files[dist_info + '/RECORD'] = ''.join(record)
+
+    filename = os.path.join(dirname, '{}-{}-{}.whl'.format(name, version, tag))
+    with zipfile.ZipFile(filename, 'w') as archive:
+        for path, content in files.items():
+            archive.writestr(path, content)
+    return filename
+
+
+def make_sdist(dirname, name, version, requires=()):
+    """ Make a minimal source distribution
+
+    Args:
+        dirname (:obj:`str`): directory to save the source distribution
+        name (:obj:`str`): name of the project
+        version (:obj:`str`): version
+        requires (:obj:`list` of :obj:`str`, optional): requirements
+
+    Returns:
+        :obj:`str`: path to the source distribution
+    """
+    src_dirname = os.path.join(dirname, 'src', '{}-{}'.format(name, version))
+    os.makedirs(src_dirname)
+    with open(os.path.join(src_dirname, 'PKG-INFO'), 'w') as file:
+        file.write('Metadata-Version: 2.2\nName: {}\nVersion: {}\n'.format(name, version))
+        for require in requires:
+            file.write('Requires-Dist: {}\n'.format(require))
+
+    filename = os.path.join(dirname, '{}-{}.tar.gz'.format(name, version))
+    with tarfile.open(filename, 'w:gz') as archive:
+        archive.add(src_dirname, arcname='{}-{}'.format(name, version))
+    shutil.rmtree(os.path.join(dirname, 'src'))
+    return filename
+
+
+class WheelhouseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dirname = dirname = tempfile.mkdtemp()
+        self.wheelhouse = os.path.join(dirname, 'wheelhouse')
+        self.package_dirname = os.path.join(dirname, 'package')
+        os.mkdir(self.wheelhouse)
+        os.mkdir(self.package_dirname)
+
+        make_wheel(self.wheelhouse, 'pkg_utils_test_a', '1.0',
+                   requires=['pkg_utils_test_b >= 1.0', 'pkg_utils_test_c; extra == "x"', 'pkg_utils_test_d; python_version < "3"'])
+        make_wheel(self.wheelhouse, 'pkg_utils_test_a', '2.0')
+        make_wheel(self.wheelhouse, 'pkg_utils_test_a', '3.0', tag='cp27-cp27m-win32')
+        make_wheel(self.wheelhouse, 'pkg_utils_test_b', '1.0')
+        make_wheel(self.wheelhouse, 'pkg_utils_test_b', '1.1')
+        make_wheel(self.wheelhouse, 'pkg_utils_test_b', '1.2rc1')
+        make_wheel(self.wheelhouse, 'pkg_utils_test_c', '1.0')
+        make_sdist(self.wheelhouse, 'pkg_utils_test_c', '1.0', requires=['pkg_utils_test_b < 1.1'])
+        with open(os.path.join(self.wheelhouse, 'README'), 'w') as file:
+            pass
+
+        with open(os.path.join(self.package_dirname, 'requirements.txt'), 'w') as file:
+            file.write('pkg_utils_test_a < 2.0\n')
+        with open(os.path.join(self.package_dirname, 'requirements.optional.txt'), 'w') as file:
+            file.write('[opt]\n')
+            file.write('pkg_utils_test_b < 1.1\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname)
+
+    def test_get_wheelhouse_distributions(self):
+        distributions = wheelhouse.get_wheelhouse_distributions(self.wheelhouse)
+        self.assertEqual(sorted(distributions.keys()), ['pkg-utils-test-a', 'pkg-utils-test-b', 'pkg-utils-test-c'])
+        self.assertEqual([str(dist.version) for dist in distributions['pkg-utils-test-a']], ['2.0', '1.0'])
+        self.assertEqual([str(dist.version) for dist in distributions['pkg-utils-test-b']], ['1.2rc1', '1.1', '1.0'])
+        self.assertEqual([dist.is_wheel for dist in distributions['pkg-utils-test-c']], [True, False])
+        self.assertEqual(distributions['pkg-utils-test-c'][1].get_requires(), ['pkg_utils_test_b < 1.1'])
+
+    def test_read_distribution_metadata_error(self):
+        filename = os.path.join(self.dirname, 'pkg_utils_test_e-1.0.zip')
+        with zipfile.ZipFile(filename, 'w') as archive:
+            archive.writestr('pkg_utils_test_e-1.0/setup.py', '')
+        with self.assertRaisesRegex(ValueError, 'does not contain metadata'):
+            wheelhouse.read_distribution_metadata(filename)
+
+    def test_read_distribution_requires(self):
+        filename = os.path.join(self.dirname, 'pkg_utils_test_e-1.0.zip')
+        for pkg_info, requires in [
+            ('Metadata-Version: 2.2\nName: pkg_utils_test_e\nVersion: 1.0\n', []),
+            ('Metadata-Version: 1.1\nName: pkg_utils_test_e\nVersion: 1.0\nRequires-Dist: pkg_utils_test_b\n',
+             ['pkg_utils_test_b']),
+            ('Metadata-Version: 1.1\nName: pkg_utils_test_e\nVersion: 1.0\n', None),
+            ('Metadata-Version: 2.2\nName: pkg_utils_test_e\nVersion: 1.0\nDynamic: Requires-Dist\n', None),
+        ]:
+            with zipfile.ZipFile(filename, 'w') as archive:
+                archive.writestr('pkg_utils_test_e-1.0/PKG-INFO', pkg_info)
+            if requires is None:
+                with self.assertRaisesRegex(ValueError, 'are not declared in its PKG-INFO'):
+                    wheelhouse.read_distribution_requires(filename)
+            else:
+                self.assertEqual(wheelhouse.read_distribution_requires(filename), requires)
+
+        # the closure isn't silently truncated at source distributions whose requirements are unknown
+        shutil.move(filename, self.wheelhouse)
+        with self.assertRaisesRegex(ValueError, 'are not declared in its PKG-INFO'):
+            wheelhouse.lock_requirements(['pkg_utils_test_e'], self.wheelhouse)
+
+    def test_lock_requirements(self):
+        locked = wheelhouse.lock_requirements(['pkg_utils_test_a'], self.wheelhouse)
+        self.assertEqual([(req.name, str(req.version)) for req in locked], [('pkg-utils-test-a', '2.0')])
+
+        locked = wheelhouse.lock_requirements(['pkg_utils_test_a < 2'], self.wheelhouse)
+        self.assertEqual([(req.name, str(req.version)) for req in locked], [
+            ('pkg-utils-test-a', '1.0'),
+            ('pkg-utils-test-b', '1.1'),
+        ])
+
+        # extras and the dependencies of the pins constrain each other
+        locked = wheelhouse.lock_requirements(['pkg_utils_test_a[x] < 2'], self.wheelhouse)
+        self.assertEqual([(req.name, str(req.version)) for req in locked], [
+            ('pkg-utils-test-a', '1.0'),
+            ('pkg-utils-test-b', '1.1'),
+            ('pkg-utils-test-c', '1.0'),
+        ])
+        self.assertEqual(len(locked[2].hashes), 2)
+
+        with self.assertRaisesRegex(ValueError, 'No distribution in the wheelhouse satisfies pkg-utils-test-d'):
+            wheelhouse.lock_requirements(['pkg_utils_test_a < 2'], self.wheelhouse, environment={'python_version': '2.7'})
+
+        # the markers of requirements are evaluated with the extras of their requirers, not their own extras
+        locked = wheelhouse.lock_requirements(['pkg_utils_test_b[x]', 'pkg_utils_test_b > 2; extra == "x"'],
+                                              self.wheelhouse)
+        self.assertEqual([(req.name, str(req.version)) for req in locked], [('pkg-utils-test-b', '1.1')])
+
+        locked = wheelhouse.lock_requirements(['pkg_utils_test_b >= 1.2rc1'], self.wheelhouse)
+        self.assertEqual([str(req.version) for req in locked], ['1.2rc1'])
+
+        with self.assertRaisesRegex(ValueError, 'No distribution in the wheelhouse satisfies'):
+            wheelhouse.lock_requirements(['pkg_utils_test_b > 2'], self.wheelhouse)
+
+    def test_lock_dependencies(self):
+        lock_filename = os.path.join(self.dirname, 'requirements.lock')
+        locked = wheelhouse.lock_dependencies(self.package_dirname, self.wheelhouse, lock_filename=lock_filename)
+        self.assertEqual([(req.name, str(req.version)) for req in locked], [
+            ('pkg-utils-test-a', '1.0'),
+            ('pkg-utils-test-b', '1.0'),
+        ])
+
+        with open(lock_filename, 'r') as file:
+            lines = file.read().split('\n')
+        self.assertTrue(lines[0].startswith('#'))
+        self.assertEqual(lines[1], 'pkg-utils-test-a==1.0 \\')
+        self.assertEqual(lines[2], '    --hash=' + wheelhouse.hash_file(
+            os.path.join(self.wheelhouse, 'pkg_utils_test_a-1.0-py3-none-any.whl')))
+
+        # unchanged lock files aren't rewritten
+        os.utime(lock_filename, (0, 0))
+        wheelhouse.lock_dependencies(self.package_dirname, self.wheelhouse, lock_filename=lock_filename)
+        self.assertEqual(os.stat(lock_filename).st_mtime, 0)
+
+        locked = wheelhouse.lock_dependencies(self.package_dirname, self.wheelhouse, options=[])
+        self.assertEqual([(req.name, str(req.version)) for req in locked], [
+            ('pkg-utils-test-a', '1.0'),
+            ('pkg-utils-test-b', '1.1'),
+        ])
+
+    def test_get_dependency_closure(self):
+        install_requires, extras_require, _, _ = pkg_utils.get_dependencies(self.package_dirname)
+
+        closure = wheelhouse.get_dependency_closure(install_requires, self.wheelhouse, extras_require=extras_require)
+        self.assertEqual([(dist.name, str(dist.version)) for dist in closure.distributions], [
+            ('pkg-utils-test-a', '1.0'),
+            ('pkg-utils-test-b', '1.0'),
+        ])
+        filenames = [dist.filename for dist in closure.distributions]
+        self.assertEqual(closure.download_size, sum(os.path.getsize(filename) for filename in filenames))
+        install_size = 0
+        for filename in filenames:
+            with zipfile.ZipFile(filename) as archive:
+                install_size += sum(info.file_size for info in archive.infolist())
+        self.assertEqual(closure.install_size, install_size)
+        self.assertEqual(set(closure.install_sizes.keys()), set(['pkg-utils-test-a', 'pkg-utils-test-b']))
+
+        closure = wheelhouse.get_dependency_closure(['pkg_utils_test_a[x] < 2'], self.wheelhouse, options=[])
+        self.assertEqual([(dist.name, str(dist.version)) for dist in closure.distributions], [
+            ('pkg-utils-test-a', '1.0'),
+            ('pkg-utils-test-b', '1.1'),
+            ('pkg-utils-test-c', '1.0'),
+        ])
+        self.assertTrue(closure.distributions[2].is_wheel)
+
+        with self.assertRaisesRegex(ValueError, 'Option undefined is not defined'):
+            wheelhouse.get_dependency_closure(install_requires, self.wheelhouse, extras_require=extras_require,
+                                              options=['undefined'])
+
+    def test_get_dependency_closure_cache(self):
+        cache_filename = os.path.join(self.dirname, 'cache.json')
+        closure = wheelhouse.get_dependency_closure(['pkg_utils_test_a < 2'], self.wheelhouse, cache_filename=cache_filename)
+        with open(cache_filename, 'r') as file:
+            cache = json.load(file)
+        self.assertEqual(cache['version'], wheelhouse.METADATA_CACHE_FORMAT_VERSION)
+        self.assertEqual(sorted(cache['distributions'].keys()), sorted(dist.filename for dist in closure.distributions))
+
+        # the metadata of the distributions isn't reread
+        with mock.patch('pkg_utils.wheelhouse.read_distribution_metadata', side_effect=AssertionError) as read:
+            cached_closure = wheelhouse.get_dependency_closure(['pkg_utils_test_a < 2'], self.wheelhouse,
+                                                               cache_filename=cache_filename)
+        self.assertEqual(read.call_count, 0)
+        self.assertEqual(cached_closure.install_size, closure.install_size)
+
+        # the cache is written atomically
+        with mock.patch('pkg_utils.wheelhouse.write_file_if_changed',
+                        wraps=wheelhouse.write_file_if_changed) as write_file_if_changed:
+            cache = wheelhouse.DistributionMetadataCache(cache_filename)
+            cache._modified = True
+            cache.save()
+        write_file_if_changed.assert_called_once()
+        with open(cache_filename, 'r') as file:
+            self.assertEqual(sorted(json.load(file)['distributions'].keys()),
+                             sorted(dist.filename for dist in closure.distributions))
+
+        # changed distributions are reread
+        make_wheel(self.wheelhouse, 'pkg_utils_test_b', '1.1', requires=['pkg_utils_test_c'])
+        closure = wheelhouse.get_dependency_closure(['pkg_utils_test_a < 2'], self.wheelhouse, cache_filename=cache_filename)
+        self.assertEqual([dist.name for dist in closure.distributions],
+                         ['pkg-utils-test-a', 'pkg-utils-test-b', 'pkg-utils-test-c'])
+
+    def test_get_distribution_install_size(self):
+        filename = make_sdist(self.dirname, 'pkg_utils_test_e', '1.0', requires=['pkg_utils_test_b'])
+        with tarfile.open(filename, 'r:gz') as archive:
+            size = sum(member.size for member in archive if member.isfile())
+        self.assertEqual(wheelhouse.get_distribution_install_size(filename), size)
+
+    def test_install_lock_file(self):
+        lock_filename = os.path.join(self.dirname, 'requirements.lock')
+        wheelhouse.lock_dependencies(self.package_dirname, self.wheelhouse, lock_filename=lock_filename)
+
+        try:
+            pkg_utils.install_dependencies([], lock_filename=lock_filename, find_links=self.wheelhouse)
+            output = subprocess.check_output([sys.executable, '-c',
+                                              'import pkg_utils_test_a, pkg_utils_test_b; '
+                                              'print(pkg_utils_test_a.__version__, pkg_utils_test_b.__version__)'])
+            self.assertEqual(output.decode().strip(), '1.0 1.0')
+        finally:
+            subprocess.check_call([sys.executable, '-m', 'pip', 'uninstall', '-y', '-q',
+                                   'pkg_utils_test_a', 'pkg_utils_test_b'])